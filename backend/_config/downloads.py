@@ -0,0 +1,138 @@
+"""
+Shared download layer for stored files.
+
+When the default storage hands out signed URLs (GCS in production), clients
+are redirected there and the file never passes through a web worker.
+Otherwise the file is streamed in chunks with FileResponse, with support for
+single HTTP Range requests and conditional GET (ETag / Last-Modified).
+"""
+import hashlib
+import mimetypes
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeReader:
+    """File-like view over [start, start + length) of an open file"""
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single `bytes=` range, inclusive, clipped to the size.
+    Returns None when the header is absent or not a single byte range (the
+    whole file is then served) and raises ValueError when it is unsatisfiable.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        raise ValueError('Rango no satisfacible')
+    return start, end
+
+
+def _modified_time(storage, name):
+    try:
+        return storage.get_modified_time(name)
+    except (NotImplementedError, OSError):
+        return None
+
+
+def _etag(name, size, modified):
+    stamp = modified.timestamp() if modified else ''
+    return '"%s"' % hashlib.md5(f'{name}:{size}:{stamp}'.encode()).hexdigest()
+
+
+def _range_applies(request, etag, modified):
+    """If-Range only lets the range through when the file is unchanged"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return bool(since and modified and int(modified.timestamp()) <= since)
+
+
+def serve_stored(request, storage, name, filename=None, as_attachment=True):
+    """Response serving a file held by a storage backend"""
+    filename = filename or name.rsplit('/', 1)[-1]
+    if settings.SIGNED_URL_DOWNLOADS:
+        return HttpResponseRedirect(storage.url(name))
+
+    size = storage.size(name)
+    modified = _modified_time(storage, name)
+    etag = _etag(name, size, modified)
+    last_modified = int(modified.timestamp()) if modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range and not _range_applies(request, etag, modified):
+        byte_range = None
+
+    file = storage.open(name, 'rb')
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(
+            RangeReader(file, start, end - start + 1),
+            status=206,
+            as_attachment=as_attachment,
+            filename=filename,
+            content_type=content_type
+        )
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename, content_type=content_type)
+        response['Content-Length'] = size
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def serve_file(request, field_file, filename=None, as_attachment=True):
+    """Response serving the content of a FileField"""
+    return serve_stored(request, field_file.storage, field_file.name, filename, as_attachment)
@@ -0,0 +1,181 @@
+"""
+Image derivatives (thumbnails and web previews) for uploaded photos.
+
+Models keep their derivatives in an `image_derivatives` JSONField keyed by
+the name of the image field:
+
+    {'file': {'source': 'clinical_files/2030/01/x.heic', 'width': 4032,
+              'height': 3024,
+              'thumbnail': {'name': '...', 'width': 256, 'height': 192},
+              'preview': {'name': '...', 'width': 1600, 'height': 1200}}}
+
+`source` is the stored name of the original the derivatives were built
+from, so a replaced upload is detected and rebuilt. Derivatives are built by
+Celery workers after the upload commits; non-image files (PDF, DOCX) are
+skipped. HEIC/HEIF originals are read through pillow-heif when installed.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'webp', 'heic', 'heif']
+
+# Longest side, in pixels, of each derivative
+DERIVATIVE_SIZES = {
+    'thumbnail': 256,
+    'preview': 1600,
+}
+
+STORAGE_PREFIX = 'derivatives'
+
+
+def output_format():
+    """WebP when Pillow was built with it, JPEG otherwise"""
+    wanted = getattr(settings, 'IMAGE_DERIVATIVE_FORMAT', 'WEBP').upper()
+    if wanted == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return wanted
+
+
+def is_image(name):
+    """Whether a stored name looks like a photo we can derive from"""
+    return os.path.splitext(name or '')[1][1:].lower() in IMAGE_EXTENSIONS
+
+
+def stale_fields(instance, fields):
+    """Fields whose derivatives do not match the current upload"""
+    derivatives = instance.image_derivatives or {}
+    stale = []
+    for field in fields:
+        name = getattr(instance, field).name or ''
+        source = derivatives.get(field, {}).get('source')
+        if (is_image(name) or source) and source != name:
+            stale.append(field)
+    return stale
+
+
+def _flatten(image):
+    """RGB copy of an image, with transparency laid on white"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_derivatives(field_file):
+    """
+    Build every derivative of a stored image and save them next to it.
+    Returns the dict stored under the field name, or None when the file
+    cannot be read as an image.
+    """
+    image_format = output_format()
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    stem = os.path.splitext(field_file.name)[0]
+
+    field_file.open('rb')
+    try:
+        with Image.open(field_file) as original:
+            width, height = original.size
+            # Let JPEG decode at reduced scale, enough for the largest derivative
+            largest = max(DERIVATIVE_SIZES.values())
+            original.draft('RGB', (largest, largest))
+            image = _flatten(ImageOps.exif_transpose(original))
+    except (UnidentifiedImageError, OSError):
+        logger.warning('Could not read %s as an image', field_file.name, exc_info=True)
+        return None
+    finally:
+        field_file.close()
+
+    # Report the dimensions as displayed, after EXIF rotation
+    if (image.width < image.height) != (width < height):
+        width, height = height, width
+
+    result = {'source': field_file.name, 'width': width, 'height': height}
+    for kind, size in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, format=image_format, quality=82, optimize=True)
+        name = field_file.storage.save(
+            f'{STORAGE_PREFIX}/{stem}-{kind}.{extension}',
+            ContentFile(buffer.getvalue())
+        )
+        result[kind] = {'name': name, 'width': image.width, 'height': image.height}
+    return result
+
+
+def delete_derivatives(storage, entry):
+    """Remove the stored files of one field's derivatives"""
+    for kind in DERIVATIVE_SIZES:
+        name = (entry or {}).get(kind, {}).get('name')
+        if name:
+            storage.delete(name)
+
+
+def refresh_derivatives(instance, fields):
+    """
+    Rebuild the outdated derivatives of an instance and store the result with
+    a single update of its image_derivatives column.
+    """
+    derivatives = dict(instance.image_derivatives or {})
+    changed = False
+    for field in fields:
+        field_file = getattr(instance, field)
+        entry = derivatives.get(field)
+        if entry and entry.get('source') == field_file.name:
+            continue
+        if entry:
+            delete_derivatives(field_file.storage, derivatives.pop(field))
+            changed = True
+        if is_image(field_file.name):
+            # Unreadable uploads are remembered so they are not retried forever
+            derivatives[field] = build_derivatives(field_file) or {
+                'source': field_file.name,
+                'error': 'unreadable',
+            }
+            changed = True
+
+    if changed:
+        type(instance).objects.filter(pk=instance.pk).update(image_derivatives=derivatives)
+        instance.image_derivatives = derivatives
+    return derivatives
+
+
+def derivative_urls(instance, field, request=None):
+    """Public description of a field's derivatives, with URLs, for serializers"""
+    entry = (instance.image_derivatives or {}).get(field)
+    field_file = getattr(instance, field)
+    if not entry or 'error' in entry or entry.get('source') != field_file.name:
+        return None
+
+    def url(name):
+        location = field_file.storage.url(name)
+        return request.build_absolute_uri(location) if request else location
+
+    result = {'width': entry['width'], 'height': entry['height']}
+    for kind in DERIVATIVE_SIZES:
+        if kind in entry:
+            result[kind] = dict(entry[kind], url=url(entry[kind]['name']))
+    return result
+
+
+def schedule(task, *args):
+    """Queue a derivatives task; a failure only delays the previews"""
+    try:
+        getattr(task, 'delay', task)(*args)
+    except Exception:
+        logger.warning('Could not queue image derivatives for %s', args, exc_info=True)
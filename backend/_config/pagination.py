@@ -0,0 +1,279 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages follow the ordering the queryset already has (the `?ordering=` chosen
+through OrderingFilter, the one a custom action applied or the model's
+Meta.ordering) with the primary key appended as a tie-breaker. The cursor
+carries the ordering values and pk of the row at the edge of the page, and
+the next page is fetched with a `WHERE (ordering, pk) > cursor` condition
+instead of an OFFSET, so deep pages cost the same as the first one and rows
+inserted meanwhile neither repeat nor vanish.
+
+Only concrete fields of the model can be followed. A client asking for any
+other `?ordering=` gets a 400 from KeysetOrderingFilter, and a view whose own
+ordering goes through a relation or an annotation is paged by pk instead.
+
+NULLs count as the lowest value (first ascending, last descending) on every
+database, so the comparisons stay well defined for nullable ordering fields.
+
+Clients pick the page size with `?page_size=` (capped at MAX_PAGE_SIZE) and
+get a `count` only when they ask for it with `?count=true`; on PostgreSQL
+large counts are estimated by the query planner instead of a COUNT(*).
+"""
+import json
+import logging
+import operator
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from rest_framework import exceptions, filters, pagination
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+MAX_PAGE_SIZE = 200
+
+# Below this planner estimate an exact count is cheap enough to run
+EXACT_COUNT_THRESHOLD = 10000
+
+
+def ordering_field(model, name):
+    """Model field a `-field` ordering name follows, if the cursor can follow it"""
+    name = name.lstrip('-')
+    if name == 'pk':
+        return model._meta.pk
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        field = None
+    if field is None or not field.concrete:
+        raise ImproperlyConfigured(
+            f'Cursor pagination needs plain field orderings, got {name!r} '
+            f'for {model.__name__}'
+        )
+    return field
+
+
+def ordering_names(queryset):
+    """Ordering of a queryset as `-field` names, with the pk appended"""
+    ordering = queryset.query.order_by or queryset.model._meta.ordering or ['-pk']
+    names = []
+    for item in ordering:
+        if isinstance(item, OrderBy) and isinstance(item.expression, F):
+            item = ('-' if item.descending else '') + item.expression.name
+        if not isinstance(item, str) or item == '?':
+            raise ImproperlyConfigured(
+                f'Cursor pagination needs plain field orderings, got {item!r} '
+                f'for {queryset.model.__name__}'
+            )
+        ordering_field(queryset.model, item)
+        names.append(item)
+
+    pk_names = {'pk', queryset.model._meta.pk.name}
+    names = [name for name in names if name.lstrip('-') not in pk_names]
+    names.append('-pk' if names and names[0].startswith('-') else 'pk')
+    return names
+
+
+def estimate_count(queryset):
+    """
+    Rows of a queryset, estimated by the PostgreSQL planner when there are
+    many of them. Returns (count, is_estimate).
+    """
+    queryset = queryset.order_by()
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < EXACT_COUNT_THRESHOLD:
+        return queryset.count(), False
+    return estimate, True
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """Default pagination of every list endpoint and list action"""
+
+    page_size_query_param = 'page_size'
+    max_page_size = MAX_PAGE_SIZE
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        try:
+            self.ordering = ordering_names(queryset)
+        except ImproperlyConfigured as error:
+            logger.warning('%s, paging by pk instead', error)
+            self.ordering = ['-pk']
+        self.fields = [ordering_field(queryset.model, name) for name in self.ordering]
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        self.position = self._decode_position(self.cursor.position) if self.cursor else None
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() == 'true':
+            self.count, self.count_is_estimate = estimate_count(queryset)
+
+        queryset = queryset.order_by(*self._order_by(reverse))
+        if self.position is not None:
+            queryset = queryset.filter(self._after(self.position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self._position_of(self.page[-1]) if self.page else self.position
+        return self.encode_cursor(pagination.Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._position_of(self.page[0]) if self.page else self.position
+        return self.encode_cursor(pagination.Cursor(offset=0, reverse=True, position=position))
+
+    def encode_cursor(self, cursor):
+        position = json.dumps(cursor.position, separators=(',', ':'))
+        return super().encode_cursor(cursor._replace(position=position))
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload['count'] = self.count
+            payload['count_is_estimate'] = self.count_is_estimate
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['count'] = {'type': 'integer', 'nullable': True}
+        response['properties']['count_is_estimate'] = {'type': 'boolean', 'nullable': True}
+        return response
+
+    def _order_by(self, reverse):
+        """Order expressions, NULLs first when ascending and last when descending"""
+        expressions = []
+        for name, field in zip(self.ordering, self.fields):
+            descending = name.startswith('-') != reverse
+            expression = F(field.attname)
+            if not field.null:
+                expressions.append(expression.desc() if descending else expression.asc())
+            elif descending:
+                expressions.append(expression.desc(nulls_last=True))
+            else:
+                expressions.append(expression.asc(nulls_first=True))
+        return expressions
+
+    def _after(self, position, reverse):
+        """Rows that come after a position in the (possibly reversed) ordering"""
+        terms = []
+        equal = Q()
+        for name, field, value in zip(self.ordering, self.fields, position):
+            descending = name.startswith('-') != reverse
+            column = field.attname
+            if value is None:
+                # NULL is the lowest value: everything else follows it ascending
+                if not descending:
+                    terms.append(equal & Q(**{f'{column}__isnull': False}))
+                equal &= Q(**{f'{column}__isnull': True})
+                continue
+
+            beyond = Q(**{f'{column}__lt' if descending else f'{column}__gt': value})
+            if descending and field.null:
+                beyond |= Q(**{f'{column}__isnull': True})
+            terms.append(equal & beyond)
+            equal &= Q(**{column: value})
+
+        condition = reduce(operator.or_, terms)
+        # Redundant range on the leading column lets the database use its index
+        leading, first = self.fields[0], position[0]
+        if first is not None and not leading.null:
+            descending = self.ordering[0].startswith('-') != reverse
+            condition &= Q(**{f'{leading.attname}__lte' if descending else f'{leading.attname}__gte': first})
+        return condition
+
+    def _position_of(self, row):
+        """Ordering values of a row (model instance or values() dict), as JSON types"""
+        position = []
+        for name, field in zip(self.ordering, self.fields):
+            if isinstance(row, dict):
+                value = row.get(field.attname, row.get(name.lstrip('-')))
+            else:
+                value = getattr(row, field.attname)
+            position.append(value if value is None or isinstance(value, (bool, int)) else str(value))
+        return position
+
+    def _decode_position(self, encoded):
+        try:
+            values = json.loads(encoded)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [
+                None if value is None else field.to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+
+class KeysetOrderingFilter(filters.OrderingFilter):
+    """`?ordering=` that answers 400 to the orderings the cursor cannot follow"""
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params:
+            return self.get_default_ordering(view)
+
+        terms = [param.strip() for param in params.split(',') if param.strip()]
+        valid = {name for name, _ in self.get_valid_fields(queryset, view, {'request': request})}
+        for term in terms:
+            try:
+                supported = term.lstrip('-') in valid and ordering_field(queryset.model, term)
+            except ImproperlyConfigured:
+                supported = False
+            if not supported:
+                raise exceptions.ValidationError({self.ordering_param: [f'No se puede ordenar por "{term}".']})
+        return terms or self.get_default_ordering(view)
+
+
+class ListActionMixin:
+    """Paginated responses for the custom list actions of a viewset"""
+
+    def list_response(self, queryset):
+        """Serialize a queryset one page at a time, like the list action does"""
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.get_serializer(queryset, many=True).data)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
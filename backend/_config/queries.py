@@ -0,0 +1,106 @@
+"""
+Query planning from serializer declarations.
+
+plan_queryset(queryset, serializer_class) reads the fields a serializer
+renders and adds the select_related() / prefetch_related() calls they need,
+so a list renders in a fixed number of queries however many rows it has:
+
+- a dotted source through forward relations (`patient.full_name`) or a
+  nested serializer on one is joined with select_related;
+- a nested `many=True` serializer or a many related field on a reverse or
+  many-to-many relation is prefetched, with the nested serializer planned
+  the same way.
+
+Relations read inside model properties or SerializerMethodFields are not
+visible from the declarations; list those in the serializer's
+Meta.select_related / Meta.prefetch_related.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _relation(model, name):
+    """Relation field of a model by name, or None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation and field.related_model is not None else None
+
+
+def _nested(field):
+    """Serializer rendered by a field, if it is a nested serializer"""
+    if isinstance(field, serializers.ListSerializer):
+        field = field.child
+    return field if isinstance(field, serializers.BaseSerializer) else None
+
+
+def relations_for(serializer, model, prefix=''):
+    """select_related paths and prefetch lookups needed to render a serializer"""
+    meta = getattr(serializer, 'Meta', None)
+    select = {prefix + path for path in getattr(meta, 'select_related', [])}
+    prefetch = [prefix + lookup for lookup in getattr(meta, 'prefetch_related', [])]
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        nested = _nested(field)
+        if field.source == '*':
+            if nested is not None:
+                nested_select, nested_prefetch = relations_for(nested, model, prefix)
+                select |= nested_select
+                prefetch += nested_prefetch
+            continue
+
+        parts = field.source.split('.')
+        path = []
+        current = model
+        for position, part in enumerate(parts):
+            relation = _relation(current, part)
+            if relation is None:
+                break
+            if relation.one_to_many or relation.many_to_many:
+                lookup = prefix + '__'.join(path + [part])
+                last = position == len(parts) - 1
+                if last and nested is not None:
+                    related = relation.related_model
+                    prefetch.append(Prefetch(
+                        lookup,
+                        queryset=plan_queryset(related._default_manager.all(), nested)
+                    ))
+                else:
+                    prefetch.append(lookup)
+                break
+            path.append(part)
+            current = relation.related_model
+        else:
+            # The primary key of a forward relation is already on the row
+            if len(parts) == 1 and isinstance(field, serializers.PrimaryKeyRelatedField):
+                continue
+            if nested is not None and path:
+                nested_select, nested_prefetch = relations_for(
+                    nested, current, prefix + '__'.join(path) + '__'
+                )
+                select |= nested_select
+                prefetch += nested_prefetch
+
+        if path:
+            select.add(prefix + '__'.join(path))
+
+    return select, prefetch
+
+
+def plan_queryset(queryset, serializer_class):
+    """Add the joins and prefetches a serializer (class or instance) needs"""
+    serializer = serializer_class() if isinstance(serializer_class, type) else serializer_class
+    serializer = _nested(serializer) or serializer
+    select, prefetch = relations_for(serializer, queryset.model)
+
+    seen = {getattr(lookup, 'prefetch_to', lookup) for lookup in queryset._prefetch_related_lookups}
+    prefetch = [lookup for lookup in prefetch if getattr(lookup, 'prefetch_to', lookup) not in seen]
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -87,6 +87,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ] + find_apps(BASE_DIR)
 if DEBUG:
     INSTALLED_APPS += ["django_extensions"]
@@ -281,6 +282,10 @@ if not GCS_CREDENTIALS and not GCS_CREDENTIALS_FILE:
             "File uploads will fail without valid credentials."
         )
 
+# Downloads redirect to signed storage URLs instead of streaming through Django
+# (enabled below when GCS is configured)
+SIGNED_URL_DOWNLOADS = False
+
 # Configure storage based on DEBUG mode
 if DEBUG:
     # Development: Use local file storage for media files
@@ -315,6 +320,7 @@ else:
 
         # Media URL will be served from GCS
         MEDIA_URL = f"https://storage.googleapis.com/{GCS_BUCKET_NAME}/media/"
+        SIGNED_URL_DOWNLOADS = True
     else:
         # Fallback to local storage if GCS is not properly configured
         logger.error(
@@ -381,6 +387,9 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Keyset pagination on every list endpoint; ?page_size= up to 200
+    'DEFAULT_PAGINATION_CLASS': '_config.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
 }
 
 # CORS settings
@@ -527,9 +536,37 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'notifications.tasks.send_installment_reminders',
         'schedule': 86400.0,  # Every day
     },
+    'mark-overdue-installments': {
+        'task': 'installments.tasks.mark_overdue_installments',
+        'schedule': 86400.0,  # Every day
+    },
+    'reconcile-dashboard-snapshot': {
+        'task': 'reports.tasks.reconcile_dashboard_snapshot',
+        'schedule': 900.0,  # Every 15 minutes
+    },
 }
 
 
+# ========================================
+# CLINIC CONFIGURATION
+# ========================================
+# Dental units (chairs) offered for booking, e.g. DENTAL_UNITS="Sillón 1,Sillón 2,Sillón 3"
+DENTAL_UNITS = [
+    unit.strip()
+    for unit in os.getenv('DENTAL_UNITS', 'Sillón 1,Sillón 2').split(',')
+    if unit.strip()
+]
+
+# Availability grid cache (seconds)
+AVAILABILITY_CACHE_TIMEOUT = int(os.getenv('AVAILABILITY_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Patient summary cache (seconds); related writes invalidate it earlier
+PATIENT_SUMMARY_CACHE_TIMEOUT = int(os.getenv('PATIENT_SUMMARY_CACHE_TIMEOUT', 60 * 15))
+
+# Format of photo thumbnails and previews (WEBP or JPEG)
+IMAGE_DERIVATIVE_FORMAT = os.getenv('IMAGE_DERIVATIVE_FORMAT', 'WEBP')
+
+
 # ========================================
 # THIRD-PARTY SERVICE CONFIGURATION
 # ========================================
@@ -545,6 +582,19 @@ TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER', '')
 TWILIO_WHATSAPP_NUMBER = os.getenv('TWILIO_WHATSAPP_NUMBER', '')
 
+# Notification dispatch
+# NOTIFICATION_PROVIDER="fake" swaps SendGrid/Twilio for a local stand-in (benchmarks, offline dev)
+NOTIFICATION_PROVIDER = os.getenv('NOTIFICATION_PROVIDER', 'live')
+NOTIFICATION_DISPATCH_WORKERS = int(os.getenv('NOTIFICATION_DISPATCH_WORKERS', 8))
+NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.getenv('NOTIFICATION_DISPATCH_BATCH_SIZE', 100))
+NOTIFICATION_FAKE_LATENCY = float(os.getenv('NOTIFICATION_FAKE_LATENCY', 0))
+
+# Provider clients (shared keep-alive sessions, see notifications.clients)
+NOTIFICATION_CLIENT_TIMEOUT = float(os.getenv('NOTIFICATION_CLIENT_TIMEOUT', 10))
+NOTIFICATION_CLIENT_MAX_RETRIES = int(os.getenv('NOTIFICATION_CLIENT_MAX_RETRIES', 2))
+NOTIFICATION_CLIENT_MAX_AGE = int(os.getenv('NOTIFICATION_CLIENT_MAX_AGE', 60 * 60))
+NOTIFICATION_CLIENT_MAX_FAILURES = int(os.getenv('NOTIFICATION_CLIENT_MAX_FAILURES', 3))
+
 # Stripe (Payments)
 STRIPE_PUBLIC_KEY = os.getenv('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
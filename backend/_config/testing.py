@@ -0,0 +1,32 @@
+"""
+Helpers shared by the test suites of the apps
+"""
+from datetime import date
+from unittest import mock
+
+
+def run_tasks_inline(test_case, *tasks):
+    """
+    Run the given Celery tasks in-process when they are queued with .delay()
+    for the rest of a test, so the suite needs neither a broker nor
+    CELERY_TASK_ALWAYS_EAGER
+    """
+    for task in tasks:
+        patcher = mock.patch.object(task, 'delay', side_effect=task, create=True)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+
+
+def create_patient(**kwargs):
+    """Patient with the fields every test needs, overridden by kwargs"""
+    from patients.models import Patient
+
+    defaults = {
+        'first_name': 'Ana',
+        'last_name': 'López',
+        'gender': 'F',
+        'date_of_birth': date(1990, 5, 17),
+        'phone': '+5215512345678',
+    }
+    defaults.update(kwargs)
+    return Patient.objects.create(**defaults)
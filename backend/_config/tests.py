@@ -1,6 +1,10 @@
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import date
 import os
+import shutil
+import tempfile
 
 
 class MediaURLConfigurationTestCase(SimpleTestCase):
@@ -56,4 +60,287 @@ won't be served during testing. These tests verify the configuration.
             self.assertIn('storages', settings.INSTALLED_APPS)
             # And STORAGES setting should exist
             self.assertTrue(hasattr(settings, 'STORAGES'))
-            
\ No newline at end of file
+            
+
+class FileDownloadTestCase(TestCase):
+    """Streaming downloads with ranges and conditional GET"""
+
+    content = bytes(range(256)) * 40
+
+    def setUp(self):
+        from clinical.models import ClinicalFile
+        from .testing import create_patient
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        patient = create_patient()
+        self.clinical_file = ClinicalFile.objects.create(
+            patient=patient,
+            file_type='radiograph',
+            title='Panorámica',
+            file=SimpleUploadedFile('panoramica.pdf', self.content),
+        )
+        self.url = f'/api/clinical/clinical-files/{self.clinical_file.pk}/download/'
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_download_is_streamed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(self.body(response), self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(self.body(response), self.content[100:200])
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-50')
+        self.assertEqual(self.body(response), self.content[-50:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_conditional_requests(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A stale If-Range gets the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    @override_settings(SIGNED_URL_DOWNLOADS=True)
+    def test_signed_url_storage_redirects(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], self.clinical_file.file.url)
+
+    def test_report_without_file(self):
+        from reports.models import Report
+
+        report = Report.objects.create(
+            report_type='daily_income',
+            title='Ingresos',
+            start_date=date(2030, 1, 1),
+            end_date=date(2030, 1, 1),
+            export_format='pdf',
+        )
+        response = self.client.get(f'/api/reports/{report.pk}/download/')
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTestCase(TestCase):
+    """Cursor pagination of list endpoints and list actions"""
+
+    def setUp(self):
+        from patients.models import Patient
+        from treatments.models import Treatment
+
+        # Few distinct last names, so most rows tie on the ordering field
+        self.patients = Patient.objects.bulk_create([
+            Patient(
+                first_name=f'Paciente {i}',
+                last_name=['Díaz', 'López', 'Pérez'][i % 3],
+                gender='O',
+                date_of_birth=date(1990, 1, 1),
+                phone='+5215512345678',
+                patient_number=f'PAT-TEST-{i:03d}',
+            )
+            for i in range(23)
+        ])
+        self.patient = Patient.objects.order_by('pk').first()
+        Treatment.objects.bulk_create([
+            Treatment(
+                patient=self.patient,
+                treatment_type='Limpieza',
+                dentist_responsible='Dra. Pérez',
+                start_date=date(2030, 1, 1),
+                end_date=None if i % 2 else date(2030, 1, 1 + i % 4),
+                total_price='100.00',
+            )
+            for i in range(11)
+        ])
+
+    def walk(self, url, **params):
+        """Ids of every page following next links, then back through previous links"""
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        pages = [response.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+        forward = [row['id'] for page in pages for row in page['results']]
+
+        backward_pages = [pages[-1]]
+        while backward_pages[-1]['previous']:
+            backward_pages.append(self.client.get(backward_pages[-1]['previous']).data)
+        backward = [row['id'] for page in reversed(backward_pages) for row in page['results']]
+        return forward, backward, len(pages)
+
+    def test_ties_are_broken_by_id(self):
+        forward, backward, pages = self.walk('/api/patients/', ordering='last_name', page_size=5)
+        from patients.models import Patient
+        expected = list(Patient.objects.order_by('last_name', 'pk').values_list('pk', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        self.assertEqual(pages, 5)
+
+    def test_nullable_ordering_fields(self):
+        from treatments.models import Treatment
+        expected = sorted(
+            Treatment.objects.values_list('end_date', 'pk'),
+            key=lambda row: (row[0] is not None, row[0] or date.min, row[1]),
+            reverse=True,
+        )
+        forward, backward, _ = self.walk('/api/treatments/', ordering='-end_date', page_size=3)
+        self.assertEqual(forward, [pk for _, pk in expected])
+        self.assertEqual(backward, forward)
+
+        forward, _, _ = self.walk('/api/treatments/', ordering='end_date', page_size=4)
+        self.assertEqual(forward, [pk for _, pk in reversed(expected)])
+
+    def test_page_size_is_capped_and_count_is_opt_in(self):
+        response = self.client.get('/api/patients/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 23)
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get('/api/patients/', {'page_size': 2, 'count': 'true'})
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['count'], 23)
+        self.assertFalse(response.data['count_is_estimate'])
+
+    def test_deep_pages_cost_one_query(self):
+        response = self.client.get('/api/patients/', {'page_size': 5})
+        for _ in range(3):
+            next_url = response.data['next']
+            with self.assertNumQueries(1):
+                response = self.client.get(next_url)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/patients/', {'cursor': 'bm9wZQ=='})
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_actions_are_paginated(self):
+        from django.utils import timezone
+        from appointments.models import Appointment
+
+        today = timezone.localdate()
+        Appointment.objects.bulk_create([
+            Appointment(
+                patient=self.patient,
+                consultation_type='cleaning',
+                date=today,
+                start_time=f'{8 + i}:00',
+                end_time=f'{8 + i}:30',
+                dental_unit='Sillón 1',
+                status='confirmed',
+            )
+            for i in range(7)
+        ])
+        forward, _, pages = self.walk('/api/appointments/today/', page_size=3)
+        self.assertEqual(pages, 3)
+        self.assertEqual(
+            forward,
+            list(Appointment.objects.order_by('start_time', 'pk').values_list('pk', flat=True))
+        )
+
+    def test_next_links_are_absolute(self):
+        # frontend/app/lib/api.ts requests these links as they are
+        response = self.client.get('/api/treatments/', {'page_size': 4})
+        self.assertTrue(response.data['next'].startswith('http://testserver/api/treatments/?'))
+        self.assertIn('page_size=4', response.data['next'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_unsupported_client_ordering_is_rejected(self):
+        # Not an ordering field of the endpoint
+        response = self.client.get('/api/appointments/', {'ordering': 'patient__last_name'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+        # Accepted by OrderingFilter (a serializer source) but not by the cursor
+        response = self.client.get('/api/finances/payments/', {'ordering': '-patient__full_name'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/appointments/', {'ordering': '-date'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_unsupported_view_ordering_pages_by_pk(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from treatments.models import Treatment
+        from .pagination import KeysetPagination
+
+        request = Request(APIRequestFactory().get('/api/treatments/', {'page_size': 4}))
+        paginator = KeysetPagination()
+        with self.assertLogs('_config.pagination', 'WARNING'):
+            page = paginator.paginate_queryset(Treatment.objects.order_by('patient__last_name'), request)
+        self.assertEqual(
+            [treatment.pk for treatment in page],
+            list(Treatment.objects.order_by('-pk').values_list('pk', flat=True)[:4])
+        )
+
+
+class QueryPlanningTestCase(SimpleTestCase):
+    """select_related / prefetch_related derived from serializer fields"""
+
+    def test_appointment_serializers(self):
+        from django.db.models import Prefetch
+        from appointments.serializers import AppointmentAgendaSerializer, AppointmentSerializer
+        from appointments.models import Appointment
+        from _config.queries import plan_queryset, relations_for
+
+        select, prefetch = relations_for(AppointmentSerializer(), Appointment)
+        self.assertEqual(select, {'patient'})
+        self.assertEqual(len(prefetch), 1)
+        self.assertIsInstance(prefetch[0], Prefetch)
+        self.assertEqual(prefetch[0].prefetch_to, 'reminders')
+
+        select, prefetch = relations_for(AppointmentAgendaSerializer(), Appointment)
+        self.assertEqual((select, prefetch), ({'patient'}, []))
+
+        # Lookups the queryset already prefetches are not added twice
+        queryset = plan_queryset(Appointment.objects.prefetch_related('reminders'), AppointmentSerializer)
+        self.assertEqual(queryset._prefetch_related_lookups, ('reminders',))
+
+    def test_nested_and_dotted_sources(self):
+        from rest_framework import serializers
+        from budgets.models import Budget, BudgetItem
+        from _config.queries import relations_for
+
+        class ItemSerializer(serializers.ModelSerializer):
+            patient_name = serializers.CharField(source='budget.patient.full_name')
+
+            class Meta:
+                model = BudgetItem
+                fields = ['id', 'budget', 'patient_name']
+
+        class BudgetSerializer(serializers.ModelSerializer):
+            items = ItemSerializer(many=True)
+            parent = serializers.StringRelatedField(source='parent_budget')
+
+            class Meta:
+                model = Budget
+                fields = ['id', 'patient', 'items', 'parent']
+                select_related = ['patient']
+
+        select, prefetch = relations_for(ItemSerializer(), BudgetItem)
+        self.assertEqual(select, {'budget__patient'})
+
+        select, prefetch = relations_for(BudgetSerializer(), Budget)
+        self.assertEqual(select, {'patient', 'parent_budget'})
+        self.assertEqual([lookup.prefetch_to for lookup in prefetch], ['items'])
+        self.assertEqual(prefetch[0].queryset.query.select_related, {'budget': {'patient': {}}})
@@ -0,0 +1,138 @@
+"""
+Agreement PDF rendering.
+
+Signed agreements are rendered once, by a Celery worker after the signature
+commits, and stored in Agreement.pdf_file. The document embeds the drawn
+signature together with the signer name, IP address and signing time.
+Unsigned agreements are rendered on demand as drafts and never stored.
+"""
+import base64
+import binascii
+import logging
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image, KeepTogether, Paragraph, SimpleDocTemplate, Spacer
+
+logger = logging.getLogger(__name__)
+
+
+SIGNATURE_WIDTH = 2.5*inch
+SIGNATURE_HEIGHT = 1*inch
+
+
+@lru_cache(maxsize=None)
+def stylesheet():
+    """Paragraph styles, built once per process"""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle('Clause', parent=styles['Normal'], leading=14, spaceAfter=8))
+    styles.add(ParagraphStyle('Small', parent=styles['Normal'], fontSize=8, leading=10))
+    return styles
+
+
+def decode_signature(signature_data):
+    """Image bytes of a base64 signature (data URL or bare), or None if unreadable"""
+    if not signature_data:
+        return None
+    if signature_data.startswith('data:'):
+        signature_data = signature_data.partition(',')[2]
+    try:
+        image = base64.b64decode(signature_data, validate=True)
+        ImageReader(BytesIO(image)).getSize()
+    except (binascii.Error, ValueError, OSError):
+        return None
+    except Exception:
+        logger.warning('Unreadable signature image', exc_info=True)
+        return None
+    return image
+
+
+def signature_block(agreement, styles):
+    """Signature image and the details of who signed, when and from where"""
+    elements = [Paragraph('<b>Firma</b>', styles['Heading3'])]
+
+    image = decode_signature(agreement.signature_data)
+    if image:
+        elements.append(Image(
+            BytesIO(image),
+            width=SIGNATURE_WIDTH,
+            height=SIGNATURE_HEIGHT,
+            kind='proportional',
+            hAlign='LEFT'
+        ))
+    else:
+        elements.append(Paragraph('Firma no disponible', styles['Normal']))
+
+    signed_at = timezone.localtime(agreement.signed_at).strftime('%d/%m/%Y %H:%M:%S %Z') if agreement.signed_at else 'N/A'
+    elements.append(Spacer(1, 0.1*inch))
+    elements.append(Paragraph(
+        f"""
+        <b>Firmado por:</b> {escape(agreement.signed_by_name or 'N/A')}<br/>
+        <b>Fecha de firma:</b> {signed_at}<br/>
+        <b>Dirección IP:</b> {agreement.ip_address or 'N/A'}
+        """,
+        styles['Normal']
+    ))
+    return KeepTogether(elements)
+
+
+def render(agreement):
+    """Build the PDF of an agreement and return its bytes"""
+    styles = stylesheet()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, title=agreement.title)
+    elements = []
+
+    elements.append(Paragraph(escape(agreement.title), styles['Title']))
+    elements.append(Spacer(1, 0.2*inch))
+
+    info_text = f"""
+    <b>Paciente:</b> {escape(agreement.patient.full_name)}<br/>
+    <b>Tipo:</b> {agreement.get_agreement_type_display()}<br/>
+    <b>Estado:</b> {agreement.get_status_display()}
+    """
+    elements.append(Paragraph(info_text, styles['Normal']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # One paragraph per block of text, keeping single line breaks
+    for block in agreement.content.replace('\r\n', '\n').split('\n\n'):
+        if block.strip():
+            elements.append(Paragraph(escape(block.strip()).replace('\n', '<br/>'), styles['Clause']))
+
+    elements.append(Spacer(1, 0.4*inch))
+    if agreement.status == 'signed':
+        elements.append(signature_block(agreement, styles))
+    else:
+        elements.append(Paragraph('<b>Borrador:</b> este acuerdo aún no ha sido firmado', styles['Small']))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def file_name(agreement):
+    """Name of the stored PDF inside the upload_to directory"""
+    return f'{agreement.patient_id}_{agreement.pk}.pdf'
+
+
+def store_pdf(agreement):
+    """Render a signed agreement into pdf_file, without touching other columns"""
+    agreement.pdf_file.save(file_name(agreement), ContentFile(render(agreement)), save=False)
+    type(agreement).objects.filter(pk=agreement.pk).update(pdf_file=agreement.pdf_file.name)
+    return agreement.pdf_file
+
+
+def schedule_render(agreement_id):
+    """Ask a worker to render a signed agreement; downloads render it if this fails"""
+    from .tasks import render_agreement_pdf
+
+    try:
+        getattr(render_agreement_pdf, 'delay', render_agreement_pdf)(agreement_id)
+    except Exception:
+        logger.warning('Could not queue PDF rendering for agreement %s', agreement_id, exc_info=True)
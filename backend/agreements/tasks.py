@@ -0,0 +1,28 @@
+"""
+Celery tasks for the agreements app
+"""
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Create a dummy decorator if Celery is not available
+    def shared_task(func):
+        return func
+
+
+@shared_task
+def render_agreement_pdf(agreement_id):
+    """
+    Celery task to render a signed agreement into its pdf_file
+    Does nothing for unsigned agreements or when the file already exists
+    """
+    from .models import Agreement
+    from .pdf import store_pdf
+    
+    agreement = Agreement.objects.select_related('patient').filter(
+        pk=agreement_id,
+        status='signed'
+    ).first()
+    if agreement is None or agreement.pdf_file:
+        return None
+    return store_pdf(agreement).name
@@ -0,0 +1,93 @@
+import base64
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient, run_tasks_inline
+from . import pdf
+from .models import Agreement
+from .tasks import render_agreement_pdf
+
+
+def signature_png():
+    """Base64 data URL of a small drawn signature"""
+    image = Image.new('RGB', (200, 80), 'white')
+    for x in range(20, 180):
+        image.putpixel((x, 40 + (x % 10)), (0, 0, 0))
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+class AgreementPDFTestCase(TestCase):
+    """Signed agreement rendering and downloads"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        run_tasks_inline(self, render_agreement_pdf)
+
+        self.client = APIClient()
+        patient = create_patient()
+        self.agreement = Agreement.objects.create(
+            patient=patient,
+            agreement_type='informed_consent',
+            title='Consentimiento <Extracción>',
+            content='Primera cláusula.\n\nSegunda cláusula\ncon salto de línea.',
+        )
+        self.url = f'/api/agreements/{self.agreement.pk}/'
+
+    def sign(self, signature=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.url}sign/', {
+                'signature_data': signature or signature_png(),
+                'signed_by_name': 'Ana López',
+            }, REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 200)
+        return Agreement.objects.get(pk=self.agreement.pk)
+
+    def test_signing_renders_pdf_in_background(self):
+        agreement = self.sign()
+
+        self.assertTrue(agreement.pdf_file)
+        content = agreement.pdf_file.read()
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertIn(b'/Subtype /Image', content)
+        self.assertEqual(agreement.ip_address, '203.0.113.7')
+
+    def test_download_streams_stored_file(self):
+        self.sign()
+        with mock.patch('agreements.pdf.render') as render:
+            response = self.client.get(f'{self.url}download_pdf/')
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_missing_file_is_rendered_on_download(self):
+        with mock.patch('agreements.pdf.schedule_render'):
+            agreement = self.sign()
+        self.assertFalse(agreement.pdf_file)
+
+        response = self.client.get(f'{self.url}download_pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Agreement.objects.get(pk=agreement.pk).pdf_file)
+
+    def test_unsigned_agreement_is_a_draft(self):
+        response = self.client.get(f'{self.url}download_pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertFalse(Agreement.objects.get(pk=self.agreement.pk).pdf_file)
+
+    def test_unreadable_signature_still_renders(self):
+        self.assertIsNone(pdf.decode_signature('not-an-image'))
+        agreement = self.sign(signature='bm90IGFuIGltYWdl')
+        self.assertTrue(agreement.pdf_file.read().startswith(b'%PDF'))
@@ -3,8 +3,12 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from django.db import transaction
 from django.http import HttpResponse
+from _config.downloads import serve_file
+from _config.pagination import KeysetOrderingFilter, ListActionMixin
 from .models import Agreement
+from . import pdf
 from .serializers import (
     AgreementSerializer,
     AgreementListSerializer,
@@ -12,12 +16,12 @@ from .serializers import (
 )
 
 
-class AgreementViewSet(viewsets.ModelViewSet):
+class AgreementViewSet(ListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing agreements
     """
     queryset = Agreement.objects.select_related('patient', 'created_by')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'agreement_type', 'status', 'created_by']
     search_fields = ['title', 'patient__first_name', 'patient__last_name']
     ordering_fields = ['created_at', 'signed_at', 'expires_at']
@@ -60,10 +64,12 @@ class AgreementViewSet(viewsets.ModelViewSet):
         agreement.signed_at = timezone.now()
         agreement.ip_address = ip
         agreement.status = 'signed'
+        # Any earlier file is an unsigned draft
+        agreement.pdf_file = None
         agreement.save()
         
-        # Generate PDF (optional - can be done asynchronously)
-        # self.generate_pdf(agreement)
+        # Render the signed document in a worker once the signature commits
+        transaction.on_commit(lambda: pdf.schedule_render(agreement.pk))
         
         agreement_serializer = self.get_serializer(agreement)
         return Response(agreement_serializer.data)
@@ -87,66 +93,35 @@ class AgreementViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def download_pdf(self, request, pk=None):
-        """Download agreement as PDF"""
-        agreement = self.get_object()
-        
-        if not agreement.pdf_file:
-            # Generate PDF if it doesn't exist
-            pdf_content = self.generate_pdf(agreement)
-            return HttpResponse(pdf_content, content_type='application/pdf')
-        
-        # Return existing PDF file
-        return HttpResponse(
-            agreement.pdf_file.read(),
-            content_type='application/pdf',
-            headers={'Content-Disposition': f'attachment; filename="{agreement.title}.pdf"'}
-        )
-    
-    def generate_pdf(self, agreement):
         """
-        Generate PDF from agreement
-        This is a placeholder - implement with reportlab or weasyprint
-        """
-        from io import BytesIO
-        
-        # TODO: Implement PDF generation with reportlab or weasyprint
-        # For now, return a simple text representation
-        buffer = BytesIO()
-        content = f"""
-        {agreement.title}
-        
-        Paciente: {agreement.patient.full_name}
-        Tipo: {agreement.get_agreement_type_display()}
-        
-        {agreement.content}
-        
-        Firmado por: {agreement.signed_by_name or 'No firmado'}
-        Fecha de firma: {agreement.signed_at or 'No firmado'}
+        Download agreement as PDF
+        Signed agreements stream their stored file; unsigned ones are
+        rendered as drafts and not stored
         """
+        agreement = self.get_object()
+        filename = f'{agreement.title}.pdf'
         
-        buffer.write(content.encode('utf-8'))
-        buffer.seek(0)
+        if agreement.status != 'signed':
+            return HttpResponse(
+                pdf.render(agreement),
+                content_type='application/pdf',
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+            )
         
-        # Save PDF to model
-        from django.core.files.base import ContentFile
-        agreement.pdf_file.save(
-            f"{agreement.patient.id}_{agreement.id}.pdf",
-            ContentFile(buffer.getvalue()),
-            save=True
-        )
+        if not agreement.pdf_file:
+            # The background rendering has not finished (or failed)
+            pdf.store_pdf(agreement)
         
-        return buffer.getvalue()
+        return serve_file(request, agreement.pdf_file, filename=filename)
     
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get all pending agreements"""
         pending = self.queryset.filter(status='pending')
-        serializer = self.get_serializer(pending, many=True)
-        return Response(serializer.data)
+        return self.list_response(pending)
     
     @action(detail=False, methods=['get'])
     def signed(self, request):
         """Get all signed agreements"""
         signed = self.queryset.filter(status='signed')
-        serializer = self.get_serializer(signed, many=True)
-        return Response(serializer.data)
+        return self.list_response(signed)
@@ -0,0 +1,135 @@
+"""
+Precomputed availability grid used by the public booking endpoint.
+
+Each date is cached as a dict mapping dental unit to a bitmap with one bit
+per booking slot (bit 0 is the first slot after opening). Appointments
+without a dental unit are stored under NO_UNIT.
+"""
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Appointment
+
+
+SLOT_MINUTES = 30
+NO_UNIT = ''
+CACHE_KEY = 'appointments:availability:{}'
+
+
+def _seconds(value):
+    """Seconds since midnight for a time value"""
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def slot_count():
+    """Number of booking slots in a business day"""
+    opening = _seconds(Appointment.BUSINESS_START)
+    closing = _seconds(Appointment.BUSINESS_END)
+    return (closing - opening) // (SLOT_MINUTES * 60)
+
+
+def slot_times():
+    """List of (start_time, end_time) tuples for every booking slot"""
+    opening = datetime.combine(datetime.today(), Appointment.BUSINESS_START)
+    slots = []
+    for index in range(slot_count()):
+        start = opening + timedelta(minutes=index * SLOT_MINUTES)
+        slots.append((start.time(), (start + timedelta(minutes=SLOT_MINUTES)).time()))
+    return slots
+
+
+def slot_mask(start_time, end_time):
+    """Bitmap of the slots touched by [start_time, end_time)"""
+    opening = _seconds(Appointment.BUSINESS_START)
+    slot_seconds = SLOT_MINUTES * 60
+    first = max(0, (_seconds(start_time) - opening) // slot_seconds)
+    last = min(slot_count(), -(-(_seconds(end_time) - opening) // slot_seconds))
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def build_grids(dates):
+    """Compute the grids for the given dates from the database in one query"""
+    grids = {day: {} for day in dates}
+    if not grids:
+        return grids
+
+    appointments = Appointment.objects.blocking().filter(
+        date__in=grids.keys()
+    ).values_list('date', 'dental_unit', 'start_time', 'end_time')
+
+    for day, unit, start_time, end_time in appointments:
+        grid = grids[day]
+        key = unit or NO_UNIT
+        grid[key] = grid.get(key, 0) | slot_mask(start_time, end_time)
+    return grids
+
+
+def refresh_dates(dates):
+    """Recompute and cache the grids of the given dates"""
+    grids = build_grids({day for day in dates if day})
+    cache.set_many(
+        {CACHE_KEY.format(day.isoformat()): grid for day, grid in grids.items()},
+        timeout=settings.AVAILABILITY_CACHE_TIMEOUT
+    )
+    return grids
+
+
+def get_grids(dates):
+    """Return {date: grid} using the cache, building missing dates in one query"""
+    dates = list(dates)
+    keys = {CACHE_KEY.format(day.isoformat()): day for day in dates}
+    cached = cache.get_many(keys.keys())
+
+    grids = {keys[key]: grid for key, grid in cached.items()}
+    missing = [day for day in dates if day not in grids]
+    if missing:
+        grids.update(refresh_dates(missing))
+    return grids
+
+
+def busy_mask(grid, dental_unit=None):
+    """Occupied slots for a unit, or for a booking without unit"""
+    if dental_unit:
+        return grid.get(dental_unit, 0)
+    mask = 0
+    for unit_mask in grid.values():
+        mask |= unit_mask
+    return mask
+
+
+def day_slots(grid, units=None):
+    """Serialize the slots of one day with the units free in each slot"""
+    units = settings.DENTAL_UNITS if units is None else units
+    any_unit_mask = busy_mask(grid)
+
+    slots = []
+    for index, (start_time, end_time) in enumerate(slot_times()):
+        bit = 1 << index
+        if units:
+            free_units = [unit for unit in units if not grid.get(unit, 0) & bit]
+            available = bool(free_units)
+        else:
+            free_units = []
+            available = not any_unit_mask & bit
+        slots.append({
+            'start_time': start_time.strftime('%H:%M'),
+            'end_time': end_time.strftime('%H:%M'),
+            'available': available,
+            'available_units': free_units,
+        })
+    return slots
+
+
+def first_free_unit(date, start_time, end_time, units=None):
+    """First configured unit whose grid is free for the given time range"""
+    units = settings.DENTAL_UNITS if units is None else units
+    grid = get_grids([date])[date]
+    mask = slot_mask(start_time, end_time)
+    for unit in units:
+        if not grid.get(unit, 0) & mask:
+            return unit
+    return None
@@ -0,0 +1,148 @@
+"""
+Management command to benchmark appointment conflict detection.
+
+Seeds busy days inside a transaction that is always rolled back, then times
+single checks (Appointment.has_conflicts) and batch checks
+(Appointment.objects.find_conflicts) as the number of appointments per day grows.
+"""
+
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from appointments.models import Appointment
+from patients.models import Patient
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark data"""
+
+
+def seed_day(patient, target_date, count, units):
+    """Bulk insert `count` appointments spread over `units` chairs on one day"""
+    per_unit = -(-count // units)
+    slot_minutes = max(1, (12 * 60) // per_unit)
+    opening = datetime.combine(target_date, time(8, 0))
+    
+    appointments = []
+    for i in range(count):
+        unit_index, position = divmod(i, per_unit)
+        start = opening + timedelta(minutes=position * slot_minutes)
+        appointments.append(Appointment(
+            patient=patient,
+            consultation_type='cleaning',
+            date=target_date,
+            start_time=start.time(),
+            end_time=(start + timedelta(minutes=slot_minutes)).time(),
+            dental_unit=f'Sillón {unit_index + 1}',
+            status='confirmed',
+        ))
+    Appointment.objects.bulk_create(appointments, batch_size=500)
+
+
+def create_benchmark_patient():
+    """Create the throwaway patient that owns the seeded appointments"""
+    return Patient.objects.create(
+        first_name='Benchmark',
+        last_name='Paciente',
+        gender='O',
+        date_of_birth=date(1990, 1, 1),
+        phone='+5215512345678',
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark appointment conflict detection at increasing appointments per day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='50,100,250,500,1000',
+            help='Comma separated appointments-per-day sizes to benchmark',
+        )
+        parser.add_argument(
+            '--units',
+            type=int,
+            default=6,
+            help='Number of dental units to spread appointments over',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=200,
+            help='Number of checks to time per size',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=50,
+            help='Number of candidates per find_conflicts() call',
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        units = options['units']
+        repeat = options['repeat']
+        batch = options['batch']
+        
+        self.stdout.write(
+            f'{"per day":>8} {"has_conflicts":>16} {"queries":>8} '
+            f'{"find_conflicts":>16} {"queries":>8}'
+        )
+        
+        try:
+            with transaction.atomic():
+                patient = create_benchmark_patient()
+                base_date = date.today() + timedelta(days=3650)
+                
+                for offset, size in enumerate(sizes):
+                    target_date = base_date + timedelta(days=offset)
+                    seed_day(patient, target_date, size, units)
+                    self._report(patient, target_date, size, units, repeat, batch)
+                
+                raise _Rollback()
+        except _Rollback:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded data rolled back.'))
+
+    def _report(self, patient, target_date, size, units, repeat, batch):
+        """Time single and batch checks for one seeded day"""
+        probe = Appointment(
+            patient=patient,
+            date=target_date,
+            start_time=time(13, 0),
+            end_time=time(13, 30),
+            dental_unit=f'Sillón {units}',
+        )
+        
+        with CaptureQueriesContext(connection) as single_queries:
+            started = timer.perf_counter()
+            for _ in range(repeat):
+                probe.has_conflicts()
+            single_ms = (timer.perf_counter() - started) * 1000 / repeat
+        
+        candidates = [
+            Appointment(
+                patient=patient,
+                date=target_date,
+                start_time=time(8 + i % 12, 0),
+                end_time=time(8 + i % 12, 30),
+                dental_unit=f'Sillón {i % units + 1}',
+            )
+            for i in range(batch)
+        ]
+        rounds = max(1, repeat // 10)
+        with CaptureQueriesContext(connection) as batch_queries:
+            started = timer.perf_counter()
+            for _ in range(rounds):
+                Appointment.objects.find_conflicts(candidates)
+            batch_ms = (timer.perf_counter() - started) * 1000 / rounds
+        
+        self.stdout.write(
+            f'{size:>8} {single_ms:>13.3f} ms {len(single_queries) // repeat:>8} '
+            f'{batch_ms:>13.3f} ms {len(batch_queries) // rounds:>8}'
+        )
@@ -0,0 +1,110 @@
+"""
+Management command to benchmark the earliest-slot search.
+
+Seeds a window of fully booked days (with seed_day from benchmark_conflicts)
+inside a transaction that is always rolled back, leaves the last day free and
+times find_slots over the whole window with one range query against the
+same search issued one day at a time, as paging through the agenda does.
+"""
+
+import time as timer
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from appointments.slots import find_slots
+from .benchmark_conflicts import _Rollback, create_benchmark_patient, seed_day
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the earliest free slot search over a window of busy days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Number of days in the search window',
+        )
+        parser.add_argument(
+            '--units',
+            type=int,
+            default=6,
+            help='Number of dental units to book and search',
+        )
+        parser.add_argument(
+            '--per-day',
+            type=int,
+            default=72,
+            help='Appointments seeded on each busy day',
+        )
+        parser.add_argument(
+            '--duration',
+            type=int,
+            default=30,
+            help='Length in minutes of the searched slot',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Number of searches to time',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days']
+        unit_count = options['units']
+        repeat = options['repeat']
+        duration = options['duration']
+        units = [f'Sillón {index + 1}' for index in range(unit_count)]
+
+        try:
+            with transaction.atomic():
+                patient = create_benchmark_patient()
+                start_date = date.today() + timedelta(days=3650)
+                end_date = start_date + timedelta(days=days - 1)
+
+                # Every day but the last one is booked on every unit
+                for offset in range(days - 1):
+                    seed_day(patient, start_date + timedelta(days=offset), options['per_day'], unit_count)
+
+                self.stdout.write(
+                    f'{days} days x {unit_count} units, {options["per_day"]} appointments per busy day'
+                )
+                self.stdout.write(f'{"search":>10} {"time":>12} {"queries":>8} {"first slot":>22}')
+
+                def range_search():
+                    return find_slots(start_date, end_date, duration, units=units, limit=10)
+
+                def daily_search():
+                    found = []
+                    for offset in range(days):
+                        day = start_date + timedelta(days=offset)
+                        found += find_slots(day, day, duration, units=units, limit=10 - len(found))
+                        if len(found) >= 10:
+                            break
+                    return found
+
+                self._report('range', range_search, repeat)
+                self._report('per day', daily_search, repeat)
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded data rolled back.'))
+
+    def _report(self, label, search, repeat):
+        """Time one search strategy"""
+        with CaptureQueriesContext(connection) as queries:
+            started = timer.perf_counter()
+            for _ in range(repeat):
+                found = search()
+            elapsed_ms = (timer.perf_counter() - started) * 1000 / repeat
+
+        first = f'{found[0]["date"]} {found[0]["start_time"]:%H:%M}' if found else '-'
+        self.stdout.write(
+            f'{label:>10} {elapsed_ms:>9.3f} ms {len(queries) // repeat:>8} {first:>22}'
+        )
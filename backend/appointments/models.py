@@ -1,7 +1,36 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from patients.models import Patient
 from datetime import datetime, time, timedelta
+from .scheduling import find_conflicts, lock_slot
+
+
+class AppointmentQuerySet(models.QuerySet):
+    """Custom queryset with scheduling lookups"""
+    
+    def blocking(self):
+        """Appointments that occupy their time slot"""
+        return self.filter(status__in=Appointment.BLOCKING_STATUSES)
+    
+    def overlapping(self, date, start_time, end_time, dental_unit=None, exclude_pk=None):
+        """
+        Blocking appointments overlapping [start_time, end_time) on a date.
+        The whole overlap test runs as a single SQL predicate.
+        """
+        queryset = self.blocking().filter(
+            date=date,
+            start_time__lt=end_time,
+            end_time__gt=start_time
+        )
+        if dental_unit:
+            queryset = queryset.filter(dental_unit=dental_unit)
+        if exclude_pk:
+            queryset = queryset.exclude(pk=exclude_pk)
+        return queryset
+    
+    def find_conflicts(self, candidates, check_each_other=True):
+        """Check many (unsaved) appointments against this queryset in one query"""
+        return find_conflicts(candidates, queryset=self, check_each_other=check_each_other)
 
 
 class Appointment(models.Model):
@@ -15,6 +44,16 @@ class Appointment(models.Model):
         ('no_show', 'No Asistió'),
     ]
     
+    # Statuses that keep a time slot occupied
+    BLOCKING_STATUSES = ['pending', 'confirmed']
+    
+    # Business hours (8 AM - 8 PM)
+    BUSINESS_START = time(8, 0)
+    BUSINESS_END = time(20, 0)
+    
+    # Fields that decide which time slot an appointment occupies
+    SCHEDULING_FIELDS = ['date', 'start_time', 'end_time', 'dental_unit', 'status']
+    
     CONSULTATION_TYPE_CHOICES = [
         ('first_visit', 'Primera Visita'),
         ('follow_up', 'Seguimiento'),
@@ -62,6 +101,24 @@ class Appointment(models.Model):
         verbose_name='Estado'
     )
     
+    # Recurring visits (see appointments.series)
+    treatment = models.ForeignKey(
+        'treatments.Treatment',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='appointments',
+        verbose_name='Tratamiento'
+    )
+    series_id = models.UUIDField(
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        verbose_name='Serie',
+        help_text='Identificador común de las citas creadas como una serie'
+    )
+    
     # Telemedicine
     telemedicine_enabled = models.BooleanField(
         default=False,
@@ -112,12 +169,15 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Última Actualización')
     
+    objects = AppointmentQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Cita'
         verbose_name_plural = 'Citas'
         ordering = ['date', 'start_time']
         indexes = [
             models.Index(fields=['date', 'start_time']),
+            models.Index(fields=['date', 'dental_unit', 'start_time']),
             models.Index(fields=['patient', 'date']),
             models.Index(fields=['status']),
         ]
@@ -125,6 +185,22 @@ class Appointment(models.Model):
     def __str__(self):
         return f"{self.patient.full_name} - {self.date} {self.start_time}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the scheduling values loaded from the database"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_schedule = {
+            name: value
+            for name, value in zip(field_names, values)
+            if name in cls.SCHEDULING_FIELDS and value is not models.DEFERRED
+        }
+        return instance
+    
+    @property
+    def previous_schedule(self):
+        """Scheduling values as last loaded from or saved to the database"""
+        return getattr(self, '_loaded_schedule', {})
+    
     @property
     def duration_minutes(self):
         """Calculate appointment duration in minutes"""
@@ -134,10 +210,31 @@ class Appointment(models.Model):
         duration = end - start
         return int(duration.total_seconds() / 60)
     
+    def needs_schedule_check(self):
+        """
+        Whether the slot must be (re)validated: new appointments and changes
+        that move a blocking appointment or make it block again. Edits of
+        other fields and cancellations keep the slot they were validated for.
+        """
+        if self.status not in self.BLOCKING_STATUSES:
+            return False
+        previous = self.previous_schedule
+        if self._state.adding or not previous:
+            return True
+        if previous.get('status') not in self.BLOCKING_STATUSES:
+            return True
+        return any(
+            previous.get(name) != getattr(self, name)
+            for name in ['date', 'start_time', 'end_time', 'dental_unit']
+        )
+    
     def clean(self):
         """Validate appointment data"""
         super().clean()
         
+        if not self.needs_schedule_check():
+            return
+        
         # Validate business hours (8 AM - 8 PM)
         if not self.is_within_business_hours():
             raise ValidationError(
@@ -152,43 +249,42 @@ class Appointment(models.Model):
     
     def is_within_business_hours(self):
         """Check if appointment is within business hours (8 AM - 8 PM)"""
-        business_start = time(8, 0)  # 8:00 AM
-        business_end = time(20, 0)    # 8:00 PM
-        
         return (
-            self.start_time >= business_start and 
-            self.end_time <= business_end and
+            self.start_time >= self.BUSINESS_START and 
+            self.end_time <= self.BUSINESS_END and
             self.start_time < self.end_time
         )
     
     def has_conflicts(self):
         """Check for conflicting appointments"""
-        # Build base queryset
-        conflicts = Appointment.objects.filter(
-            date=self.date,
-            status__in=['pending', 'confirmed']
-        )
-        
-        # Exclude current appointment if updating
-        if self.pk:
-            conflicts = conflicts.exclude(pk=self.pk)
-        
-        # If dental_unit is specified, check for conflicts on that unit
-        if self.dental_unit:
-            conflicts = conflicts.filter(dental_unit=self.dental_unit)
-        
-        # Check for time overlap
-        for appt in conflicts:
-            # Check if times overlap
-            if (self.start_time < appt.end_time and self.end_time > appt.start_time):
-                return True
+        return self.get_conflicts().exists()
+    
+    def get_conflicts(self):
+        """Return the appointments that conflict with this one"""
+        if not (self.date and self.start_time and self.end_time):
+            return Appointment.objects.none()
         
-        return False
+        return Appointment.objects.overlapping(
+            self.date,
+            self.start_time,
+            self.end_time,
+            dental_unit=self.dental_unit,
+            exclude_pk=self.pk
+        )
     
     def save(self, *args, **kwargs):
-        """Override save to run validation"""
-        self.full_clean()
-        super().save(*args, **kwargs)
+        """
+        Validate and save in one pass. The slot is locked before the conflict
+        check, so concurrent bookings of the same chair cannot both pass it.
+        """
+        with transaction.atomic():
+            if self.needs_schedule_check():
+                lock_slot(self.date, self.dental_unit)
+            self.full_clean()
+            super().save(*args, **kwargs)
+        self._loaded_schedule = {
+            name: getattr(self, name) for name in self.SCHEDULING_FIELDS
+        }
 
 
 class AppointmentReminder(models.Model):
@@ -0,0 +1,154 @@
+"""
+Scheduling helpers for detecting appointment conflicts in bulk and for
+serializing concurrent bookings of the same slot
+"""
+import hashlib
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+
+
+class DaySchedule:
+    """Sorted interval index for the appointments of one date/unit"""
+
+    def __init__(self, appointments=()):
+        self._appointments = sorted(appointments, key=lambda a: (a.start_time, a.end_time))
+        self._starts = [a.start_time for a in self._appointments]
+        # Running maximum of end times so the backward scan can stop early
+        # even when legacy data contains overlapping appointments
+        self._max_ends = []
+        max_end = None
+        for appt in self._appointments:
+            if max_end is None or appt.end_time > max_end:
+                max_end = appt.end_time
+            self._max_ends.append(max_end)
+
+    def __len__(self):
+        return len(self._appointments)
+
+    def __iter__(self):
+        return iter(self._appointments)
+
+    def overlapping(self, start_time, end_time, exclude_pk=None):
+        """Return appointments overlapping [start_time, end_time)"""
+        index = bisect_left(self._starts, end_time) - 1
+        found = []
+        while index >= 0 and self._max_ends[index] > start_time:
+            appt = self._appointments[index]
+            if appt.end_time > start_time and (exclude_pk is None or appt.pk != exclude_pk):
+                found.append(appt)
+            index -= 1
+        found.reverse()
+        return found
+
+
+class ConflictIndex:
+    """
+    In-memory index of blocking appointments grouped by date and dental unit.
+
+    Built from a single query; lookups are O(log n + k) per candidate.
+    """
+
+    def __init__(self, appointments):
+        by_unit = defaultdict(list)
+        by_date = defaultdict(list)
+        for appt in appointments:
+            by_unit[(appt.date, appt.dental_unit)].append(appt)
+            by_date[appt.date].append(appt)
+        self._by_unit = {key: DaySchedule(items) for key, items in by_unit.items()}
+        self._by_date = {key: DaySchedule(items) for key, items in by_date.items()}
+
+    @classmethod
+    def for_candidates(cls, candidates, queryset=None):
+        """Load every blocking appointment that could clash with the candidates"""
+        from .models import Appointment
+
+        candidates = list(candidates)
+        if not candidates:
+            return cls([])
+
+        queryset = queryset if queryset is not None else Appointment.objects.all()
+        queryset = queryset.blocking().filter(
+            date__in={c.date for c in candidates}
+        )
+
+        # Unit-less candidates clash with every unit, otherwise narrow by unit
+        units = {c.dental_unit for c in candidates}
+        if None not in units and '' not in units:
+            queryset = queryset.filter(dental_unit__in=units)
+
+        return cls(queryset.only('id', 'date', 'start_time', 'end_time', 'dental_unit', 'status'))
+
+    def schedule_for(self, date, dental_unit=None):
+        """Return the DaySchedule used to check a slot on date/unit"""
+        if dental_unit:
+            return self._by_unit.get((date, dental_unit), DaySchedule())
+        return self._by_date.get(date, DaySchedule())
+
+    def conflicts_for(self, appointment):
+        """Return stored appointments that conflict with the given one"""
+        return self.schedule_for(appointment.date, appointment.dental_unit).overlapping(
+            appointment.start_time,
+            appointment.end_time,
+            exclude_pk=appointment.pk
+        )
+
+
+def _candidates_clash(first, second):
+    """Check whether two unsaved candidates overlap each other"""
+    if first.date != second.date:
+        return False
+    if first.dental_unit and second.dental_unit and first.dental_unit != second.dental_unit:
+        return False
+    return first.start_time < second.end_time and first.end_time > second.start_time
+
+
+def find_conflicts(candidates, queryset=None, check_each_other=True):
+    """
+    Check many appointments for conflicts in one query.
+
+    Returns a dict mapping the position of each conflicting candidate to the
+    list of appointments it clashes with. When check_each_other is True,
+    candidates are also checked against earlier candidates in the list.
+    """
+    candidates = list(candidates)
+    index = ConflictIndex.for_candidates(candidates, queryset=queryset)
+
+    conflicts = {}
+    for position, candidate in enumerate(candidates):
+        found = index.conflicts_for(candidate)
+        if check_each_other:
+            found += [
+                other for other in candidates[:position]
+                if _candidates_clash(candidate, other)
+            ]
+        if found:
+            conflicts[position] = found
+    return conflicts
+
+
+def _lock_key(*parts):
+    """Signed 64-bit advisory lock key for a slot"""
+    digest = hashlib.blake2b(':'.join(['appointments', *map(str, parts)]).encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), 'big', signed=True)
+
+
+def lock_slot(date, dental_unit=None):
+    """
+    Serialize bookings of a date/unit until the current transaction ends.
+
+    A booking on a unit holds the date lock shared and the unit lock
+    exclusively, so different chairs book in parallel. A booking without a
+    unit clashes with every unit and holds the date lock exclusively.
+    Uses PostgreSQL transaction-level advisory locks; on other databases
+    (SQLite in local tests) it does nothing.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        if dental_unit:
+            cursor.execute('SELECT pg_advisory_xact_lock_shared(%s)', [_lock_key(date)])
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [_lock_key(date, dental_unit)])
+        else:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [_lock_key(date)])
@@ -1,5 +1,9 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
 from rest_framework import serializers
+from patients.models import Patient
+from treatments.models import Treatment
 from .models import Appointment, AppointmentReminder
+from .series import FREQUENCIES, MAX_OCCURRENCES, build_series, occurrence_dates
 
 
 class AppointmentReminderSerializer(serializers.ModelSerializer):
@@ -8,6 +12,32 @@ class AppointmentReminderSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class AppointmentAgendaSerializer(serializers.ModelSerializer):
+    """Compact, read-only appointment for calendar views (no reminders)"""
+    
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    duration_minutes = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = Appointment
+        fields = [
+            'id',
+            'patient',
+            'patient_name',
+            'consultation_type',
+            'date',
+            'start_time',
+            'end_time',
+            'duration_minutes',
+            'dental_unit',
+            'status',
+            'telemedicine_enabled',
+            'public_booking',
+            'reminder_sent',
+        ]
+        read_only_fields = fields
+
+
 class AppointmentSerializer(serializers.ModelSerializer):
     """Serializer for Appointment model"""
     
@@ -28,6 +58,8 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'duration_minutes',
             'dental_unit',
             'status',
+            'treatment',
+            'series_id',
             'telemedicine_enabled',
             'video_link',
             'public_booking',
@@ -41,23 +73,84 @@ class AppointmentSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
-    def validate(self, data):
-        """Custom validation"""
-        # Create a temporary appointment object for validation
-        instance = self.instance or Appointment()
-        for key, value in data.items():
-            setattr(instance, key, value)
+    def create(self, validated_data):
+        # Business hours and conflicts are checked once, by Appointment.save()
+        # under the slot lock
+        try:
+            return super().create(validated_data)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+    
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(serializers.as_serializer_error(exc))
+
+
+class AppointmentSeriesSerializer(serializers.Serializer):
+    """
+    Recurring visits: `count` occurrences every `interval` weeks or months
+    from `start_date`. With a treatment, the patient, the number of
+    remaining sessions and, for orthodontic cases, monthly adjustments are
+    taken from it unless given.
+    """
+    
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all(), required=False)
+    treatment = serializers.PrimaryKeyRelatedField(
+        queryset=Treatment.objects.select_related('patient', 'orthodontic_case'),
+        required=False,
+        allow_null=True
+    )
+    consultation_type = serializers.ChoiceField(choices=Appointment.CONSULTATION_TYPE_CHOICES, required=False)
+    start_date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    dental_unit = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    status = serializers.ChoiceField(choices=Appointment.BLOCKING_STATUSES, default='pending')
+    frequency = serializers.ChoiceField(choices=FREQUENCIES, required=False)
+    interval = serializers.IntegerField(min_value=1, max_value=12, default=1)
+    count = serializers.IntegerField(min_value=1, max_value=MAX_OCCURRENCES, required=False)
+    telemedicine_enabled = serializers.BooleanField(default=False)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    use_alternatives = serializers.BooleanField(
+        default=False,
+        help_text='Mover las citas que chocan a su primera alternativa libre'
+    )
+    
+    def validate(self, attrs):
+        treatment = attrs.get('treatment')
+        patient = attrs.get('patient')
+        if treatment is not None:
+            if patient is not None and patient.pk != treatment.patient_id:
+                raise serializers.ValidationError({'treatment': 'El tratamiento no pertenece a este paciente'})
+            attrs['patient'] = treatment.patient
+        elif patient is None:
+            raise serializers.ValidationError({'patient': 'Indique el paciente o el tratamiento'})
         
-        # Check business hours
-        if not instance.is_within_business_hours():
-            raise serializers.ValidationError(
-                'Las citas deben ser entre las 8:00 AM y las 8:00 PM'
-            )
+        orthodontic = treatment is not None and hasattr(treatment, 'orthodontic_case')
+        attrs.setdefault('frequency', 'monthly' if orthodontic else 'weekly')
+        attrs.setdefault('consultation_type', 'orthodontics' if orthodontic else 'follow_up')
         
-        # Check conflicts (only if not updating or if date/time changed)
-        if instance.has_conflicts():
-            raise serializers.ValidationError(
-                'Ya existe una cita en este horario para esta unidad dental'
-            )
+        if 'count' not in attrs:
+            remaining = treatment.total_sessions - treatment.completed_sessions if treatment else 0
+            if remaining < 1:
+                raise serializers.ValidationError({'count': 'Indique el número de citas de la serie'})
+            attrs['count'] = min(remaining, MAX_OCCURRENCES)
         
-        return data
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError({'end_time': 'La hora de fin debe ser posterior a la de inicio'})
+        return attrs
+    
+    def build(self, **extra):
+        """Unsaved appointments of the validated series"""
+        data = dict(self.validated_data)
+        dates = occurrence_dates(
+            data.pop('start_date'),
+            data.pop('frequency'),
+            data.pop('count'),
+            data.pop('interval')
+        )
+        data.pop('use_alternatives')
+        data['dental_unit'] = data.get('dental_unit') or None
+        return build_series(dates, **data, **extra)
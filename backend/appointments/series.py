@@ -0,0 +1,222 @@
+"""
+Recurring appointment series.
+
+A series repeats one visit (patient, time, unit) weekly or monthly for a
+number of occurrences, like an RRULE with FREQ, INTERVAL and COUNT. Monthly
+occurrences keep the day of the month, moved back to the last day in
+shorter months.
+
+The whole series is checked against the blocking appointments of its date
+range in one query, and every clashing occurrence gets the first free
+alternative: the same time on another unit, a later time that day, then the
+following days up to ALTERNATIVE_DAYS ahead. The series is inserted with a
+single bulk_create inside one transaction, holding the slot locks of all its
+dates, so either every occurrence is booked or none is.
+"""
+import uuid
+from calendar import monthrange
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from patients.summary import invalidate_summaries
+from reports.snapshots import DashboardSnapshot, appointment_contribution
+from . import availability
+from .models import Appointment
+from .scheduling import ConflictIndex, _candidates_clash, lock_slot
+
+
+FREQUENCIES = ['weekly', 'monthly']
+
+MAX_OCCURRENCES = 52
+
+# Days after a clashing occurrence searched for an alternative
+ALTERNATIVE_DAYS = 14
+
+
+def add_months(day, months):
+    """Same day of the month `months` later, clamped to the month's last day"""
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def occurrence_dates(start_date, frequency, count, interval=1):
+    """Dates of a series, starting on start_date"""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f'Unknown frequency {frequency!r}')
+    if frequency == 'weekly':
+        return [start_date + timedelta(weeks=interval * index) for index in range(count)]
+    return [add_months(start_date, interval * index) for index in range(count)]
+
+
+def build_series(dates, **fields):
+    """Unsaved appointments of a series, one per date, sharing a series_id"""
+    series_id = uuid.uuid4()
+    return [Appointment(date=day, series_id=series_id, **fields) for day in dates]
+
+
+def load_index(appointments, days=ALTERNATIVE_DAYS):
+    """Blocking appointments of the series' range and its alternative window"""
+    dates = [appointment.date for appointment in appointments]
+    queryset = Appointment.objects.blocking().filter(
+        date__gte=min(dates),
+        date__lte=max(dates) + timedelta(days=days)
+    )
+    return ConflictIndex(queryset.only('id', 'date', 'start_time', 'end_time', 'dental_unit', 'status'))
+
+
+def _is_free(index, booked, candidate):
+    """Whether a candidate clashes neither stored nor already booked appointments"""
+    if index.conflicts_for(candidate):
+        return False
+    return not any(_candidates_clash(candidate, other) for other in booked)
+
+
+def _start_times(preferred, duration):
+    """Slot start times of a day that fit the duration, nearest to preferred first"""
+    opening = datetime.combine(datetime.today(), Appointment.BUSINESS_START)
+    closing = datetime.combine(datetime.today(), Appointment.BUSINESS_END)
+    starts = []
+    start = opening
+    while start + duration <= closing:
+        starts.append(start)
+        start += timedelta(minutes=availability.SLOT_MINUTES)
+    preferred = datetime.combine(datetime.today(), preferred)
+    return sorted(starts, key=lambda start: abs(start - preferred))
+
+
+def find_alternative(appointment, index, booked=(), days=ALTERNATIVE_DAYS, units=None):
+    """
+    First free slot of the same length for a clashing appointment, or None.
+    Returns an unsaved copy moved to that slot.
+    """
+    units = settings.DENTAL_UNITS if units is None else units
+    # A visit without unit stays without unit, otherwise try its unit first
+    if appointment.dental_unit:
+        unit_order = [appointment.dental_unit] + [u for u in units if u != appointment.dental_unit]
+    else:
+        unit_order = [appointment.dental_unit]
+
+    duration = (
+        datetime.combine(datetime.today(), appointment.end_time)
+        - datetime.combine(datetime.today(), appointment.start_time)
+    )
+    starts = _start_times(appointment.start_time, duration)
+    requested = datetime.combine(datetime.today(), appointment.start_time)
+
+    for offset in range(days + 1):
+        day = appointment.date + timedelta(days=offset)
+        for start in starts:
+            # Nothing earlier than the requested time on the requested day
+            if offset == 0 and start < requested:
+                continue
+            for unit in unit_order:
+                candidate = Appointment(
+                    patient_id=appointment.patient_id,
+                    date=day,
+                    start_time=start.time(),
+                    end_time=(start + duration).time(),
+                    dental_unit=unit,
+                    status=appointment.status,
+                )
+                if _is_free(index, booked, candidate):
+                    return candidate
+    return None
+
+
+def check_series(appointments, index=None):
+    """
+    Check every occurrence of a series in one query.
+    Returns {position: alternative or None} for the clashing occurrences.
+    """
+    appointments = list(appointments)
+    if not appointments:
+        return {}
+    index = load_index(appointments) if index is None else index
+
+    clashes = {}
+    booked = []
+    for position, appointment in enumerate(appointments):
+        if _is_free(index, booked, appointment):
+            booked.append(appointment)
+            continue
+        alternative = find_alternative(appointment, index, booked)
+        clashes[position] = alternative
+        # Later occurrences must not take the slot offered here
+        if alternative is not None:
+            booked.append(alternative)
+    return clashes
+
+
+def validate_series(appointments):
+    """Field and business hour checks of every occurrence, without queries"""
+    for appointment in appointments:
+        # The patient and treatment were validated by the caller
+        appointment.clean_fields(exclude=['patient', 'treatment'])
+        if not appointment.is_within_business_hours():
+            raise ValidationError('Las citas deben ser entre las 8:00 AM y las 8:00 PM')
+
+
+def _move(appointment, alternative):
+    """Give an occurrence the slot of its alternative"""
+    for name in ['date', 'start_time', 'end_time', 'dental_unit']:
+        setattr(appointment, name, getattr(alternative, name))
+
+
+class SeriesConflict(Exception):
+    """Some occurrences of a series clash; clashes maps position to alternative"""
+
+    def __init__(self, clashes):
+        super().__init__(clashes)
+        self.clashes = clashes
+
+
+def create_series(appointments, use_alternatives=False):
+    """
+    Insert a series atomically. Raises SeriesConflict, and inserts nothing,
+    when any occurrence clashes; with use_alternatives the clashing
+    occurrences are moved to their alternatives instead, as long as each
+    one has one.
+
+    bulk_create sends no signals, so the availability grids, dashboard
+    counters and patient summaries are updated here, once for the series.
+    """
+    appointments = list(appointments)
+    validate_series(appointments)
+
+    with transaction.atomic():
+        if use_alternatives:
+            clashes = check_series(appointments)
+            if None in clashes.values():
+                raise SeriesConflict(clashes)
+            for position, alternative in clashes.items():
+                _move(appointments[position], alternative)
+
+        # Same lock order in every transaction, so two series cannot deadlock
+        slots = sorted({(a.date, a.dental_unit or '') for a in appointments})
+        for day, unit in slots:
+            lock_slot(day, unit or None)
+
+        clashes = check_series(appointments)
+        if clashes:
+            raise SeriesConflict(clashes)
+        created = Appointment.objects.bulk_create(appointments)
+
+        dates = {appointment.date for appointment in created}
+        delta = Counter()
+        for appointment in created:
+            delta.update(appointment_contribution(appointment))
+        patient_ids = {appointment.patient_id for appointment in created}
+        transaction.on_commit(lambda: availability.refresh_dates(dates))
+        transaction.on_commit(lambda: DashboardSnapshot.apply(dict(delta)))
+        transaction.on_commit(lambda: invalidate_summaries(patient_ids))
+
+    for appointment in created:
+        appointment._loaded_schedule = {
+            name: getattr(appointment, name) for name in Appointment.SCHEDULING_FIELDS
+        }
+    return created
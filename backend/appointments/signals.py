@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Appointment
+from . import availability
+
+
+def _schedule_changed(instance, created):
+    """Check whether a save touched the slot an appointment occupies"""
+    if created:
+        return True
+    previous = instance.previous_schedule
+    return any(
+        previous.get(name) != getattr(instance, name)
+        for name in Appointment.SCHEDULING_FIELDS
+    )
+
+
+@receiver(post_save, sender=Appointment)
+def refresh_availability_on_save(sender, instance, created, raw=False, **kwargs):
+    """Recompute the availability grid of the dates an appointment moved between"""
+    if raw or not _schedule_changed(instance, created):
+        return
+    
+    dates = {instance.date, instance.previous_schedule.get('date')}
+    transaction.on_commit(lambda: availability.refresh_dates(dates))
+
+
+@receiver(post_delete, sender=Appointment)
+def refresh_availability_on_delete(sender, instance, **kwargs):
+    """Free the slot of a deleted appointment"""
+    dates = {instance.date}
+    transaction.on_commit(lambda: availability.refresh_dates(dates))
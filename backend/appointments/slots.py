@@ -0,0 +1,155 @@
+"""
+Earliest free slots across dental units and dates.
+
+find_slots() reads the blocking appointments of the whole date window in one
+query, ordered by date, and sweeps it day by day: the busy intervals of each
+unit are merged, their complement inside the business hours (narrowed to the
+requested time of day) gives the free intervals, and every start time on the
+step grid is offered with the units whose free interval fits the duration.
+The sweep stops at the first `limit` start times, so when the window is
+served by a server-side cursor (PostgreSQL) the later days are not read.
+"""
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.conf import settings
+
+from . import availability
+from .models import Appointment
+
+
+# Longest date window served by one search
+MAX_SEARCH_DAYS = 120
+
+MAX_RESULTS = 100
+
+# Rows fetched per round trip while sweeping the window
+CHUNK_SIZE = 2000
+
+
+def _minutes(value, round_up=False):
+    """Minutes since midnight for a time value"""
+    extra = 1 if round_up and (value.second or value.microsecond) else 0
+    return value.hour * 60 + value.minute + extra
+
+
+def _time(minutes):
+    return time(minutes // 60, minutes % 60)
+
+
+def merge_intervals(intervals):
+    """Sorted, non-overlapping union of (start, end) intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def free_intervals(busy, opening, closing):
+    """Gaps between merged busy intervals inside [opening, closing)"""
+    gaps = []
+    cursor = opening
+    for start, end in merge_intervals(busy):
+        if start > cursor:
+            gaps.append((cursor, min(start, closing)))
+        cursor = max(cursor, end)
+        if cursor >= closing:
+            break
+    if cursor < closing:
+        gaps.append((cursor, closing))
+    return [(start, end) for start, end in gaps if end > start]
+
+
+def day_starts(busy, units, opening, closing, duration, step, anchor):
+    """
+    Yield (start, free units) for each grid start of one day where at least
+    one unit is free for `duration` minutes, in time order.
+    """
+    gaps = {unit: free_intervals(busy.get(unit, ()), opening, closing) for unit in units}
+    positions = dict.fromkeys(units, 0)
+
+    # First grid point (anchor + k * step) not before the opening
+    start = anchor + max(0, -(-(opening - anchor) // step)) * step
+    while start + duration <= closing:
+        free = []
+        next_start = None
+        for unit in units:
+            unit_gaps = gaps[unit]
+            # Gaps are sorted, so each unit's pointer only moves forward
+            index = positions[unit]
+            while index < len(unit_gaps) and unit_gaps[index][1] < start + duration:
+                index += 1
+            positions[unit] = index
+            if index == len(unit_gaps):
+                continue
+            gap_start = unit_gaps[index][0]
+            if gap_start <= start:
+                free.append(unit)
+            elif next_start is None or gap_start < next_start:
+                next_start = gap_start
+        if free:
+            yield start, free
+            start += step
+        elif next_start is None:
+            return
+        else:
+            # Jump to the grid point of the earliest gap still ahead
+            start += max(1, -(-(next_start - start) // step)) * step
+
+
+def find_slots(start_date, end_date, duration, units=None, earliest=None, latest=None,
+               weekdays=None, limit=10, step=None, not_before=None):
+    """
+    The `limit` earliest start times between start_date and end_date where
+    some unit is free for `duration` minutes, with the free units of each.
+
+    earliest/latest bound the time of day, weekdays (0 = Monday) the days,
+    and not_before (a datetime) skips what already passed today.
+    """
+    units = list(settings.DENTAL_UNITS if units is None else units)
+    step = step or availability.SLOT_MINUTES
+    anchor = _minutes(Appointment.BUSINESS_START)
+    opening = max(anchor, _minutes(earliest, round_up=True) if earliest else 0)
+    closing = min(_minutes(Appointment.BUSINESS_END), _minutes(latest) if latest else 24 * 60)
+    if not units or duration <= 0 or closing - opening < duration:
+        return []
+
+    # Unit-less appointments do not block a unit, the same rule as the
+    # conflict check on save
+    rows = Appointment.objects.blocking().filter(
+        date__gte=start_date,
+        date__lte=end_date,
+        dental_unit__in=units
+    ).order_by('date').values_list('date', 'dental_unit', 'start_time', 'end_time')
+    rows = rows.iterator(chunk_size=CHUNK_SIZE)
+    pending = next(rows, None)
+
+    slots = []
+    day = start_date
+    while day <= end_date:
+        busy = defaultdict(list)
+        while pending is not None and pending[0] == day:
+            busy[pending[1]].append((_minutes(pending[2]), _minutes(pending[3], round_up=True)))
+            pending = next(rows, None)
+
+        day_opening = opening
+        if not_before is not None and day <= not_before.date():
+            day_opening = closing if day < not_before.date() else max(opening, _minutes(not_before.time(), round_up=True))
+
+        if weekdays is None or day.weekday() in weekdays:
+            for start, free in day_starts(busy, units, day_opening, closing, duration, step, anchor):
+                slots.append({
+                    'date': day,
+                    'start_time': _time(start),
+                    'end_time': _time(start + duration),
+                    'available_units': free,
+                })
+                if len(slots) >= limit:
+                    return slots
+        day += timedelta(days=1)
+    return slots
+
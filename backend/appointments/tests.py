@@ -1,3 +1,667 @@
-from django.test import TestCase
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient
+from patients.models import Patient
+from treatments.models import OrthodonticCase, Treatment
+from .models import Appointment, AppointmentReminder
+from . import availability, series, slots
+from .management.commands.benchmark_conflicts import seed_day
+
+
+class AppointmentConflictTestCase(TestCase):
+    """Conflict detection for single and batch checks"""
+
+    def setUp(self):
+        self.patient = create_patient()
+        self.day = date.today() + timedelta(days=7)
+        self.existing = Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=self.day,
+            start_time=time(10, 0),
+            end_time=time(11, 0),
+            dental_unit='Sillón 1',
+        )
+
+    def build(self, start, end, unit='Sillón 1', **kwargs):
+        return Appointment(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=kwargs.pop('date', self.day),
+            start_time=start,
+            end_time=end,
+            dental_unit=unit,
+            **kwargs
+        )
+
+    def test_overlap_on_same_unit_conflicts(self):
+        self.assertTrue(self.build(time(10, 30), time(11, 30)).has_conflicts())
+        self.assertTrue(self.build(time(9, 0), time(12, 0)).has_conflicts())
+
+    def test_adjacent_slots_do_not_conflict(self):
+        self.assertFalse(self.build(time(11, 0), time(11, 30)).has_conflicts())
+        self.assertFalse(self.build(time(9, 30), time(10, 0)).has_conflicts())
+
+    def test_other_unit_does_not_conflict(self):
+        self.assertFalse(self.build(time(10, 0), time(11, 0), unit='Sillón 2').has_conflicts())
+
+    def test_appointment_without_unit_checks_every_unit(self):
+        self.assertTrue(self.build(time(10, 0), time(11, 0), unit=None).has_conflicts())
+
+    def test_cancelled_appointments_do_not_block(self):
+        Appointment.objects.filter(pk=self.existing.pk).update(status='cancelled')
+        self.assertFalse(self.build(time(10, 0), time(11, 0)).has_conflicts())
+
+    def test_updating_does_not_conflict_with_itself(self):
+        self.existing.notes = 'Traer radiografías'
+        self.existing.save()
+        self.assertFalse(self.existing.has_conflicts())
+
+    def test_save_rejects_conflicting_appointment(self):
+        with self.assertRaises(ValidationError):
+            self.build(time(10, 15), time(10, 45)).save()
+
+    def test_single_check_is_one_query_on_busy_day(self):
+        busy_day = self.day + timedelta(days=1)
+        seed_day(self.patient, busy_day, 600, units=6)
+        probe = self.build(time(13, 0), time(13, 30), unit='Sillón 3', date=busy_day)
+        with self.assertNumQueries(1):
+            self.assertTrue(probe.has_conflicts())
+
+    def test_find_conflicts_checks_batch_in_one_query(self):
+        candidates = [
+            self.build(time(8, 0), time(8, 30)),
+            self.build(time(10, 30), time(11, 30)),
+            self.build(time(10, 30), time(11, 30), unit='Sillón 2'),
+            self.build(time(10, 45), time(11, 15), unit='Sillón 2'),
+        ]
+        with self.assertNumQueries(1):
+            conflicts = Appointment.objects.find_conflicts(candidates)
+
+        self.assertEqual(sorted(conflicts), [1, 3])
+        self.assertEqual(conflicts[1], [self.existing])
+        self.assertEqual(conflicts[3], [candidates[2]])
+
+    def test_find_conflicts_on_busy_day(self):
+        busy_day = self.day + timedelta(days=1)
+        seed_day(self.patient, busy_day, 600, units=6)
+        candidates = [
+            self.build(time(8 + i % 12, 0), time(8 + i % 12, 30), unit=f'Sillón {i % 6 + 1}', date=busy_day)
+            for i in range(30)
+        ]
+        with self.assertNumQueries(1):
+            conflicts = Appointment.objects.find_conflicts(candidates, check_each_other=False)
+
+        for position, candidate in enumerate(candidates):
+            self.assertEqual(position in conflicts, candidate.has_conflicts())
+
+
+@override_settings(DENTAL_UNITS=['Sillón 1', 'Sillón 2'])
+class PublicBookingAvailabilityTestCase(TestCase):
+    """Availability grid behind the public_booking endpoint"""
+
+    url = '/api/appointments/public_booking/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.day = date.today() + timedelta(days=7)
+
+    def book(self, start, end, unit='Sillón 1', day=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                patient=self.patient,
+                consultation_type='cleaning',
+                date=day or self.day,
+                start_time=start,
+                end_time=end,
+                dental_unit=unit,
+            )
+
+    def slot(self, slots, start):
+        return next(s for s in slots if s['start_time'] == start)
+
+    def test_slot_mask(self):
+        self.assertEqual(availability.slot_mask(time(8, 0), time(8, 30)), 0b1)
+        self.assertEqual(availability.slot_mask(time(8, 15), time(9, 0)), 0b11)
+        self.assertEqual(availability.slot_mask(time(19, 30), time(20, 0)), 1 << 23)
+
+    def test_booking_on_one_unit_keeps_other_units_available(self):
+        self.book(time(10, 0), time(11, 0))
+
+        response = self.client.get(self.url, {'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        slot = self.slot(response.data['slots'], '10:00')
+        self.assertTrue(slot['available'])
+        self.assertEqual(slot['available_units'], ['Sillón 2'])
+
+        response = self.client.get(self.url, {'date': self.day.isoformat(), 'unit': 'Sillón 1'})
+        self.assertFalse(self.slot(response.data['slots'], '10:30')['available'])
+        self.assertTrue(self.slot(response.data['slots'], '11:00')['available'])
+
+    def test_grid_is_updated_when_appointment_is_cancelled(self):
+        appointment = self.book(time(10, 0), time(11, 0))
+        self.book(time(10, 0), time(11, 0), unit='Sillón 2')
+        self.assertEqual(availability.first_free_unit(self.day, time(10, 0), time(10, 30)), None)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'cancelled'
+            appointment.save()
+
+        with self.assertNumQueries(0):
+            unit = availability.first_free_unit(self.day, time(10, 0), time(10, 30))
+        self.assertEqual(unit, 'Sillón 1')
+
+    def test_grid_follows_appointment_to_new_date(self):
+        appointment = self.book(time(9, 0), time(9, 30))
+        new_day = self.day + timedelta(days=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.date = new_day
+            appointment.save()
+
+        grids = availability.get_grids([self.day, new_day])
+        self.assertEqual(grids[self.day], {})
+        self.assertEqual(grids[new_day], {'Sillón 1': 0b100})
+
+    def test_range_query_uses_one_query_for_cold_cache(self):
+        self.book(time(10, 0), time(11, 0), day=self.day + timedelta(days=3))
+        cache.clear()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'date': self.day.isoformat(), 'days': 14})
+        self.assertEqual(len(response.data['days']), 14)
+
+        with self.assertNumQueries(0):
+            self.client.get(self.url, {'date': self.day.isoformat(), 'days': 14})
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get(self.url, {'date': self.day.isoformat(), 'days': 500})
+        self.assertEqual(response.status_code, 400)
+
+    def test_public_booking_assigns_free_unit(self):
+        self.book(time(10, 0), time(11, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {
+                'patient': self.patient.pk,
+                'consultation_type': 'first_visit',
+                'date': self.day.isoformat(),
+                'start_time': '10:00',
+                'end_time': '10:30',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['appointment']['dental_unit'], 'Sillón 2')
+
+
+class AgendaTestCase(TestCase):
+    """Daily, weekly and monthly agenda views"""
+
+    url = '/api/appointments/agenda/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.day = date(2030, 1, 16)
+        for offset, unit in [(0, 'Sillón 1'), (0, 'Sillón 2'), (1, 'Sillón 1'), (10, 'Sillón 2')]:
+            for hour in (9, 12):
+                Appointment.objects.create(
+                    patient=self.patient,
+                    consultation_type='cleaning',
+                    date=self.day + timedelta(days=offset),
+                    start_time=time(hour, 0),
+                    end_time=time(hour, 30),
+                    dental_unit=unit,
+                )
+
+    def test_weekly_agenda_groups_by_day(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'view': 'weekly', 'date': '2030-01-16'})
+        self.assertEqual(response.status_code, 200)
+
+        days = response.data['days']
+        self.assertEqual(len(days), 7)
+        self.assertEqual(response.data['week_start'], date(2030, 1, 14))
+        self.assertEqual(len(days['2030-01-16']['appointments']), 4)
+        self.assertEqual(len(days['2030-01-17']['appointments']), 2)
+        self.assertEqual(days['2030-01-14']['appointments'], [])
+        starts = [a['start_time'] for a in days['2030-01-16']['appointments']]
+        self.assertEqual(starts, sorted(starts))
+
+    def test_monthly_agenda(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, {'view': 'monthly', 'date': '2030-01-16'})
+        self.assertEqual(response.status_code, 200)
+
+        days = response.data['days']
+        self.assertEqual(len(days), 31)
+        self.assertEqual(response.data['month_end'], date(2030, 1, 31))
+        self.assertEqual(sum(len(d['appointments']) for d in days.values()), 8)
+
+    def test_agenda_query_count_does_not_grow(self):
+        for hour in range(13, 19):
+            Appointment.objects.create(
+                patient=self.patient,
+                consultation_type='cleaning',
+                date=self.day + timedelta(days=2),
+                start_time=time(hour, 0),
+                end_time=time(hour, 30),
+                dental_unit='Sillón 3',
+            )
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {'view': 'weekly', 'date': '2030-01-16'})
+
+    def test_units_filter(self):
+        response = self.client.get(self.url, {'view': 'monthly', 'date': '2030-01-16', 'units': 'Sillón 2'})
+        appointments = [a for d in response.data['days'].values() for a in d['appointments']]
+        self.assertEqual(len(appointments), 4)
+        self.assertTrue(all(a['dental_unit'] == 'Sillón 2' for a in appointments))
+
+        response = self.client.get(self.url, {'date': '2030-01-16', 'units': 'Sillón 1,Sillón 2'})
+        self.assertEqual(len(response.data['appointments']), 4)
+
+    def test_invalid_view(self):
+        response = self.client.get(self.url, {'view': 'yearly'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AppointmentListQueriesTestCase(TestCase):
+    """Lists render in a fixed number of queries, reminders included"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.today = timezone.localdate()
+        self.create_day(3)
+
+    def create_day(self, count):
+        patient = create_patient(first_name=f'Paciente {Patient.objects.count()}')
+        for hour in range(9, 9 + count):
+            appointment = Appointment.objects.create(
+                patient=patient,
+                consultation_type='cleaning',
+                date=self.today,
+                start_time=time(hour, 0),
+                end_time=time(hour, 30),
+                dental_unit=f'Sillón {Patient.objects.count()}',
+            )
+            AppointmentReminder.objects.create(appointment=appointment, method='sms')
+
+    def assertQueriesDoNotGrow(self, url, queries, **params):
+        with self.assertNumQueries(queries):
+            first = self.client.get(url, params)
+        self.create_day(4)
+        with self.assertNumQueries(queries):
+            second = self.client.get(url, params)
+        self.assertEqual(first.status_code, 200)
+        return second
+
+    def test_list_prefetches_reminders(self):
+        response = self.assertQueriesDoNotGrow('/api/appointments/', 2)
+        results = response.data['results']
+        self.assertEqual(len(results), 7)
+        self.assertEqual(len(results[0]['reminders']), 1)
+
+    def test_calendar_actions_use_the_compact_serializer(self):
+        for action in ['today', 'week', 'month']:
+            with self.subTest(action=action):
+                response = self.assertQueriesDoNotGrow(f'/api/appointments/{action}/', 1)
+                row = response.data['results'][0]
+                self.assertNotIn('reminders', row)
+                self.assertIn('patient_name', row)
+
+    def test_daily_agenda(self):
+        response = self.assertQueriesDoNotGrow('/api/appointments/agenda/', 1, view='daily')
+        self.assertEqual(len(response.data['appointments']), 7)
+
+
+class AppointmentWritePathTestCase(TestCase):
+    """Business hours and conflicts are validated once, under the slot lock"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.day = date(2030, 1, 16)
+        self.existing = Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=self.day,
+            start_time=time(10, 0),
+            end_time=time(11, 0),
+            dental_unit='Sillón 1',
+        )
+
+    def payload(self, **kwargs):
+        data = {
+            'patient': self.patient.pk,
+            'consultation_type': 'cleaning',
+            'date': '2030-01-16',
+            'start_time': '12:00',
+            'end_time': '12:30',
+            'dental_unit': 'Sillón 1',
+        }
+        data.update(kwargs)
+        return data
+
+    def spy(self):
+        """Count conflict checks and slot locks"""
+        checks = mock.patch.object(
+            Appointment, 'has_conflicts', autospec=True, side_effect=Appointment.has_conflicts
+        )
+        locks = mock.patch('appointments.models.lock_slot')
+        checks_mock, locks_mock = checks.start(), locks.start()
+        self.addCleanup(checks.stop)
+        self.addCleanup(locks.stop)
+        return checks_mock, locks_mock
+
+    def test_create_checks_conflicts_once_under_the_lock(self):
+        checks, locks = self.spy()
+        response = self.client.post('/api/appointments/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(checks.call_count, 1)
+        locks.assert_called_once_with(self.day, 'Sillón 1')
+
+    def test_conflicts_and_business_hours_are_reported(self):
+        response = self.client.post(
+            '/api/appointments/', self.payload(start_time='10:30', end_time='11:30'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Ya existe una cita', str(response.data))
+
+        response = self.client.post(
+            '/api/appointments/', self.payload(start_time='20:00', end_time='20:30'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('8:00 AM', str(response.data))
+
+    def test_non_scheduling_edits_skip_revalidation(self):
+        checks, locks = self.spy()
+        url = f'/api/appointments/{self.existing.pk}/'
+        for data in [{'notes': 'Trae radiografías'}, {'reminder_sent': True}, {'status': 'confirmed'}, {'status': 'cancelled'}]:
+            response = self.client.patch(url, data, format='json')
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(checks.call_count, 0)
+        locks.assert_not_called()
+
+    def test_rescheduling_and_reopening_revalidate(self):
+        checks, locks = self.spy()
+        url = f'/api/appointments/{self.existing.pk}/'
+        self.client.patch(url, {'start_time': '10:30', 'end_time': '11:30'}, format='json')
+        self.assertEqual(checks.call_count, 1)
+
+        self.client.patch(url, {'status': 'cancelled'}, format='json')
+        self.client.patch(url, {'status': 'pending'}, format='json')
+        self.assertEqual(checks.call_count, 2)
+        self.assertEqual(locks.call_count, 2)
+
+    def test_reopening_into_a_taken_slot_is_rejected(self):
+        self.existing.status = 'cancelled'
+        self.existing.save()
+        Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=self.day,
+            start_time=time(10, 0),
+            end_time=time(10, 30),
+            dental_unit='Sillón 1',
+        )
+        response = self.client.patch(
+            f'/api/appointments/{self.existing.pk}/', {'status': 'confirmed'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DENTAL_UNITS=['Sillón 1', 'Sillón 2'])
+class AppointmentSeriesTestCase(TestCase):
+    """Recurring series are checked in one query and inserted at once"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.start = date(2030, 1, 7)
+        self.treatment = Treatment.objects.create(
+            patient=self.patient,
+            treatment_type='Ortodoncia',
+            dentist_responsible='Dra. Pérez',
+            start_date=self.start,
+            total_sessions=6,
+            completed_sessions=2,
+            total_price=Decimal('18000.00'),
+        )
+
+    def payload(self, **kwargs):
+        data = {
+            'patient': self.patient.pk,
+            'start_date': '2030-01-07',
+            'start_time': '10:00',
+            'end_time': '10:30',
+            'dental_unit': 'Sillón 1',
+            'frequency': 'weekly',
+            'count': 4,
+        }
+        data.update(kwargs)
+        return data
+
+    def book(self, day, start, end, unit='Sillón 1'):
+        return Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=day,
+            start_time=start,
+            end_time=end,
+            dental_unit=unit,
+        )
+
+    def test_occurrence_dates(self):
+        self.assertEqual(
+            series.occurrence_dates(date(2030, 1, 7), 'weekly', 3, interval=2),
+            [date(2030, 1, 7), date(2030, 1, 21), date(2030, 2, 4)]
+        )
+        self.assertEqual(
+            series.occurrence_dates(date(2030, 1, 31), 'monthly', 4),
+            [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)]
+        )
+
+    def test_series_is_created_with_one_insert(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # Patient, one conflict range query and one insert, plus the
+            # savepoint of the transaction
+            with self.assertNumQueries(5):
+                response = self.client.post('/api/appointments/series/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['appointments']), 4)
+
+        created = Appointment.objects.filter(series_id=response.data['series_id'])
+        self.assertEqual(
+            list(created.values_list('date', flat=True)),
+            [self.start + timedelta(weeks=week) for week in range(4)]
+        )
+        # The availability grids are refreshed although bulk_create sends no signals
+        grid = availability.get_grids([self.start])[self.start]
+        self.assertTrue(grid['Sillón 1'] & availability.slot_mask(time(10, 0), time(10, 30)))
+
+    def test_clash_creates_nothing_and_offers_alternatives(self):
+        self.book(self.start + timedelta(weeks=1), time(9, 30), time(11, 0))
+        self.book(self.start + timedelta(weeks=1), time(10, 0), time(10, 30), unit='Sillón 2')
+        self.book(self.start + timedelta(weeks=3), time(10, 0), time(10, 30))
+
+        response = self.client.post('/api/appointments/series/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Appointment.objects.filter(series_id__isnull=False).exists())
+
+        conflicts = {conflict['position']: conflict for conflict in response.data['conflicts']}
+        self.assertEqual(sorted(conflicts), [1, 3])
+        # Both chairs are taken at 10:00, so the nearest time of the same day
+        self.assertEqual(conflicts[1]['alternative'], {
+            'date': self.start + timedelta(weeks=1),
+            'start_time': time(10, 30),
+            'end_time': time(11, 0),
+            'dental_unit': 'Sillón 2',
+        })
+        # Same time on the other chair
+        self.assertEqual(conflicts[3]['alternative']['start_time'], time(10, 0))
+        self.assertEqual(conflicts[3]['alternative']['dental_unit'], 'Sillón 2')
+
+    def test_use_alternatives_moves_clashing_occurrences(self):
+        self.book(self.start + timedelta(weeks=2), time(10, 0), time(10, 30))
+        response = self.client.post(
+            '/api/appointments/series/', self.payload(use_alternatives=True), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        moved = response.data['appointments'][2]
+        self.assertEqual(moved['dental_unit'], 'Sillón 2')
+        self.assertEqual(moved['start_time'], '10:00:00')
+
+    def test_orthodontic_treatment_defaults(self):
+        OrthodonticCase.objects.create(
+            treatment=self.treatment,
+            appliance_type='metal_braces',
+            start_date=self.start,
+        )
+        response = self.client.post('/api/appointments/series/', {
+            'treatment': self.treatment.pk,
+            'start_date': '2030-01-31',
+            'start_time': '16:00',
+            'end_time': '16:30',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        created = Appointment.objects.filter(treatment=self.treatment)
+        # Monthly adjustments for the four remaining sessions
+        self.assertEqual(
+            list(created.values_list('date', flat=True)),
+            [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)]
+        )
+        self.assertEqual({a.consultation_type for a in created}, {'orthodontics'})
+        self.assertEqual({a.patient_id for a in created}, {self.patient.pk})
+
+    def test_invalid_series_is_rejected(self):
+        other = create_patient(first_name='Luis', phone='+5215587654321')
+        response = self.client.post(
+            '/api/appointments/series/',
+            self.payload(patient=other.pk, treatment=self.treatment.pk),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('treatment', response.data)
+
+        response = self.client.post(
+            '/api/appointments/series/', self.payload(start_time='19:30', end_time='20:30'), format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('8:00 AM', str(response.data))
+
+        response = self.client.post('/api/appointments/series/', self.payload(count=None), format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DENTAL_UNITS=['Sillón 1', 'Sillón 2'])
+class SlotSearchTestCase(TestCase):
+    """Earliest free slots from one sweep over the date window"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.day = date(2030, 1, 7)
+
+    def book(self, day, start, end, unit):
+        return Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=day,
+            start_time=start,
+            end_time=end,
+            dental_unit=unit,
+        )
+
+    def test_free_intervals(self):
+        self.assertEqual(
+            slots.free_intervals([(600, 660), (630, 700), (720, 750)], 480, 1200),
+            [(480, 600), (700, 720), (750, 1200)]
+        )
+        self.assertEqual(slots.free_intervals([(400, 1300)], 480, 1200), [])
+
+    def test_earliest_slots_across_units(self):
+        self.book(self.day, time(8, 0), time(9, 0), 'Sillón 1')
+        self.book(self.day, time(8, 0), time(8, 45), 'Sillón 2')
+
+        found = slots.find_slots(self.day, self.day, 60, limit=3)
+        self.assertEqual(
+            [(slot['start_time'], slot['available_units']) for slot in found],
+            [
+                # 8:45 is not on the half-hour grid
+                (time(9, 0), ['Sillón 1', 'Sillón 2']),
+                (time(9, 30), ['Sillón 1', 'Sillón 2']),
+                (time(10, 0), ['Sillón 1', 'Sillón 2']),
+            ]
+        )
+
+    def test_window_is_swept_with_one_query(self):
+        for offset in range(5):
+            seed_day(self.patient, self.day + timedelta(days=offset), 24, 2)
+
+        with self.assertNumQueries(1):
+            found = slots.find_slots(self.day, self.day + timedelta(days=30), 30, limit=2)
+        self.assertEqual([slot['date'] for slot in found], [self.day + timedelta(days=5)] * 2)
+        self.assertEqual(found[0]['start_time'], time(8, 0))
+
+    def test_time_of_day_weekdays_and_units(self):
+        self.book(self.day, time(9, 0), time(10, 0), 'Sillón 2')
+        found = slots.find_slots(
+            self.day,
+            self.day + timedelta(days=7),
+            60,
+            units=['Sillón 2'],
+            earliest=time(9, 0),
+            latest=time(11, 0),
+            weekdays={0, 2},
+            limit=3,
+        )
+        self.assertEqual(
+            [(slot['date'], slot['start_time']) for slot in found],
+            [
+                (self.day, time(10, 0)),
+                (self.day + timedelta(days=2), time(9, 0)),
+                (self.day + timedelta(days=2), time(9, 30)),
+            ]
+        )
+
+    def test_unit_less_and_cancelled_appointments_do_not_block_a_unit(self):
+        self.book(self.day, time(8, 0), time(20, 0), None)
+        cancelled = self.book(self.day, time(8, 0), time(20, 0), 'Sillón 1')
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+        found = slots.find_slots(self.day, self.day, 30, units=['Sillón 1'], limit=1)
+        self.assertEqual(found[0]['start_time'], time(8, 0))
+
+    def test_endpoint(self):
+        self.book(self.day, time(8, 0), time(12, 0), 'Sillón 1')
+        self.book(self.day, time(8, 0), time(12, 0), 'Sillón 2')
+
+        response = self.client.get('/api/appointments/slots/', {
+            'start_date': '2030-01-07',
+            'days': 90,
+            'duration': 45,
+            'limit': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['slots'][0], {
+            'date': self.day,
+            'start_time': '12:00',
+            'end_time': '12:45',
+            'available_units': ['Sillón 1', 'Sillón 2'],
+        })
+        self.assertEqual(len(response.data['slots']), 2)
+
+        for params in [{'days': 500}, {'duration': 'x'}, {'earliest': '9am'}, {'weekdays': '7'}]:
+            response = self.client.get('/api/appointments/slots/', params)
+            self.assertEqual(response.status_code, 400)
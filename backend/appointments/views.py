@@ -1,64 +1,147 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, filters, serializers, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from calendar import monthrange
 from datetime import timedelta, datetime, date
+from itertools import groupby
+from operator import itemgetter
+from _config.pagination import KeysetOrderingFilter, ListActionMixin
+from _config.queries import plan_queryset
 from .models import Appointment, AppointmentReminder
-from .serializers import AppointmentSerializer, AppointmentReminderSerializer
+from .serializers import (
+    AppointmentAgendaSerializer,
+    AppointmentReminderSerializer,
+    AppointmentSerializer,
+    AppointmentSeriesSerializer,
+)
+from .series import SeriesConflict, create_series
+from .slots import MAX_RESULTS, MAX_SEARCH_DAYS, find_slots
+from . import availability
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointments
     """
-    queryset = Appointment.objects.select_related('patient')
+    queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'status', 'consultation_type', 'date', 'telemedicine_enabled', 'public_booking']
     search_fields = ['patient__first_name', 'patient__last_name', 'notes']
     ordering_fields = ['date', 'start_time']
     ordering = ['date', 'start_time']
     
+    # Longest range served by a single public_booking request
+    MAX_BOOKING_DAYS = 60
+    
+    # Calendar views render the compact serializer
+    AGENDA_ACTIONS = ['today', 'week', 'month', 'agenda']
+    
+    def get_serializer_class(self):
+        if self.action in self.AGENDA_ACTIONS:
+            return AppointmentAgendaSerializer
+        return AppointmentSerializer
+    
+    def get_queryset(self):
+        """Join and prefetch what the serializer of the action renders"""
+        return plan_queryset(super().get_queryset(), self.get_serializer_class())
+    
+    def _created_by(self):
+        """Username recorded on the appointments a request creates"""
+        if hasattr(self.request, 'user') and self.request.user.is_authenticated:
+            return self.request.user.username
+        return None
+    
     def perform_create(self, serializer):
         """Set created_by when creating appointment"""
-        created_by = None
-        if hasattr(self.request, 'user') and self.request.user.is_authenticated:
-            created_by = self.request.user.username
-        serializer.save(created_by=created_by)
+        serializer.save(created_by=self._created_by())
+    
+    @action(detail=False, methods=['post'])
+    def series(self, request):
+        """
+        Create a recurring series (weekly or monthly, N occurrences) at once.
+        Nothing is created if an occurrence clashes; the response then lists
+        the first free alternative of each clashing occurrence.
+        """
+        serializer = AppointmentSeriesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        appointments = serializer.build(created_by=self._created_by())
+        
+        try:
+            created = create_series(
+                appointments,
+                use_alternatives=serializer.validated_data['use_alternatives']
+            )
+        except DjangoValidationError as exc:
+            return Response(
+                serializers.as_serializer_error(exc),
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except SeriesConflict as exc:
+            return Response(
+                {
+                    'error': 'Algunas citas de la serie chocan con citas existentes',
+                    'conflicts': [
+                        {
+                            'position': position,
+                            **self._slot(appointments[position]),
+                            'alternative': self._slot(alternative) if alternative else None,
+                        }
+                        for position, alternative in sorted(exc.clashes.items())
+                    ]
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response(
+            {
+                'series_id': created[0].series_id,
+                'appointments': AppointmentAgendaSerializer(created, many=True).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+    
+    @staticmethod
+    def _slot(appointment):
+        return {
+            'date': appointment.date,
+            'start_time': appointment.start_time,
+            'end_time': appointment.end_time,
+            'dental_unit': appointment.dental_unit,
+        }
     
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Get today's appointments"""
         today = timezone.now().date()
-        appointments = self.queryset.filter(date=today)
-        serializer = self.get_serializer(appointments, many=True)
-        return Response(serializer.data)
+        appointments = self.get_queryset().filter(date=today)
+        return self.list_response(appointments)
     
     @action(detail=False, methods=['get'])
     def week(self, request):
         """Get this week's appointments"""
         today = timezone.now().date()
         week_end = today + timedelta(days=7)
-        appointments = self.queryset.filter(date__gte=today, date__lte=week_end)
-        serializer = self.get_serializer(appointments, many=True)
-        return Response(serializer.data)
+        appointments = self.get_queryset().filter(date__gte=today, date__lte=week_end)
+        return self.list_response(appointments)
     
     @action(detail=False, methods=['get'])
     def month(self, request):
         """Get this month's appointments"""
         today = timezone.now().date()
-        appointments = self.queryset.filter(
+        appointments = self.get_queryset().filter(
             date__year=today.year,
             date__month=today.month
         )
-        serializer = self.get_serializer(appointments, many=True)
-        return Response(serializer.data)
+        return self.list_response(appointments)
     
     @action(detail=False, methods=['get'])
     def agenda(self, request):
-        """Get agenda view (daily or weekly)"""
-        view_type = request.query_params.get('view', 'daily')  # 'daily' or 'weekly'
+        """Get agenda view (daily, weekly or monthly)"""
+        view_type = request.query_params.get('view', 'daily')  # 'daily', 'weekly' or 'monthly'
         date_str = request.query_params.get('date', None)
         
         # Parse date or use today
@@ -73,13 +156,19 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         else:
             target_date = timezone.now().date()
         
+        # Optional dental unit filter (?units=Sillón 1,Sillón 2)
+        queryset = self.get_queryset()
+        units = [unit.strip() for unit in request.query_params.get('units', '').split(',') if unit.strip()]
+        if units:
+            queryset = queryset.filter(dental_unit__in=units)
+        
         if view_type == 'daily':
             # Daily agenda
-            appointments = self.queryset.filter(date=target_date)
+            appointments = queryset.filter(date=target_date)
             return Response({
                 'view': 'daily',
                 'date': target_date,
-                'appointments': AppointmentSerializer(appointments, many=True).data
+                'appointments': AppointmentAgendaSerializer(appointments, many=True).data
             })
         
         elif view_type == 'weekly':
@@ -87,34 +176,129 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             week_start = target_date - timedelta(days=target_date.weekday())
             week_end = week_start + timedelta(days=6)
             
-            appointments = self.queryset.filter(
-                date__gte=week_start,
-                date__lte=week_end
-            )
-            
-            # Group by day
-            days_data = {}
-            for i in range(7):
-                day = week_start + timedelta(days=i)
-                day_appointments = [a for a in appointments if a.date == day]
-                days_data[day.strftime('%Y-%m-%d')] = {
-                    'date': day,
-                    'day_name': day.strftime('%A'),
-                    'appointments': AppointmentSerializer(day_appointments, many=True).data
-                }
-            
             return Response({
                 'view': 'weekly',
                 'week_start': week_start,
                 'week_end': week_end,
-                'days': days_data
+                'days': self._agenda_days(queryset, week_start, week_end)
+            })
+        
+        elif view_type == 'monthly':
+            # Monthly agenda - get the month containing target_date
+            month_start = target_date.replace(day=1)
+            month_end = month_start.replace(day=monthrange(month_start.year, month_start.month)[1])
+            
+            return Response({
+                'view': 'monthly',
+                'month_start': month_start,
+                'month_end': month_end,
+                'days': self._agenda_days(queryset, month_start, month_end)
             })
         
         else:
             return Response(
-                {'error': 'Tipo de vista inválido. Use "daily" o "weekly"'},
+                {'error': 'Tipo de vista inválido. Use "daily", "weekly" o "monthly"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    def _agenda_days(self, queryset, start_date, end_date):
+        """Serialize a date range once and group it by day in a single pass"""
+        appointments = queryset.filter(
+            date__gte=start_date,
+            date__lte=end_date
+        ).order_by('date', 'start_time')
+        
+        serialized = AppointmentAgendaSerializer(appointments, many=True).data
+        by_day = {
+            day: list(day_appointments)
+            for day, day_appointments in groupby(serialized, key=itemgetter('date'))
+        }
+        
+        days_data = {}
+        for i in range((end_date - start_date).days + 1):
+            day = start_date + timedelta(days=i)
+            day_str = day.strftime('%Y-%m-%d')
+            days_data[day_str] = {
+                'date': day,
+                'day_name': day.strftime('%A'),
+                'appointments': by_day.get(day_str, [])
+            }
+        return days_data
+    
+    @action(detail=False, methods=['get'])
+    def slots(self, request):
+        """
+        Earliest free slots across units and dates, e.g.
+        ?duration=60&start_date=2030-01-07&days=30&units=Sillón 1,Sillón 2
+        &earliest=09:00&latest=14:00&weekdays=0,2,4&limit=10
+        """
+        params = request.query_params
+        try:
+            duration = int(params.get('duration') or availability.SLOT_MINUTES)
+            step = int(params.get('step') or availability.SLOT_MINUTES)
+            days = int(params.get('days') or 14)
+            limit = int(params.get('limit') or 10)
+        except ValueError:
+            return Response(
+                {'error': 'Los parámetros "duration", "step", "days" y "limit" deben ser números enteros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 5 <= duration <= 12 * 60 or not 5 <= step <= 120:
+            return Response(
+                {'error': 'Duración o intervalo inválidos (en minutos)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not 1 <= days <= MAX_SEARCH_DAYS or not 1 <= limit <= MAX_RESULTS:
+            return Response(
+                {'error': f'Parámetro "days" debe estar entre 1 y {MAX_SEARCH_DAYS} '
+                          f'y "limit" entre 1 y {MAX_RESULTS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        now = timezone.localtime()
+        start_date = now.date()
+        try:
+            if params.get('start_date'):
+                start_date = datetime.strptime(params['start_date'], '%Y-%m-%d').date()
+            earliest = datetime.strptime(params['earliest'], '%H:%M').time() if params.get('earliest') else None
+            latest = datetime.strptime(params['latest'], '%H:%M').time() if params.get('latest') else None
+            weekdays = {int(day) for day in params['weekdays'].split(',')} if params.get('weekdays') else None
+            if weekdays is not None and not weekdays <= set(range(7)):
+                raise ValueError(params['weekdays'])
+        except ValueError:
+            return Response(
+                {'error': 'Formato inválido. Use YYYY-MM-DD para fechas, HH:MM para horas y 0-6 para días'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        
+        units = [unit.strip() for unit in params.get('units', '').split(',') if unit.strip()] or None
+        end_date = start_date + timedelta(days=days - 1)
+        found = find_slots(
+            start_date,
+            end_date,
+            duration,
+            units=units,
+            earliest=earliest,
+            latest=latest,
+            weekdays=weekdays,
+            limit=limit,
+            step=step,
+            not_before=now.replace(tzinfo=None)
+        )
+        
+        return Response({
+            'start_date': start_date,
+            'end_date': end_date,
+            'duration': duration,
+            'slots': [
+                {
+                    **slot,
+                    'start_time': slot['start_time'].strftime('%H:%M'),
+                    'end_time': slot['end_time'].strftime('%H:%M'),
+                }
+                for slot in found
+            ]
+        })
     
     @action(detail=False, methods=['get', 'post'])
     def public_booking(self, request):
@@ -137,51 +321,49 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get existing appointments for the day
-            existing_appointments = self.queryset.filter(
-                date=target_date,
-                status__in=['pending', 'confirmed']
-            )
+            # Optional range (e.g. ?days=14) and unit filter
+            days_str = request.query_params.get('days', None)
+            try:
+                days = int(days_str) if days_str else 1
+            except ValueError:
+                days = 0
+            if not 1 <= days <= self.MAX_BOOKING_DAYS:
+                return Response(
+                    {'error': f'Parámetro "days" debe estar entre 1 y {self.MAX_BOOKING_DAYS}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            unit = request.query_params.get('unit', None)
+            units = [unit] if unit else None
             
-            # Generate available slots (8 AM to 8 PM, 30-minute intervals)
-            from datetime import time
-            available_slots = []
-            current_time = time(8, 0)
-            end_time = time(20, 0)
+            # Read the precomputed grids for the whole range at once
+            dates = [target_date + timedelta(days=i) for i in range(days)]
+            grids = availability.get_grids(dates)
             
-            while current_time < end_time:
-                # Calculate slot end time (30 minutes later)
-                slot_end_hour = current_time.hour
-                slot_end_minute = current_time.minute + 30
-                if slot_end_minute >= 60:
-                    slot_end_hour += 1
-                    slot_end_minute -= 60
-                slot_end = time(slot_end_hour, slot_end_minute)
-                
-                # Check if slot is available
-                is_available = True
-                for appt in existing_appointments:
-                    if (current_time < appt.end_time and slot_end > appt.start_time):
-                        is_available = False
-                        break
-                
-                available_slots.append({
-                    'start_time': current_time.strftime('%H:%M'),
-                    'end_time': slot_end.strftime('%H:%M'),
-                    'available': is_available
+            if not days_str:
+                return Response({
+                    'date': target_date,
+                    'slots': availability.day_slots(grids[target_date], units)
                 })
-                
-                # Move to next slot
-                current_time = slot_end
             
             return Response({
-                'date': target_date,
-                'slots': available_slots
+                'start_date': dates[0],
+                'end_date': dates[-1],
+                'days': [
+                    {'date': day, 'slots': availability.day_slots(grids[day], units)}
+                    for day in dates
+                ]
             })
         
         elif request.method == 'POST':
-            # Create a public booking
-            serializer = self.get_serializer(data=request.data)
+            # Create a public booking, assigning a free unit if none was chosen
+            data = request.data.copy()
+            if not data.get('dental_unit'):
+                dental_unit = self._suggest_dental_unit(data)
+                if dental_unit:
+                    data['dental_unit'] = dental_unit
+            
+            serializer = self.get_serializer(data=data)
             serializer.is_valid(raise_exception=True)
             serializer.save(public_booking=True, created_by='public')
             
@@ -192,3 +374,13 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 },
                 status=status.HTTP_201_CREATED
             )
+    
+    def _suggest_dental_unit(self, data):
+        """Pick the first free unit for a booking request, if it can be parsed"""
+        try:
+            target_date = datetime.strptime(str(data.get('date')), '%Y-%m-%d').date()
+            start_time = datetime.strptime(str(data.get('start_time'))[:5], '%H:%M').time()
+            end_time = datetime.strptime(str(data.get('end_time'))[:5], '%H:%M').time()
+        except ValueError:
+            return None
+        return availability.first_free_unit(target_date, start_time, end_time)
@@ -1,13 +1,9 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from patients.models import Patient
+from sequences.models import last_number_value, next_number
 from datetime import datetime
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.units import inch
+from . import pdf
 
 
 class Budget(models.Model):
@@ -91,6 +87,15 @@ class Budget(models.Model):
         verbose_name='Notas'
     )
     
+    # Current PDF rendering (see budgets.pdf)
+    pdf_file = models.FileField(
+        upload_to='budgets/pdf/',
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Archivo PDF'
+    )
+    
     # Metadata
     created_by = models.CharField(
         max_length=100,
@@ -119,25 +124,23 @@ class Budget(models.Model):
         """Override save to generate budget_number if not exists"""
         if not self.budget_number:
             self.budget_number = self._generate_budget_number()
+        # pdf_file is only written by budgets.pdf, so a stale instance must
+        # not put back a rendering that was already replaced
+        if not (self._state.adding or args or kwargs.get('force_insert') or kwargs.get('update_fields')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'pdf_file'
+            ]
         super().save(*args, **kwargs)
     
     def _generate_budget_number(self):
         """Generate unique budget number in format BUD-YYYYMMDD-XXXX"""
-        from django.utils import timezone
-        today = timezone.now()
-        date_str = today.strftime('%Y%m%d')
-        
-        # Get the count of budgets created today
-        today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
-        count = Budget.objects.filter(
-            created_at__range=[today_start, today_end]
-        ).count()
-        
-        # Generate sequential number
-        sequence = str(count + 1).zfill(4)
-        return f"BUD-{date_str}-{sequence}"
+        return next_number('BUD', seed=Budget._numbers_used_on)
+    
+    @staticmethod
+    def _numbers_used_on(period):
+        """Budget numbers already issued on a day before its counter existed"""
+        return last_number_value(Budget.objects.all(), 'budget_number', f"BUD-{period}-")
     
     def create_new_version(self, user=None):
         """Create a new version of this budget"""
@@ -174,76 +177,7 @@ class Budget(models.Model):
     
     def generate_pdf(self):
         """Generate PDF for the budget"""
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title
-        title_text = f"Presupuesto {self.budget_number}"
-        elements.append(Paragraph(title_text, styles['Title']))
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Patient and budget info
-        info_text = f"""
-        <b>Paciente:</b> {self.patient.full_name}<br/>
-        <b>Fecha:</b> {self.created_date}<br/>
-        <b>Válido hasta:</b> {self.valid_until or 'N/A'}<br/>
-        <b>Estado:</b> {self.get_status_display()}<br/>
-        <b>Versión:</b> {self.version}
-        """
-        elements.append(Paragraph(info_text, styles['Normal']))
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Title
-        if self.title:
-            elements.append(Paragraph(f"<b>{self.title}</b>", styles['Heading2']))
-            elements.append(Spacer(1, 0.2*inch))
-        
-        # Items table
-        if self.items.exists():
-            data = [['Tratamiento', 'Descripción', 'Cant.', 'Precio Unit.', 'Subtotal']]
-            
-            for item in self.items.all():
-                data.append([
-                    item.treatment_type,
-                    item.description or '-',
-                    str(item.quantity),
-                    f'${item.unit_price:,.2f}',
-                    f'${item.subtotal:,.2f}'
-                ])
-            
-            # Add total row
-            data.append(['', '', '', 'TOTAL:', f'${self.total_amount:,.2f}'])
-            
-            table = Table(data, colWidths=[2*inch, 2*inch, 0.7*inch, 1.2*inch, 1.2*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
-                ('GRID', (0, 0), (-1, -2), 1, colors.black),
-                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ]))
-            
-            elements.append(table)
-        
-        # Notes
-        if self.notes:
-            elements.append(Spacer(1, 0.3*inch))
-            elements.append(Paragraph("<b>Notas:</b>", styles['Heading3']))
-            elements.append(Paragraph(self.notes, styles['Normal']))
-        
-        # Build PDF
-        doc.build(elements)
-        pdf = buffer.getvalue()
-        buffer.close()
-        
-        return pdf
+        return pdf.render(self)
 
 
 class BudgetItem(models.Model):
@@ -0,0 +1,184 @@
+"""
+Budget PDF rendering.
+
+A budget's PDF only depends on what is printed on it, so each rendering is
+stored through the default storage under a hash of that content. Reprinting
+an unchanged budget serves the stored file; any change to the budget or its
+items produces a new hash and a new rendering, usually done ahead of time by
+a Celery worker after the write commits. Budget.pdf_file points to the
+current rendering, and the previous one is deleted once it is replaced.
+"""
+import hashlib
+import json
+import logging
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when the layout changes so stored renderings are not reused
+LAYOUT_VERSION = 1
+
+STORAGE_PREFIX = 'budgets/pdf'
+
+COLUMN_WIDTHS = [2*inch, 2*inch, 0.7*inch, 1.2*inch, 1.2*inch]
+
+
+@lru_cache(maxsize=None)
+def stylesheet():
+    """Paragraph styles, built once per process"""
+    return getSampleStyleSheet()
+
+
+@lru_cache(maxsize=None)
+def items_table_style():
+    """Style of the items table, built once per process"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -2), colors.beige),
+        ('GRID', (0, 0), (-1, -2), 1, colors.black),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+    ])
+
+
+def _money(value):
+    """Amounts as text with two decimals, whether loaded or just assigned"""
+    return f'{Decimal(value):.2f}'
+
+
+def printed_content(budget):
+    """Everything printed on the PDF, as plain values"""
+    return {
+        'layout': LAYOUT_VERSION,
+        'budget_number': budget.budget_number,
+        'patient': budget.patient.full_name,
+        'created_date': str(budget.created_date),
+        'valid_until': str(budget.valid_until or 'N/A'),
+        'status': budget.get_status_display(),
+        'version': budget.version,
+        'title': budget.title,
+        'notes': budget.notes,
+        'total_amount': _money(budget.total_amount),
+        'items': [
+            [item.treatment_type, item.description, item.quantity, _money(item.unit_price), _money(item.subtotal)]
+            for item in budget.items.all()
+        ],
+    }
+
+
+def content_hash(budget):
+    """Hash of the printed content of a budget"""
+    payload = json.dumps(printed_content(budget), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def storage_name(budget, digest=None):
+    """Storage path of the rendering of a budget's current content"""
+    digest = digest or content_hash(budget)
+    return f'{STORAGE_PREFIX}/{budget.budget_number}-{digest[:20]}.pdf'
+
+
+def render(budget):
+    """Build the PDF of a budget and return its bytes"""
+    styles = stylesheet()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Presupuesto {budget.budget_number}", styles['Title']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Patient and budget info
+    info_text = f"""
+    <b>Paciente:</b> {escape(budget.patient.full_name)}<br/>
+    <b>Fecha:</b> {budget.created_date}<br/>
+    <b>Válido hasta:</b> {budget.valid_until or 'N/A'}<br/>
+    <b>Estado:</b> {budget.get_status_display()}<br/>
+    <b>Versión:</b> {budget.version}
+    """
+    elements.append(Paragraph(info_text, styles['Normal']))
+    elements.append(Spacer(1, 0.3*inch))
+
+    if budget.title:
+        elements.append(Paragraph(f"<b>{escape(budget.title)}</b>", styles['Heading2']))
+        elements.append(Spacer(1, 0.2*inch))
+
+    # Items table
+    items = list(budget.items.all())
+    if items:
+        data = [['Tratamiento', 'Descripción', 'Cant.', 'Precio Unit.', 'Subtotal']]
+        for item in items:
+            data.append([
+                item.treatment_type,
+                item.description or '-',
+                str(item.quantity),
+                f'${item.unit_price:,.2f}',
+                f'${item.subtotal:,.2f}'
+            ])
+        data.append(['', '', '', 'TOTAL:', f'${budget.total_amount:,.2f}'])
+
+        table = Table(data, colWidths=COLUMN_WIDTHS)
+        table.setStyle(items_table_style())
+        elements.append(table)
+
+    # Notes
+    if budget.notes:
+        elements.append(Spacer(1, 0.3*inch))
+        elements.append(Paragraph("<b>Notas:</b>", styles['Heading3']))
+        elements.append(Paragraph(escape(budget.notes).replace('\n', '<br/>'), styles['Normal']))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def stored_pdf(budget):
+    """Storage path of the budget's current rendering, or None if not rendered yet"""
+    name = storage_name(budget)
+    return name if default_storage.exists(name) else None
+
+
+def render_to_storage(budget):
+    """
+    Return the stored rendering of a budget, rendering it first if needed,
+    and make it the budget's pdf_file, deleting the rendering it replaces
+    """
+    name = storage_name(budget)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(render(budget)))
+
+    budgets = type(budget).objects.filter(pk=budget.pk)
+    previous = budgets.values_list('pdf_file', flat=True).first()
+    if previous != name:
+        budgets.update(pdf_file=name)
+        if previous:
+            default_storage.delete(previous)
+    budget.pdf_file.name = name
+    return name
+
+
+def schedule_render(budget_id):
+    """Ask a worker to render a budget; it still renders on demand if this fails"""
+    from .tasks import render_budget_pdf
+
+    try:
+        getattr(render_budget_pdf, 'delay', render_budget_pdf)(budget_id)
+    except Exception:
+        logger.warning('Could not queue PDF rendering for budget %s', budget_id, exc_info=True)
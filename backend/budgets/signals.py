@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.core.files.storage import default_storage
+from .models import Budget, BudgetItem
+from .pdf import schedule_render
+
+
+def prerender_pdf(sender, instance, raw=False, **kwargs):
+    """Render the budget's new content in a worker once the write commits"""
+    if raw:
+        return
+    budget_id = instance.pk if sender is Budget else instance.budget_id
+    transaction.on_commit(lambda: schedule_render(budget_id))
+
+
+def delete_pdf(sender, instance, **kwargs):
+    """Remove the stored rendering of a deleted budget once the delete commits"""
+    name = instance.pdf_file.name
+    if name:
+        transaction.on_commit(lambda: default_storage.delete(name))
+
+
+post_save.connect(prerender_pdf, sender=Budget, dispatch_uid='budget_pdf_budget_post_save')
+post_save.connect(prerender_pdf, sender=BudgetItem, dispatch_uid='budget_pdf_budgetitem_post_save')
+post_delete.connect(prerender_pdf, sender=BudgetItem, dispatch_uid='budget_pdf_budgetitem_post_delete')
+post_delete.connect(delete_pdf, sender=Budget, dispatch_uid='budget_pdf_budget_post_delete')
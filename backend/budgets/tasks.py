@@ -0,0 +1,27 @@
+"""
+Celery tasks for the budgets app
+"""
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Create a dummy decorator if Celery is not available
+    def shared_task(func):
+        return func
+
+
+@shared_task
+def render_budget_pdf(budget_id):
+    """
+    Celery task to render a budget's PDF into storage
+    Does nothing when the current content was already rendered
+    """
+    from .models import Budget
+    from .pdf import render_to_storage
+    
+    budget = Budget.objects.select_related('patient').prefetch_related('items').filter(
+        pk=budget_id
+    ).first()
+    if budget is None:
+        return None
+    return render_to_storage(budget)
@@ -1,3 +1,112 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient, run_tasks_inline
+from . import pdf
+from .models import Budget, BudgetItem
+from .tasks import render_budget_pdf
+
+
+class BudgetPDFTestCase(TestCase):
+    """Content-addressed, pre-rendered budget PDFs"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        run_tasks_inline(self, render_budget_pdf)
+
+        self.client = APIClient()
+        patient = create_patient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.budget = Budget.objects.create(patient=patient, title='Ortodoncia')
+            self.item = BudgetItem.objects.create(
+                budget=self.budget,
+                treatment_type='Brackets',
+                quantity=2,
+                unit_price=Decimal('1500.00'),
+            )
+        self.url = f'/api/budgets/{self.budget.pk}/generate_pdf/'
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        if response.status_code == 200:
+            response.pdf = b''.join(response.streaming_content)
+        return response
+
+    def test_writes_prerender_the_pdf(self):
+        self.assertIsNotNone(pdf.stored_pdf(self.budget))
+
+        with mock.patch('budgets.pdf.render') as render:
+            response = self.download()
+        render.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.pdf.startswith(b'%PDF'))
+        self.assertIn(self.budget.budget_number, response['Content-Disposition'])
+
+    def test_changes_produce_a_new_rendering(self):
+        before = pdf.storage_name(self.budget)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.quantity = 3
+            self.item.save()
+        budget = Budget.objects.get(pk=self.budget.pk)
+
+        self.assertNotEqual(pdf.storage_name(budget), before)
+        self.assertTrue(default_storage.exists(pdf.storage_name(budget)))
+
+    def test_new_rendering_replaces_the_previous_file(self):
+        before = Budget.objects.get(pk=self.budget.pk).pdf_file.name
+        self.assertEqual(before, pdf.storage_name(self.budget))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.quantity = 3
+            self.item.save()
+            # A stale instance saved afterwards keeps the new rendering
+            self.budget.save()
+        budget = Budget.objects.get(pk=self.budget.pk)
+
+        self.assertEqual(budget.pdf_file.name, pdf.storage_name(budget))
+        self.assertFalse(default_storage.exists(before))
+        self.assertEqual(default_storage.listdir(pdf.STORAGE_PREFIX)[1], [budget.pdf_file.name.split('/')[-1]])
+
+    def test_unchanged_budget_is_not_written_again(self):
+        with mock.patch.object(default_storage, 'save') as save:
+            pdf.render_to_storage(Budget.objects.get(pk=self.budget.pk))
+        save.assert_not_called()
+
+    def test_deleting_the_budget_deletes_its_rendering(self):
+        name = Budget.objects.get(pk=self.budget.pk).pdf_file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            Budget.objects.get(pk=self.budget.pk).delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_printed_text_is_escaped(self):
+        self.budget.title = 'Resinas <sup> & coronas'
+        self.budget.notes = 'Pago < 50% al inicio\n& resto al final'
+        self.assertTrue(pdf.render(self.budget).startswith(b'%PDF'))
+
+    def test_missing_rendering_is_built_on_demand(self):
+        default_storage.delete(pdf.storage_name(self.budget))
+        response = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.pdf.startswith(b'%PDF'))
+        self.assertIsNotNone(pdf.stored_pdf(self.budget))
+
+    def test_async_download_queues_rendering(self):
+        default_storage.delete(pdf.storage_name(self.budget))
+        with mock.patch('budgets.pdf.schedule_render') as schedule:
+            response = self.download(**{'async': 'true'})
+        self.assertEqual(response.status_code, 202)
+        schedule.assert_called_once_with(self.budget.pk)
+
+    def test_styles_are_built_once(self):
+        self.assertIs(pdf.stylesheet(), pdf.stylesheet())
+        self.assertIs(pdf.items_table_style(), pdf.items_table_style())
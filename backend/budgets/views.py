@@ -1,17 +1,20 @@
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from _config.downloads import serve_stored
+from _config.pagination import KeysetOrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
 from .models import Budget, BudgetItem
+from . import pdf
 from .serializers import BudgetSerializer, BudgetItemSerializer
 
 
 class BudgetViewSet(viewsets.ModelViewSet):
     queryset = Budget.objects.select_related('patient').prefetch_related('items')
     serializer_class = BudgetSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'status', 'version']
     search_fields = ['title', 'patient__first_name', 'patient__last_name', 'budget_number']
     ordering = ['-created_date']
@@ -34,16 +37,30 @@ class BudgetViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def generate_pdf(self, request, pk=None):
-        """Generate and download PDF for the budget"""
+        """
+        Download the PDF of the budget
+        Unchanged budgets are served from storage; with ?async=true a missing
+        rendering is queued and 202 is returned instead of rendering inline
+        """
         budget = self.get_object()
         
         try:
-            pdf = budget.generate_pdf()
+            name = pdf.stored_pdf(budget)
+            if name is None:
+                if request.query_params.get('async', 'false').lower() == 'true':
+                    pdf.schedule_render(budget.pk)
+                    return Response(
+                        {'message': 'El PDF se está generando, intente de nuevo en unos segundos'},
+                        status=status.HTTP_202_ACCEPTED
+                    )
+                name = pdf.render_to_storage(budget)
             
-            response = HttpResponse(pdf, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="presupuesto_{budget.budget_number}.pdf"'
-            
-            return response
+            return serve_stored(
+                request,
+                default_storage,
+                name,
+                filename=f'presupuesto_{budget.budget_number}.pdf'
+            )
         except Exception as e:
             return Response(
                 {'error': f'Error generando PDF: {str(e)}'},
@@ -90,7 +107,7 @@ class BudgetItemViewSet(viewsets.ModelViewSet):
     """ViewSet for managing budget items"""
     queryset = BudgetItem.objects.select_related('budget')
     serializer_class = BudgetItemSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['budget']
     ordering_fields = ['order']
     ordering = ['order']
@@ -123,6 +123,9 @@ class ClinicalFile(models.Model):
     # Allowed file extensions
     ALLOWED_EXTENSIONS = ['jpg', 'jpeg', 'png', 'heic', 'pdf', 'docx']
     
+    # Fields that get thumbnails and previews (see _config.images)
+    IMAGE_FIELDS = ['file']
+    
     patient = models.ForeignKey(
         Patient,
         on_delete=models.CASCADE,
@@ -170,6 +173,12 @@ class ClinicalFile(models.Model):
         verbose_name='Subido por'
     )
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Subida')
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Miniaturas y Vistas Previas'
+    )
     
     class Meta:
         verbose_name = 'Archivo Clínico'
@@ -179,31 +188,37 @@ class ClinicalFile(models.Model):
     def __str__(self):
         return f"{self.title} - {self.patient.full_name}"
     
+    @classmethod
+    def upload_error(cls, name, size):
+        """Reason an upload cannot be stored, or None if its size and type are allowed"""
+        # Validate file size
+        if size > cls.MAX_FILE_SIZE:
+            return f'El archivo no puede superar los {cls.MAX_FILE_SIZE / (1024*1024)}MB'
+        
+        # Validate file extension
+        ext = os.path.splitext(name)[1][1:].lower()
+        if ext not in cls.ALLOWED_EXTENSIONS:
+            return f'Tipo de archivo no permitido. Extensiones permitidas: {", ".join(cls.ALLOWED_EXTENSIONS)}'
+        return None
+    
+    @staticmethod
+    def unique_filename(name):
+        """Random file name keeping the original extension"""
+        return f"{uuid.uuid4()}{os.path.splitext(name)[1]}"
+    
     def clean(self):
         """Validate file size and type"""
         super().clean()
         
         if self.file:
-            # Validate file size
-            if self.file.size > self.MAX_FILE_SIZE:
-                raise ValidationError(
-                    f'El archivo no puede superar los {self.MAX_FILE_SIZE / (1024*1024)}MB'
-                )
-            
-            # Validate file extension
-            ext = os.path.splitext(self.file.name)[1][1:].lower()
-            if ext not in self.ALLOWED_EXTENSIONS:
-                raise ValidationError(
-                    f'Tipo de archivo no permitido. Extensiones permitidas: {", ".join(self.ALLOWED_EXTENSIONS)}'
-                )
+            error = self.upload_error(self.file.name, self.file.size)
+            if error:
+                raise ValidationError(error)
     
     def save(self, *args, **kwargs):
         """Generate unique filename and validate before saving"""
         if self.file and not self.pk:
-            # Generate unique filename
-            ext = os.path.splitext(self.file.name)[1]
-            unique_filename = f"{uuid.uuid4()}{ext}"
-            self.file.name = unique_filename
+            self.file.name = self.unique_filename(self.file.name)
         
         self.full_clean()
         super().save(*args, **kwargs)
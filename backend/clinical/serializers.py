@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from _config.images import derivative_urls
+from patients.models import Patient
 from .models import MedicalHistory, ClinicalNote, ClinicalFile, Odontogram, Periodontogram
 
 
@@ -23,6 +25,7 @@ class ClinicalNoteSerializer(serializers.ModelSerializer):
 class ClinicalFileSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     file_url = serializers.SerializerMethodField()
+    derivatives = serializers.SerializerMethodField()
     
     class Meta:
         model = ClinicalFile
@@ -37,6 +40,10 @@ class ClinicalFileSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.file.url)
             return obj.file.url
         return None
+    
+    def get_derivatives(self, obj):
+        """Thumbnail and preview of a photo, once generated"""
+        return derivative_urls(obj, 'file', self.context.get('request'))
 
 
 class OdontogramSerializer(serializers.ModelSerializer):
@@ -112,3 +119,27 @@ class PeriodontogramSerializer(serializers.ModelSerializer):
                     )
         
         return value
+
+
+class ClinicalFileBulkUploadSerializer(serializers.Serializer):
+    """Fields shared by every file of a bulk upload"""
+    
+    patient = serializers.PrimaryKeyRelatedField(queryset=Patient.objects.all())
+    file_type = serializers.ChoiceField(choices=ClinicalFile.FILE_TYPE_CHOICES, required=False)
+    clinical_note = serializers.PrimaryKeyRelatedField(
+        queryset=ClinicalNote.objects.all(),
+        required=False,
+        allow_null=True
+    )
+    date_taken = serializers.DateField(required=False, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True)
+    uploaded_by = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    
+    def validate(self, attrs):
+        """The clinical note, if given, must belong to the same patient"""
+        note = attrs.get('clinical_note')
+        if note and note.patient_id != attrs['patient'].pk:
+            raise serializers.ValidationError(
+                {'clinical_note': 'La nota clínica no pertenece al paciente'}
+            )
+        return attrs
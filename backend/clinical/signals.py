@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from _config.images import delete_derivatives, schedule, stale_fields
+from .models import ClinicalFile
+from .tasks import generate_clinical_file_derivatives
+
+
+@receiver(post_save, sender=ClinicalFile)
+def queue_derivatives(sender, instance, raw=False, **kwargs):
+    """Build thumbnails and previews in a worker once a new upload commits"""
+    if raw or not stale_fields(instance, ClinicalFile.IMAGE_FIELDS):
+        return
+    file_id = instance.pk
+    transaction.on_commit(lambda: schedule(generate_clinical_file_derivatives, file_id))
+
+
+@receiver(post_delete, sender=ClinicalFile)
+def remove_derivatives(sender, instance, **kwargs):
+    """Delete the derivative files of a deleted clinical file"""
+    entry = (instance.image_derivatives or {}).get('file')
+    storage = instance.file.storage
+    transaction.on_commit(lambda: delete_derivatives(storage, entry))
@@ -0,0 +1,25 @@
+"""
+Celery tasks for the clinical app
+"""
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Create a dummy decorator if Celery is not available
+    def shared_task(func):
+        return func
+
+
+@shared_task
+def generate_clinical_file_derivatives(file_id):
+    """
+    Celery task to build the thumbnail and preview of a clinical photo
+    Does nothing when they already match the current upload
+    """
+    from _config.images import refresh_derivatives
+    from .models import ClinicalFile
+    
+    clinical_file = ClinicalFile.objects.filter(pk=file_id).first()
+    if clinical_file is None:
+        return None
+    return refresh_derivatives(clinical_file, ClinicalFile.IMAGE_FIELDS)
@@ -1,3 +1,190 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+from PIL import Image
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient, run_tasks_inline
+from patients.models import Patient
+from . import views
+from .models import ClinicalFile, ClinicalNote
+from .tasks import generate_clinical_file_derivatives
+
+
+def photo(name='foto.jpg', size=(3000, 2000), image_format='JPEG', mode='RGB', orientation=None):
+    """Uploaded image of the given size, optionally with an EXIF orientation"""
+    image = Image.new(mode, size, 'red')
+    buffer = BytesIO()
+    options = {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        options['exif'] = exif
+    image.save(buffer, format=image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ClinicalFileDerivativesTestCase(TestCase):
+    """Thumbnails and previews built after upload"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVE_FORMAT='WEBP')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        run_tasks_inline(self, generate_clinical_file_derivatives)
+
+        self.client = APIClient()
+        self.patient = create_patient()
+
+    def upload(self, file, file_type='photo'):
+        with self.captureOnCommitCallbacks(execute=True):
+            clinical_file = ClinicalFile.objects.create(
+                patient=self.patient,
+                file_type=file_type,
+                title='Foto',
+                file=file,
+            )
+        return ClinicalFile.objects.get(pk=clinical_file.pk)
+
+    def test_upload_builds_thumbnail_and_preview(self):
+        clinical_file = self.upload(photo())
+        entry = clinical_file.image_derivatives['file']
+
+        self.assertEqual(entry['source'], clinical_file.file.name)
+        self.assertEqual((entry['width'], entry['height']), (3000, 2000))
+        self.assertEqual((entry['preview']['width'], entry['preview']['height']), (1600, 1067))
+        self.assertEqual(entry['thumbnail']['width'], 256)
+        self.assertTrue(entry['thumbnail']['name'].endswith('.webp'))
+        with default_storage.open(entry['preview']['name']) as stored:
+            self.assertEqual(Image.open(stored).format, 'WEBP')
+
+    def test_exif_rotation_and_transparency(self):
+        entry = self.upload(photo(size=(800, 400), orientation=6)).image_derivatives['file']
+        self.assertEqual((entry['width'], entry['height']), (400, 800))
+        self.assertEqual(entry['thumbnail']['height'], 256)
+
+        entry = self.upload(photo('logo.png', image_format='PNG', mode='RGBA')).image_derivatives['file']
+        self.assertIn('preview', entry)
+
+    def test_documents_and_unreadable_files(self):
+        pdf = self.upload(SimpleUploadedFile('estudio.pdf', b'%PDF-1.4'), file_type='pdf')
+        self.assertEqual(pdf.image_derivatives, {})
+
+        with self.assertLogs('_config.images', 'WARNING'):
+            broken = self.upload(SimpleUploadedFile('rota.jpg', b'not a jpeg'))
+        self.assertEqual(broken.image_derivatives['file']['error'], 'unreadable')
+
+    def test_replacing_the_upload_rebuilds_derivatives(self):
+        clinical_file = self.upload(photo())
+        old = clinical_file.image_derivatives['file']['thumbnail']['name']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            clinical_file.file = photo('nueva.jpg', size=(500, 500))
+            clinical_file.save()
+        clinical_file.refresh_from_db()
+
+        self.assertEqual(clinical_file.image_derivatives['file']['width'], 500)
+        self.assertFalse(default_storage.exists(old))
+
+    def test_serializer_exposes_derivatives(self):
+        clinical_file = self.upload(photo())
+        response = self.client.get(f'/api/clinical/clinical-files/{clinical_file.pk}/')
+
+        derivatives = response.data['derivatives']
+        self.assertEqual(derivatives['width'], 3000)
+        self.assertTrue(derivatives['thumbnail']['url'].startswith('http://testserver/media/derivatives/'))
+        self.assertEqual(derivatives['preview']['height'], 1067)
+
+
+class ClinicalFileBulkUploadTestCase(TestCase):
+    """Many files in one multipart request"""
+
+    url = '/api/clinical/clinical-files/bulk_upload/'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        run_tasks_inline(self, generate_clinical_file_derivatives)
+
+        self.client = APIClient()
+        self.patient = create_patient()
+
+    def post(self, files, **data):
+        return self.client.post(self.url, dict(data, patient=self.patient.pk, files=files), format='multipart')
+
+    def series(self, count):
+        return [photo(f'rx_{number:02}.jpg', size=(64, 48)) for number in range(count)]
+
+    def test_series_is_created_in_one_request(self):
+        uploads = []
+        original = views.bulk_create_files
+
+        def record(files, **kwargs):
+            uploads.extend(files)
+            return original(files, **kwargs)
+
+        with mock.patch.object(views, 'bulk_create_files', side_effect=record):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = self.post(self.series(18), file_type='radiograph', date_taken='2030-01-15')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 18)
+        self.assertEqual([r['filename'] for r in response.data['results']][:2], ['rx_00.jpg', 'rx_01.jpg'])
+        self.assertEqual(ClinicalFile.objects.filter(file_type='radiograph', date_taken=date(2030, 1, 15)).count(), 18)
+        self.assertTrue(all(isinstance(upload, TemporaryUploadedFile) for upload in uploads))
+        # One derivatives job per image
+        self.assertEqual(len(callbacks), 18)
+        self.assertIn('thumbnail', ClinicalFile.objects.first().image_derivatives['file'])
+
+    def test_queries_do_not_grow_with_files(self):
+        with CaptureQueriesContext(connection) as few:
+            self.post(self.series(2))
+        with CaptureQueriesContext(connection) as many:
+            self.post(self.series(16))
+        self.assertEqual(len(few), len(many))
+
+    def test_invalid_files_are_reported_per_file(self):
+        files = self.series(2) + [SimpleUploadedFile('virus.exe', b'MZ')]
+        with mock.patch.object(ClinicalFile, 'MAX_FILE_SIZE', 1024 * 1024):
+            files.append(SimpleUploadedFile('grande.pdf', b'0' * (1024 * 1024 + 1)))
+            response = self.post(files)
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 2))
+        self.assertIn('Tipo de archivo no permitido', response.data['results'][2]['error'])
+        self.assertIn('no puede superar', response.data['results'][3]['error'])
+        self.assertEqual(ClinicalFile.objects.count(), 2)
+
+    def test_nothing_is_stored_when_every_file_fails(self):
+        response = self.post([SimpleUploadedFile('nota.txt', b'hola')])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ClinicalFile.objects.exists())
+
+        response = self.post([])
+        self.assertEqual(response.status_code, 400)
+
+    def test_clinical_note_must_belong_to_patient(self):
+        other = Patient.objects.create(
+            first_name='Luis',
+            last_name='Pérez',
+            gender='M',
+            date_of_birth=date(1985, 1, 1),
+            phone='+5215512345679',
+        )
+        note = ClinicalNote.objects.create(patient=other, date=date(2030, 1, 1), title='Consulta', description='-')
+        response = self.post(self.series(1), clinical_note=note.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('clinical_note', response.data)
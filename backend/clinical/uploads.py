@@ -0,0 +1,76 @@
+"""
+Bulk upload of clinical files.
+
+Every upload is checked for size and extension before anything is stored.
+The accepted ones are written to storage and their ClinicalFile rows are
+inserted with one bulk_create inside a single transaction; if the insert
+fails, the files already stored are removed again.
+"""
+import os
+
+from django.db import transaction
+
+from _config.images import is_image, schedule
+from .models import ClinicalFile
+from .tasks import generate_clinical_file_derivatives
+
+
+# Upper bound of files accepted in one request
+MAX_FILES_PER_UPLOAD = 50
+
+
+def guess_file_type(name):
+    """File type of an upload when the request does not set one"""
+    if is_image(name):
+        return 'photo'
+    if name.lower().endswith('.pdf'):
+        return 'pdf'
+    return 'other'
+
+
+def bulk_create_files(uploads, patient, file_type=None, **fields):
+    """
+    Store many uploads as ClinicalFile rows of one patient.
+
+    `fields` holds the values shared by every row (clinical_note,
+    date_taken, uploaded_by, description). Returns one result per upload,
+    in order: {'filename', 'success', 'file' or 'error'}.
+    """
+    results = []
+    accepted = []
+    for upload in uploads:
+        error = ClinicalFile.upload_error(upload.name, upload.size)
+        result = {'filename': upload.name, 'success': error is None}
+        if error:
+            result['error'] = error
+        else:
+            upload.name = ClinicalFile.unique_filename(upload.name)
+            accepted.append((result, ClinicalFile(
+                patient=patient,
+                file_type=file_type or guess_file_type(result['filename']),
+                file=upload,
+                title=os.path.splitext(result['filename'])[0][:200],
+                **fields
+            )))
+        results.append(result)
+
+    if not accepted:
+        return results
+
+    instances = [instance for _, instance in accepted]
+    try:
+        with transaction.atomic():
+            # FileField.pre_save streams each upload to storage during the insert
+            ClinicalFile.objects.bulk_create(instances)
+    except Exception:
+        for instance in instances:
+            if instance.file._committed and instance.file.name:
+                instance.file.storage.delete(instance.file.name)
+        raise
+
+    for result, instance in accepted:
+        result['file'] = instance
+        if is_image(instance.file.name):
+            file_id = instance.pk
+            transaction.on_commit(lambda file_id=file_id: schedule(generate_clinical_file_derivatives, file_id))
+    return results
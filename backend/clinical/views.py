@@ -1,12 +1,19 @@
 from django.shortcuts import render
 
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from _config.downloads import serve_file
+from _config.pagination import KeysetOrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import MedicalHistory, ClinicalNote, ClinicalFile, Odontogram, Periodontogram
+from .uploads import MAX_FILES_PER_UPLOAD, bulk_create_files
 from .serializers import (
     MedicalHistorySerializer,
     ClinicalNoteSerializer,
     ClinicalFileSerializer,
+    ClinicalFileBulkUploadSerializer,
     OdontogramSerializer,
     PeriodontogramSerializer
 )
@@ -25,7 +32,7 @@ class ClinicalNoteViewSet(viewsets.ModelViewSet):
     """ViewSet for managing clinical notes"""
     queryset = ClinicalNote.objects.select_related('patient')
     serializer_class = ClinicalNoteSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'date']
     search_fields = ['title', 'description', 'observations', 'patient__first_name', 'patient__last_name']
     ordering_fields = ['date', 'created_at']
@@ -36,18 +43,72 @@ class ClinicalFileViewSet(viewsets.ModelViewSet):
     """ViewSet for managing clinical files"""
     queryset = ClinicalFile.objects.select_related('patient')
     serializer_class = ClinicalFileSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'file_type', 'clinical_note']
     search_fields = ['title', 'description', 'patient__first_name', 'patient__last_name']
     ordering_fields = ['date_taken', 'uploaded_at']
     ordering = ['-date_taken', '-uploaded_at']
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the file, streamed in chunks or through a signed URL"""
+        clinical_file = self.get_object()
+        return serve_file(request, clinical_file.file)
+    
+    def initialize_request(self, request, *args, **kwargs):
+        """Spool bulk uploads to temporary files instead of memory"""
+        request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'bulk_upload':
+            request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+        return request
+    
+    @action(detail=False, methods=['post'])
+    def bulk_upload(self, request):
+        """
+        Upload many files of one patient in a single multipart request
+        Files go in repeated `files` parts; the other fields apply to all
+        of them. Returns one result per file.
+        """
+        serializer = ClinicalFileBulkUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        uploads = request.FILES.getlist('files')
+        if not uploads:
+            return Response(
+                {'files': 'Se requiere al menos un archivo'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(uploads) > MAX_FILES_PER_UPLOAD:
+            return Response(
+                {'files': f'No se pueden subir más de {MAX_FILES_PER_UPLOAD} archivos a la vez'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = bulk_create_files(uploads, **serializer.validated_data)
+        for result in results:
+            if 'file' in result:
+                result['file'] = ClinicalFileSerializer(result['file'], context={'request': request}).data
+        
+        created = sum(result['success'] for result in results)
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=response_status)
 
 
 class OdontogramViewSet(viewsets.ModelViewSet):
     """ViewSet for managing odontograms"""
     queryset = Odontogram.objects.select_related('patient')
     serializer_class = OdontogramSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['patient', 'date']
     ordering_fields = ['date', 'created_at']
     ordering = ['-date']
@@ -57,7 +118,7 @@ class PeriodontogramViewSet(viewsets.ModelViewSet):
     """ViewSet for managing periodontograms"""
     queryset = Periodontogram.objects.select_related('patient')
     serializer_class = PeriodontogramSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['patient', 'date', 'has_abnormal_values']
     ordering_fields = ['date', 'created_at']
     ordering = ['-date']
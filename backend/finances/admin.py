@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Payment, Expense
+from .models import Payment, Expense, PatientBalance
 
 
 @admin.register(Payment)
@@ -16,3 +16,11 @@ class ExpenseAdmin(admin.ModelAdmin):
     list_filter = ['category', 'payment_method', 'expense_date']
     search_fields = ['description', 'supplier', 'invoice_number']
     ordering = ['-expense_date']
+
+
+@admin.register(PatientBalance)
+class PatientBalanceAdmin(admin.ModelAdmin):
+    list_display = ['patient', 'treatment_debt', 'installment_debt', 'payments_total', 'online_payments_total', 'last_payment_date']
+    search_fields = ['patient__first_name', 'patient__last_name', 'patient__patient_number']
+    ordering = ['-treatment_debt']
+    readonly_fields = ['treatment_debt', 'installment_debt', 'payments_total', 'online_payments_total', 'last_payment_date', 'updated_at']
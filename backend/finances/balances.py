@@ -0,0 +1,152 @@
+"""
+Patient balance ledger.
+
+Each balance component is computed with one grouped aggregate per source
+table, for any set of patients at once, and stored in PatientBalance with a
+single upsert. Signals refresh the affected patient after every write; the
+reconcile_balances command recomputes everyone to fix drift left by queryset
+updates or bulk inserts that skip signals.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from patients.models import Patient
+from patients.summary import invalidate_summaries
+from .models import Payment, PatientBalance
+
+
+# Treatment statuses that still carry a pending balance
+DEBT_STATUSES = ['in_progress', 'with_debt']
+
+# Installment plans whose unpaid payments are still owed
+OPEN_PLAN_STATUSES = ['active', 'delinquent']
+
+BALANCE_FIELDS = [
+    'treatment_debt',
+    'installment_debt',
+    'payments_total',
+    'online_payments_total',
+    'last_payment_date',
+]
+
+
+def _for_patients(queryset, field, patient_ids):
+    if patient_ids is None:
+        return queryset
+    return queryset.filter(**{f'{field}__in': patient_ids})
+
+
+def compute_balances(patient_ids=None):
+    """
+    Compute unsaved PatientBalance rows from the source tables.
+    Pass patient_ids to limit the work to those patients (every given id
+    gets a row, even if it is all zeros).
+    """
+    from installments.models import InstallmentPayment
+    from online_payments.models import OnlinePayment
+    from treatments.models import Treatment
+
+    values = defaultdict(dict)
+    if patient_ids is not None:
+        patient_ids = list(patient_ids)
+        for patient_id in patient_ids:
+            values[patient_id]
+
+    treatments = _for_patients(
+        Treatment.objects.filter(status__in=DEBT_STATUSES), 'patient_id', patient_ids
+    ).values('patient_id').annotate(total=Sum(F('total_price') - F('amount_paid')))
+    for row in treatments:
+        values[row['patient_id']]['treatment_debt'] = row['total']
+
+    installments = _for_patients(
+        InstallmentPayment.objects.filter(
+            status__in=InstallmentPayment.UNPAID_STATUSES,
+            installment_plan__status__in=OPEN_PLAN_STATUSES
+        ),
+        'installment_plan__patient_id',
+        patient_ids
+    ).values('installment_plan__patient_id').annotate(total=Sum('amount'))
+    for row in installments:
+        values[row['installment_plan__patient_id']]['installment_debt'] = row['total']
+
+    payments = _for_patients(Payment.objects.all(), 'patient_id', patient_ids).values(
+        'patient_id'
+    ).annotate(total=Sum('amount'), last=Max('payment_date'))
+    for row in payments:
+        balance = values[row['patient_id']]
+        balance['payments_total'] = row['total']
+        balance['last_payment_date'] = row['last']
+
+    online_payments = _for_patients(
+        OnlinePayment.objects.filter(status='completed'), 'patient_id', patient_ids
+    ).values('patient_id').annotate(total=Sum('amount'), last=Max('completed_at'))
+    for row in online_payments:
+        balance = values[row['patient_id']]
+        balance['online_payments_total'] = row['total']
+        last = timezone.localdate(row['last']) if row['last'] else None
+        if last and (balance.get('last_payment_date') is None or last > balance['last_payment_date']):
+            balance['last_payment_date'] = last
+
+    return {
+        patient_id: PatientBalance(
+            patient_id=patient_id,
+            treatment_debt=fields.get('treatment_debt') or Decimal('0'),
+            installment_debt=fields.get('installment_debt') or Decimal('0'),
+            payments_total=fields.get('payments_total') or Decimal('0'),
+            online_payments_total=fields.get('online_payments_total') or Decimal('0'),
+            last_payment_date=fields.get('last_payment_date'),
+        )
+        for patient_id, fields in values.items()
+    }
+
+
+def save_balances(balances):
+    """Insert or update the given PatientBalance rows in one statement"""
+    balances = list(balances)
+    if balances:
+        PatientBalance.objects.bulk_create(
+            balances,
+            update_conflicts=True,
+            unique_fields=['patient'],
+            update_fields=BALANCE_FIELDS + ['updated_at'],
+        )
+        invalidate_summaries(balance.patient_id for balance in balances)
+    return balances
+
+
+def refresh_balances(patient_ids):
+    """Recompute and store the balances of the given patients"""
+    # Skip patients deleted in the same transaction
+    patient_ids = set(Patient.objects.all_with_deleted().filter(
+        pk__in=[patient_id for patient_id in patient_ids if patient_id]
+    ).values_list('pk', flat=True))
+    if not patient_ids:
+        return {}
+    balances = compute_balances(patient_ids)
+    save_balances(balances.values())
+    return balances
+
+
+def get_balance(patient):
+    """Stored balance of a patient, computed on the fly the first time"""
+    try:
+        return patient.balance
+    except PatientBalance.DoesNotExist:
+        return refresh_balances([patient.pk])[patient.pk]
+
+
+def balance_drift(stored, computed):
+    """Fields where a stored balance differs from the computed one"""
+    if stored is None:
+        return {
+            name: {'stored': None, 'actual': getattr(computed, name)}
+            for name in BALANCE_FIELDS
+        }
+    return {
+        name: {'stored': getattr(stored, name), 'actual': getattr(computed, name)}
+        for name in BALANCE_FIELDS
+        if getattr(stored, name) != getattr(computed, name)
+    }
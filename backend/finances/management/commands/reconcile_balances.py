@@ -0,0 +1,75 @@
+"""
+Management command to reconcile the patient balance ledger.
+
+Recomputes every balance from the source tables in chunks of patients,
+reports the rows that drifted from the stored values and rewrites them
+(unless --dry-run is given).
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finances.balances import balance_drift, compute_balances, save_balances
+from finances.models import PatientBalance
+from patients.models import Patient
+
+
+class Command(BaseCommand):
+    help = 'Detect and fix drift between stored patient balances and the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of patients recomputed per batch',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drift, do not write anything',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+        
+        patient_ids = list(
+            Patient.objects.all_with_deleted().order_by('pk').values_list('pk', flat=True)
+        )
+        checked = missing = drifted = 0
+        
+        for start in range(0, len(patient_ids), chunk_size):
+            chunk = patient_ids[start:start + chunk_size]
+            
+            with transaction.atomic():
+                computed = compute_balances(chunk)
+                stored = PatientBalance.objects.in_bulk(chunk, field_name='patient_id')
+                
+                to_save = []
+                for patient_id, balance in computed.items():
+                    current = stored.get(patient_id)
+                    drift = balance_drift(current, balance)
+                    if not drift:
+                        continue
+                    
+                    to_save.append(balance)
+                    if current is None:
+                        missing += 1
+                    else:
+                        drifted += 1
+                        changes = ', '.join(
+                            f'{name}: {values["stored"]} -> {values["actual"]}'
+                            for name, values in drift.items()
+                        )
+                        self.stdout.write(f'Paciente {patient_id}: {changes}')
+                
+                if not dry_run:
+                    save_balances(to_save)
+            
+            checked += len(chunk)
+        
+        action = 'would be fixed' if dry_run else 'fixed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} balances checked, {drifted} drifted and {missing} missing {action}.'
+        ))
@@ -172,3 +172,79 @@ class Expense(models.Model):
     
     def __str__(self):
         return f"${self.amount} - {self.description} ({self.expense_date})"
+
+
+class PatientBalanceQuerySet(models.QuerySet):
+    """Custom queryset for the balance ledger"""
+    
+    def debtors(self):
+        """Balances of patients that still owe money, largest debt first"""
+        return self.filter(
+            models.Q(treatment_debt__gt=0) | models.Q(installment_debt__gt=0)
+        ).order_by('-treatment_debt', '-installment_debt')
+
+
+class PatientBalance(models.Model):
+    """
+    Denormalized balance of a patient, one row per patient.
+    
+    Kept current by signals on treatments, payments, installments and online
+    payments (see finances.balances); reconcile_balances fixes any drift.
+    """
+    
+    patient = models.OneToOneField(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='balance',
+        verbose_name='Paciente'
+    )
+    
+    # Debt
+    treatment_debt = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Adeudo por Tratamientos',
+        help_text='Saldo pendiente de tratamientos en curso o con adeudo'
+    )
+    installment_debt = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Adeudo en Cuotas',
+        help_text='Cuotas pendientes o vencidas de planes activos'
+    )
+    
+    # Payments
+    payments_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Total Pagado en Clínica'
+    )
+    online_payments_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Total Pagado en Línea'
+    )
+    last_payment_date = models.DateField(
+        null=True,
+        blank=True,
+        verbose_name='Último Pago'
+    )
+    
+    # Metadata
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Última Actualización')
+    
+    objects = PatientBalanceQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Saldo de Paciente'
+        verbose_name_plural = 'Saldos de Pacientes'
+        indexes = [
+            models.Index(fields=['treatment_debt']),
+        ]
+    
+    def __str__(self):
+        return f"{self.patient.full_name} - ${self.treatment_debt}"
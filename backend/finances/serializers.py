@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Payment, Expense
+from .models import Payment, Expense, PatientBalance
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -17,3 +17,23 @@ class ExpenseSerializer(serializers.ModelSerializer):
         model = Expense
         fields = '__all__'
         read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class PatientBalanceSerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True)
+    patient_number = serializers.CharField(source='patient.patient_number', read_only=True)
+    
+    class Meta:
+        model = PatientBalance
+        fields = [
+            'patient',
+            'patient_name',
+            'patient_number',
+            'treatment_debt',
+            'installment_debt',
+            'payments_total',
+            'online_payments_total',
+            'last_payment_date',
+            'updated_at',
+        ]
+        read_only_fields = fields
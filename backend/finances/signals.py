@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from installments.models import InstallmentPlan, InstallmentPayment
+from online_payments.models import OnlinePayment
+from treatments.models import Treatment
+from .models import Payment
+from .balances import refresh_balances
+
+
+def _patient_id(instance):
+    """Patient whose balance a saved or deleted row affects"""
+    if isinstance(instance, InstallmentPayment):
+        if InstallmentPayment.installment_plan.is_cached(instance):
+            return instance.installment_plan.patient_id
+        # The plan may already be gone when deleted in cascade
+        return InstallmentPlan.objects.filter(
+            pk=instance.installment_plan_id
+        ).values_list('patient_id', flat=True).first()
+    return instance.patient_id
+
+
+def refresh_patient_balance(sender, instance, raw=False, **kwargs):
+    """Recompute the balance of the row's patient once the write commits"""
+    if raw:
+        return
+    patient_ids = [_patient_id(instance)]
+    transaction.on_commit(lambda: refresh_balances(patient_ids))
+
+
+for model in [Treatment, Payment, InstallmentPlan, InstallmentPayment, OnlinePayment]:
+    uid = f'patient_balance_{model._meta.label_lower}'
+    post_save.connect(refresh_patient_balance, sender=model, dispatch_uid=f'{uid}_post_save')
+    post_delete.connect(refresh_patient_balance, sender=model, dispatch_uid=f'{uid}_post_delete')
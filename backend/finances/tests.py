@@ -1,3 +1,145 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient
+from installments.models import InstallmentPayment
+from online_payments.models import OnlinePayment
+from treatments.models import Treatment
+from .balances import get_balance
+from .models import Payment, PatientBalance
+
+
+class PatientBalanceTestCase(TestCase):
+    """Balance ledger kept current by signals"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.patient = create_patient()
+
+    def create_treatment(self, price='1500.00', paid='0.00', **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Treatment.objects.create(
+                patient=kwargs.pop('patient', self.patient),
+                treatment_type='Ortodoncia',
+                dentist_responsible='Dra. Pérez',
+                start_date=date(2030, 1, 1),
+                total_price=Decimal(price),
+                amount_paid=Decimal(paid),
+                **kwargs
+            )
+
+    def balance(self, patient=None):
+        return PatientBalance.objects.get(patient=patient or self.patient)
+
+    def test_treatments_update_debt(self):
+        treatment = self.create_treatment(paid='500.00')
+        self.create_treatment(price='300.00', status='completed')
+        self.assertEqual(self.balance().treatment_debt, Decimal('1000.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            treatment.amount_paid = Decimal('1200.00')
+            treatment.save()
+        self.assertEqual(self.balance().treatment_debt, Decimal('300.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            treatment.delete()
+        self.assertEqual(self.balance().treatment_debt, Decimal('0'))
+
+    def test_payments_update_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(
+                patient=self.patient,
+                amount=Decimal('200.00'),
+                payment_method='cash',
+                payment_date=date(2020, 1, 10),
+            )
+            OnlinePayment.objects.create(
+                patient=self.patient,
+                amount=Decimal('150.00'),
+                payment_method='stripe',
+                transaction_id='pi_test_1',
+                status='completed',
+                completed_at=timezone.now(),
+            )
+            OnlinePayment.objects.create(
+                patient=self.patient,
+                amount=Decimal('999.00'),
+                payment_method='stripe',
+                transaction_id='pi_test_2',
+                status='failed',
+            )
+
+        balance = self.balance()
+        self.assertEqual(balance.payments_total, Decimal('200.00'))
+        self.assertEqual(balance.online_payments_total, Decimal('150.00'))
+        self.assertEqual(balance.last_payment_date, timezone.localdate())
+
+    def test_installments_update_debt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/installments/plans/', {
+                'patient': self.patient.pk,
+                'total_amount': '1000.00',
+                'number_of_installments': 4,
+                'start_date': '2030-01-15',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.balance().installment_debt, Decimal('1000.00'))
+
+        payment = InstallmentPayment.objects.get(installment_number=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/installments/payments/{payment.pk}/mark_paid/')
+        self.assertEqual(self.balance().installment_debt, Decimal('750.00'))
+
+    def test_summary_reads_stored_balance(self):
+        self.create_treatment(paid='500.00')
+        response = self.client.get(f'/api/patients/{self.patient.pk}/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['summary']['total_debt'], Decimal('1000.00'))
+
+    def test_missing_balance_is_computed_on_read(self):
+        self.create_treatment(paid='500.00')
+        PatientBalance.objects.all().delete()
+        self.assertEqual(get_balance(self.patient).treatment_debt, Decimal('1000.00'))
+        self.assertTrue(PatientBalance.objects.filter(patient=self.patient).exists())
+
+    def test_debtors(self):
+        other = create_patient(first_name='Luis')
+        create_patient(first_name='Sin Adeudo')
+        self.create_treatment(paid='500.00')
+        self.create_treatment(price='5000.00', patient=other)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/finances/balances/debtors/')
+        self.assertEqual([row['patient'] for row in response.data['results']], [other.pk, self.patient.pk])
+
+    def test_deleting_patient_with_history(self):
+        self.create_treatment()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.delete()
+        self.assertFalse(PatientBalance.objects.exists())
+
+    def test_reconcile_fixes_drift(self):
+        treatment = self.create_treatment(paid='500.00')
+        other = create_patient(first_name='Luis')
+        Treatment.objects.filter(pk=treatment.pk).update(amount_paid=Decimal('1500.00'))
+
+        out = StringIO()
+        call_command('reconcile_balances', '--dry-run', stdout=out)
+        self.assertIn('1 drifted and 1 missing would be fixed', out.getvalue())
+        self.assertEqual(self.balance().treatment_debt, Decimal('1000.00'))
+
+        call_command('reconcile_balances', stdout=StringIO())
+        self.assertEqual(self.balance().treatment_debt, Decimal('0'))
+        self.assertEqual(self.balance(other).treatment_debt, Decimal('0'))
 
-# Create your tests here.
+        out = StringIO()
+        call_command('reconcile_balances', stdout=out)
+        self.assertIn('0 drifted and 0 missing', out.getvalue())
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PaymentViewSet, ExpenseViewSet
+from .views import PaymentViewSet, ExpenseViewSet, PatientBalanceViewSet
 
 router = DefaultRouter()
 router.register(r'payments', PaymentViewSet, basename='payment')
 router.register(r'expenses', ExpenseViewSet, basename='expense')
+router.register(r'balances', PatientBalanceViewSet, basename='patient-balance')
 
 urlpatterns = router.urls
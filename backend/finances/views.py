@@ -4,14 +4,15 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Sum
 from django.utils import timezone
-from .models import Payment, Expense
-from .serializers import PaymentSerializer, ExpenseSerializer
+from _config.pagination import KeysetOrderingFilter, ListActionMixin
+from .models import Payment, Expense, PatientBalance
+from .serializers import PaymentSerializer, ExpenseSerializer, PatientBalanceSerializer
 
 
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.select_related('patient', 'treatment')
     serializer_class = PaymentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'treatment', 'payment_method', 'payment_date']
     search_fields = ['patient__first_name', 'patient__last_name', 'reference_number']
     ordering = ['-payment_date']
@@ -41,7 +42,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
 class ExpenseViewSet(viewsets.ModelViewSet):
     queryset = Expense.objects.all()
     serializer_class = ExpenseSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['category', 'payment_method', 'expense_date']
     search_fields = ['description', 'supplier', 'invoice_number']
     ordering = ['-expense_date']
@@ -73,3 +74,19 @@ class ExpenseViewSet(viewsets.ModelViewSet):
             'monthly_total': monthly_total,
             'by_category': by_category,
         })
+
+
+class PatientBalanceViewSet(ListActionMixin, viewsets.ReadOnlyModelViewSet):
+    """Read-only access to the stored patient balances"""
+    queryset = PatientBalance.objects.select_related('patient')
+    serializer_class = PatientBalanceSerializer
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
+    filterset_fields = ['patient']
+    ordering_fields = ['treatment_debt', 'installment_debt', 'last_payment_date']
+    ordering = ['-treatment_debt']
+    
+    @action(detail=False, methods=['get'])
+    def debtors(self, request):
+        """Patients with pending debt, largest first"""
+        debtors = self.queryset.debtors()
+        return self.list_response(debtors)
@@ -1,8 +1,49 @@
+from decimal import Decimal
 from django.db import models
+from django.db.models import Count, DecimalField, Exists, OuterRef, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from patients.models import Patient
 from budgets.models import Budget
 
 
+class InstallmentPlanQuerySet(models.QuerySet):
+    """Custom queryset with payment balance annotations"""
+    
+    def overdue_payments(self, today=None):
+        """Subquery of unpaid payments past their due date for the outer plan"""
+        return InstallmentPayment.objects.past_due(today).filter(installment_plan=OuterRef('pk'))
+    
+    def with_overdue_payments(self, today=None):
+        """Plans with at least one unpaid payment past its due date"""
+        return self.filter(Exists(self.overdue_payments(today)))
+    
+    def with_balances(self, today=None):
+        """
+        Annotate paid_total, paid_count and has_overdue so the balance
+        properties of every plan are computed in the same query
+        """
+        paid = Q(payments__status='paid')
+        return self.annotate(
+            paid_total=Coalesce(
+                Sum('payments__amount', filter=paid),
+                Value(Decimal('0')),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            ),
+            paid_count=Count('payments', filter=paid),
+            has_overdue=Exists(self.overdue_payments(today)),
+        )
+
+
+class InstallmentPaymentQuerySet(models.QuerySet):
+    """Custom queryset with due date lookups"""
+    
+    def past_due(self, today=None):
+        """Unpaid payments whose due date has passed"""
+        today = today or timezone.now().date()
+        return self.filter(status__in=InstallmentPayment.UNPAID_STATUSES, due_date__lt=today)
+
+
 class InstallmentPlan(models.Model):
     """Plan de cuotas para un presupuesto o tratamiento"""
     
@@ -13,6 +54,9 @@ class InstallmentPlan(models.Model):
         ('delinquent', 'Moroso'),
     ]
     
+    # Plans still collecting payments
+    OPEN_STATUSES = ['active', 'delinquent']
+    
     patient = models.ForeignKey(
         Patient,
         on_delete=models.CASCADE,
@@ -74,13 +118,24 @@ class InstallmentPlan(models.Model):
             models.Index(fields=['status', 'start_date']),
         ]
     
+    objects = InstallmentPlanQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.patient.full_name} - {self.number_of_installments} cuotas"
     
+    def _prefetched_payments(self):
+        """Payments from prefetch_related('payments'), or None if not prefetched"""
+        return getattr(self, '_prefetched_objects_cache', {}).get('payments')
+    
     @property
     def paid_amount(self):
         """Total amount paid"""
-        return sum(payment.amount for payment in self.payments.filter(status='paid'))
+        if hasattr(self, 'paid_total'):
+            return self.paid_total
+        payments = self._prefetched_payments()
+        if payments is None:
+            payments = self.payments.filter(status='paid')
+        return sum(payment.amount for payment in payments if payment.status == 'paid')
     
     @property
     def pending_amount(self):
@@ -90,6 +145,11 @@ class InstallmentPlan(models.Model):
     @property
     def paid_installments(self):
         """Number of installments paid"""
+        if hasattr(self, 'paid_count'):
+            return self.paid_count
+        payments = self._prefetched_payments()
+        if payments is not None:
+            return sum(1 for payment in payments if payment.status == 'paid')
         return self.payments.filter(status='paid').count()
     
     @property
@@ -100,11 +160,12 @@ class InstallmentPlan(models.Model):
     @property
     def is_delinquent(self):
         """Check if there are overdue payments"""
-        from django.utils import timezone
-        return self.payments.filter(
-            status='pending',
-            due_date__lt=timezone.now().date()
-        ).exists()
+        if hasattr(self, 'has_overdue'):
+            return self.has_overdue
+        payments = self._prefetched_payments()
+        if payments is not None:
+            return any(payment.is_overdue for payment in payments)
+        return self.payments.past_due().exists()
 
 
 class InstallmentPayment(models.Model):
@@ -117,6 +178,9 @@ class InstallmentPayment(models.Model):
         ('cancelled', 'Cancelado'),
     ]
     
+    # Statuses of payments still owed
+    UNPAID_STATUSES = ['pending', 'overdue']
+    
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'Efectivo'),
         ('card', 'Tarjeta'),
@@ -187,21 +251,21 @@ class InstallmentPayment(models.Model):
         ]
         unique_together = [['installment_plan', 'installment_number']]
     
+    objects = InstallmentPaymentQuerySet.as_manager()
+    
     def __str__(self):
         return f"Cuota {self.installment_number} - {self.installment_plan.patient.full_name}"
     
     @property
     def is_overdue(self):
         """Check if payment is overdue"""
-        from django.utils import timezone
-        if self.status == 'pending':
+        if self.status in self.UNPAID_STATUSES:
             return self.due_date < timezone.now().date()
         return False
     
     @property
     def days_overdue(self):
         """Number of days overdue"""
-        from django.utils import timezone
         if self.is_overdue:
             return (timezone.now().date() - self.due_date).days
         return 0
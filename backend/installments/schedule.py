@@ -0,0 +1,52 @@
+"""
+Installment schedule generation.
+
+Pure functions: the whole schedule is computed in memory so it can be
+previewed without touching the database or persisted with one bulk_create.
+"""
+from decimal import Decimal, ROUND_DOWN
+
+from dateutil.relativedelta import relativedelta
+
+
+CENT = Decimal('0.01')
+
+
+def default_installment_amount(total_amount, number_of_installments):
+    """Equal installment rounded down to cents; the last one absorbs the remainder"""
+    return (Decimal(total_amount) / number_of_installments).quantize(CENT, rounding=ROUND_DOWN)
+
+
+def build_schedule(total_amount, number_of_installments, start_date, installment_amount=None):
+    """
+    Compute the payment schedule of a plan.
+
+    Returns a list of dicts with installment_number, amount and due_date, one
+    per month starting at start_date. Every installment is installment_amount
+    except the last, which takes whatever is left so the schedule always adds
+    up to total_amount. Raises ValueError when the amounts cannot add up.
+    """
+    total_amount = Decimal(total_amount).quantize(CENT)
+    if number_of_installments < 1:
+        raise ValueError('El número de cuotas debe ser al menos 1')
+    if total_amount <= 0:
+        raise ValueError('El monto total debe ser mayor a cero')
+
+    if installment_amount is None:
+        installment_amount = default_installment_amount(total_amount, number_of_installments)
+    installment_amount = Decimal(installment_amount).quantize(CENT)
+    if installment_amount <= 0:
+        raise ValueError('El monto por cuota debe ser mayor a cero')
+
+    last_amount = total_amount - installment_amount * (number_of_installments - 1)
+    if last_amount <= 0:
+        raise ValueError('El monto por cuota excede el monto total del plan')
+
+    return [
+        {
+            'installment_number': number,
+            'amount': last_amount if number == number_of_installments else installment_amount,
+            'due_date': start_date + relativedelta(months=number - 1),
+        }
+        for number in range(1, number_of_installments + 1)
+    ]
@@ -1,5 +1,7 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import InstallmentPlan, InstallmentPayment
+from .schedule import build_schedule
 
 
 class InstallmentPaymentSerializer(serializers.ModelSerializer):
@@ -64,9 +66,53 @@ class InstallmentPlanSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class InstallmentPlanCreateSerializer(serializers.ModelSerializer):
+class InstallmentScheduleMixin:
+    """Validate the plan amounts by computing its payment schedule"""
+    
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        try:
+            schedule = build_schedule(
+                attrs['total_amount'],
+                attrs['number_of_installments'],
+                attrs['start_date'],
+                attrs.get('installment_amount')
+            )
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        
+        attrs['installment_amount'] = schedule[0]['amount']
+        self.schedule = schedule
+        return attrs
+
+
+class ScheduledPaymentSerializer(serializers.Serializer):
+    """Serializer for one computed (unsaved) installment"""
+    
+    installment_number = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    due_date = serializers.DateField()
+
+
+class InstallmentSchedulePreviewSerializer(InstallmentScheduleMixin, serializers.Serializer):
+    """Serializer for previewing a payment schedule without saving it"""
+    
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    number_of_installments = serializers.IntegerField(min_value=1)
+    installment_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    start_date = serializers.DateField()
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['payments'] = ScheduledPaymentSerializer(self.schedule, many=True).data
+        return data
+
+
+class InstallmentPlanCreateSerializer(InstallmentScheduleMixin, serializers.ModelSerializer):
     """Serializer for creating installment plans with automatic payment generation"""
     
+    installment_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    
     class Meta:
         model = InstallmentPlan
         fields = [
@@ -80,21 +126,12 @@ class InstallmentPlanCreateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
-        """Create installment plan and generate payment schedule"""
-        from dateutil.relativedelta import relativedelta
-        
-        plan = InstallmentPlan.objects.create(**validated_data)
-        
-        # Generate installment payments
-        for i in range(plan.number_of_installments):
-            due_date = plan.start_date + relativedelta(months=i)
-            
-            InstallmentPayment.objects.create(
-                installment_plan=plan,
-                installment_number=i + 1,
-                amount=plan.installment_amount,
-                due_date=due_date,
-                status='pending'
-            )
+        """Create installment plan and its whole payment schedule in one transaction"""
+        with transaction.atomic():
+            plan = InstallmentPlan.objects.create(**validated_data)
+            InstallmentPayment.objects.bulk_create([
+                InstallmentPayment(installment_plan=plan, status='pending', **payment)
+                for payment in self.schedule
+            ])
         
         return plan
@@ -0,0 +1,50 @@
+"""
+Celery tasks for the installments app
+"""
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Create a dummy decorator if Celery is not available
+    def shared_task(func):
+        return func
+
+
+@shared_task
+def mark_overdue_installments():
+    """
+    Celery task to flag overdue payments and delinquent plans, and to move
+    delinquent plans whose overdue payments were settled back to active
+    This should be run daily; every transition is a single set-based update
+    """
+    from django.db import transaction
+    from django.db.models import Exists
+    from django.utils import timezone
+    from .models import InstallmentPlan, InstallmentPayment
+    
+    now = timezone.now()
+    today = now.date()
+    
+    with transaction.atomic():
+        payments_updated = InstallmentPayment.objects.filter(
+            status='pending',
+            due_date__lt=today,
+            installment_plan__status__in=InstallmentPlan.OPEN_STATUSES
+        ).update(status='overdue', updated_at=now)
+        
+        plans_updated = InstallmentPlan.objects.filter(
+            status='active'
+        ).with_overdue_payments(today).update(status='delinquent', updated_at=now)
+        
+        plans_reactivated = InstallmentPlan.objects.filter(
+            status='delinquent'
+        ).exclude(
+            Exists(InstallmentPlan.objects.overdue_payments(today))
+        ).update(status='active', updated_at=now)
+    
+    return {
+        'success': True,
+        'payments_overdue': payments_updated,
+        'plans_delinquent': plans_updated,
+        'plans_reactivated': plans_reactivated,
+    }
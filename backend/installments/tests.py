@@ -0,0 +1,246 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient
+from .models import InstallmentPlan, InstallmentPayment
+from .schedule import build_schedule
+from .tasks import mark_overdue_installments
+
+
+def create_plan(patient, installments=4, paid=0, overdue=0, amount=Decimal('250.00')):
+    """Plan with `paid` paid installments and `overdue` pending ones past due"""
+    today = timezone.now().date()
+    plan = InstallmentPlan.objects.create(
+        patient=patient,
+        total_amount=amount * installments,
+        number_of_installments=installments,
+        installment_amount=amount,
+        start_date=today - timedelta(days=30 * (paid + overdue)),
+    )
+    InstallmentPayment.objects.bulk_create([
+        InstallmentPayment(
+            installment_plan=plan,
+            installment_number=number,
+            amount=amount,
+            due_date=today + timedelta(days=30 * (number - paid - overdue)) - timedelta(days=1),
+            status='paid' if number <= paid else 'pending',
+        )
+        for number in range(1, installments + 1)
+    ])
+    return plan
+
+
+class InstallmentPlanBalanceTestCase(TestCase):
+    """Balance properties backed by annotations or prefetched payments"""
+
+    url = '/api/installments/plans/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.plan = create_plan(self.patient, installments=4, paid=1, overdue=1)
+
+    def assert_balances(self, plan):
+        self.assertEqual(plan.paid_amount, Decimal('250.00'))
+        self.assertEqual(plan.pending_amount, Decimal('750.00'))
+        self.assertEqual(plan.paid_installments, 1)
+        self.assertEqual(plan.pending_installments, 3)
+        self.assertTrue(plan.is_delinquent)
+
+    def test_annotated_plan_needs_no_queries(self):
+        plan = InstallmentPlan.objects.with_balances().get(pk=self.plan.pk)
+        with self.assertNumQueries(0):
+            self.assert_balances(plan)
+
+    def test_prefetched_plan_needs_no_queries(self):
+        plan = InstallmentPlan.objects.prefetch_related('payments').get(pk=self.plan.pk)
+        with self.assertNumQueries(0):
+            self.assert_balances(plan)
+
+    def test_plain_plan_still_computes_balances(self):
+        self.assert_balances(InstallmentPlan.objects.get(pk=self.plan.pk))
+
+    def test_plan_without_payments(self):
+        plan = InstallmentPlan.objects.create(
+            patient=self.patient,
+            total_amount=Decimal('100.00'),
+            number_of_installments=1,
+            installment_amount=Decimal('100.00'),
+            start_date=timezone.now().date(),
+        )
+        plan = InstallmentPlan.objects.with_balances().get(pk=plan.pk)
+        self.assertEqual(plan.paid_amount, Decimal('0'))
+        self.assertEqual(plan.pending_installments, 1)
+        self.assertFalse(plan.is_delinquent)
+
+    def test_list_query_count_is_constant(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        for _ in range(9):
+            create_plan(self.patient, installments=6, paid=2)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['results']), 10)
+
+        data = next(plan for plan in response.data['results'] if plan['id'] == self.plan.pk)
+        self.assertEqual(data['paid_amount'], Decimal('250.00'))
+        self.assertEqual(data['pending_installments'], 3)
+        self.assertTrue(data['is_delinquent'])
+
+    def test_overdue_uses_the_date_of_the_request(self):
+        plan = create_plan(self.patient, installments=2)
+        url = f'{self.url}{plan.pk}/'
+        self.assertFalse(self.client.get(url).data['is_delinquent'])
+
+        # The first installment falls due while the process keeps running
+        later = timezone.now() + timedelta(days=40)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            response = self.client.get(url)
+        self.assertTrue(response.data['is_delinquent'])
+
+    def test_cancel_returns_fresh_balances(self):
+        response = self.client.post(f'{self.url}{self.plan.pk}/cancel/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_delinquent'])
+        self.assertTrue(all(p['status'] in ('paid', 'cancelled') for p in response.data['payments']))
+
+
+class DelinquencyTestCase(TestCase):
+    """Delinquent plan detection and overdue transitions"""
+
+    url = '/api/installments/plans/delinquent/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient()
+        self.late = create_plan(self.patient, paid=1, overdue=2)
+        self.on_time = create_plan(self.patient, paid=2)
+        self.cancelled = create_plan(self.patient, overdue=1)
+        InstallmentPlan.objects.filter(pk=self.cancelled.pk).update(status='cancelled')
+
+    def test_delinquent_endpoint_filters_in_database(self):
+        for _ in range(5):
+            create_plan(self.patient, overdue=1)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertNotIn(self.on_time.pk, [plan['id'] for plan in response.data['results']])
+
+    def test_job_transitions_payments_and_plans(self):
+        result = mark_overdue_installments()
+
+        self.assertEqual(result['payments_overdue'], 2)
+        self.assertEqual(result['plans_delinquent'], 1)
+        self.assertEqual(InstallmentPlan.objects.get(pk=self.late.pk).status, 'delinquent')
+        self.assertEqual(InstallmentPlan.objects.get(pk=self.on_time.pk).status, 'active')
+        self.assertEqual(self.late.payments.filter(status='overdue').count(), 2)
+
+        # Reruns touch nothing new
+        result = mark_overdue_installments()
+        self.assertEqual(result['payments_overdue'], 0)
+        self.assertEqual(result['plans_delinquent'], 0)
+
+    def test_flagged_plans_stay_listed_and_recover_once_settled(self):
+        mark_overdue_installments()
+        self.assertEqual(InstallmentPlan.objects.get(pk=self.late.pk).status, 'delinquent')
+
+        response = self.client.get(self.url)
+        self.assertEqual([plan['id'] for plan in response.data['results']], [self.late.pk])
+
+        # Settling the overdue payments puts the plan back to active
+        for payment in self.late.payments.filter(status='overdue'):
+            self.client.post(f'/api/installments/payments/{payment.pk}/mark_paid/')
+        self.assertEqual(InstallmentPlan.objects.get(pk=self.late.pk).status, 'active')
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+
+    def test_job_reactivates_settled_plans(self):
+        mark_overdue_installments()
+        self.late.payments.filter(status='overdue').update(status='paid')
+
+        result = mark_overdue_installments()
+        self.assertEqual(result['plans_reactivated'], 1)
+        self.assertEqual(InstallmentPlan.objects.get(pk=self.late.pk).status, 'active')
+
+    def test_overdue_payments_still_count_as_unpaid(self):
+        mark_overdue_installments()
+        plan = InstallmentPlan.objects.with_balances().get(pk=self.late.pk)
+        self.assertTrue(plan.is_delinquent)
+        self.assertEqual(plan.pending_installments, 3)
+
+        payment = self.late.payments.filter(status='overdue').first()
+        self.assertTrue(payment.is_overdue)
+        response = self.client.post(f'/api/installments/payments/{payment.pk}/mark_paid/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(InstallmentPlan.objects.get(pk=self.late.pk).status, 'completed')
+
+
+class InstallmentScheduleTestCase(TestCase):
+    """Schedule computation, preview and bulk creation"""
+
+    url = '/api/installments/plans/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient()
+
+    def test_last_installment_absorbs_rounding(self):
+        schedule = build_schedule(Decimal('1000.00'), 3, date(2030, 1, 31))
+
+        self.assertEqual([p['amount'] for p in schedule], [Decimal('333.33'), Decimal('333.33'), Decimal('333.34')])
+        self.assertEqual(sum(p['amount'] for p in schedule), Decimal('1000.00'))
+        self.assertEqual([p['due_date'] for p in schedule], [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31)])
+
+    def test_given_installment_amount(self):
+        schedule = build_schedule(Decimal('1000.00'), 4, date(2030, 1, 1), Decimal('300.00'))
+        self.assertEqual(schedule[-1]['amount'], Decimal('100.00'))
+
+        with self.assertRaises(ValueError):
+            build_schedule(Decimal('1000.00'), 4, date(2030, 1, 1), Decimal('400.00'))
+
+    def test_preview_does_not_write(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(f'{self.url}preview/', {
+                'total_amount': '1000.00',
+                'number_of_installments': 3,
+                'start_date': '2030-01-15',
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['installment_amount'], '333.33')
+        self.assertEqual(len(response.data['payments']), 3)
+        self.assertEqual(response.data['payments'][2]['amount'], '333.34')
+        self.assertEqual(response.data['payments'][2]['due_date'], '2030-03-15')
+
+    def test_invalid_amounts_are_rejected(self):
+        response = self.client.post(f'{self.url}preview/', {
+            'total_amount': '100.00',
+            'number_of_installments': 3,
+            'installment_amount': '60.00',
+            'start_date': '2030-01-15',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_create_persists_schedule_in_bulk(self):
+        payload = {
+            'patient': self.patient.pk,
+            'total_amount': '36000.00',
+            'number_of_installments': 36,
+            'start_date': '2030-01-15',
+        }
+        # Patient lookup, then plan and payments inserted in one savepoint
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        plan = InstallmentPlan.objects.get()
+        self.assertEqual(plan.installment_amount, Decimal('1000.00'))
+        self.assertEqual(plan.payments.count(), 36)
+        self.assertEqual(plan.payments.last().due_date, date(2032, 12, 15))
@@ -3,43 +3,55 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from _config.pagination import KeysetOrderingFilter, ListActionMixin
 from .models import InstallmentPlan, InstallmentPayment
 from .serializers import (
     InstallmentPlanSerializer,
     InstallmentPlanCreateSerializer,
-    InstallmentPaymentSerializer
+    InstallmentPaymentSerializer,
+    InstallmentSchedulePreviewSerializer
 )
 
 
-class InstallmentPlanViewSet(viewsets.ModelViewSet):
+class InstallmentPlanViewSet(ListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing installment plans
     """
-    queryset = InstallmentPlan.objects.select_related('patient', 'budget').prefetch_related('payments')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    queryset = InstallmentPlan.objects.all()
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'status', 'budget']
     search_fields = ['patient__first_name', 'patient__last_name']
     ordering_fields = ['start_date', 'total_amount', 'created_at']
     ordering = ['-created_at']
     
+    def get_queryset(self):
+        """Balances are annotated per request, so overdue checks use today's date"""
+        return super().get_queryset().with_balances().select_related(
+            'patient', 'budget'
+        ).prefetch_related('payments')
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return InstallmentPlanCreateSerializer
         return InstallmentPlanSerializer
     
+    @action(detail=False, methods=['post'])
+    def preview(self, request):
+        """Compute the payment schedule of a plan without saving anything"""
+        serializer = InstallmentSchedulePreviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def delinquent(self, request):
         """Get all delinquent installment plans"""
-        today = timezone.now().date()
-        
-        # Get plans with overdue payments
-        delinquent_plans = []
-        for plan in self.queryset.filter(status='active'):
-            if plan.is_delinquent:
-                delinquent_plans.append(plan)
+        # Open plans with overdue payments, whether or not the nightly job
+        # already flagged them, filtered in the database
+        delinquent_plans = self.get_queryset().filter(
+            status__in=InstallmentPlan.OPEN_STATUSES
+        ).with_overdue_payments()
         
-        serializer = self.get_serializer(delinquent_plans, many=True)
-        return Response(serializer.data)
+        return self.list_response(delinquent_plans)
     
     @action(detail=True, methods=['post'])
     def mark_delinquent(self, request, pk=None):
@@ -65,20 +77,24 @@ class InstallmentPlanViewSet(viewsets.ModelViewSet):
         plan.status = 'cancelled'
         plan.save()
         
-        # Cancel all pending payments
-        plan.payments.filter(status='pending').update(status='cancelled')
+        # Cancel all unpaid payments
+        plan.payments.filter(
+            status__in=InstallmentPayment.UNPAID_STATUSES
+        ).update(status='cancelled')
         
+        # Reload so balances and payments reflect the cancellation
+        plan = self.get_queryset().get(pk=plan.pk)
         serializer = self.get_serializer(plan)
         return Response(serializer.data)
 
 
-class InstallmentPaymentViewSet(viewsets.ModelViewSet):
+class InstallmentPaymentViewSet(ListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing installment payments
     """
     queryset = InstallmentPayment.objects.select_related('installment_plan', 'installment_plan__patient')
     serializer_class = InstallmentPaymentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['installment_plan', 'status', 'payment_method']
     search_fields = ['installment_plan__patient__first_name', 'installment_plan__patient__last_name']
     ordering_fields = ['due_date', 'payment_date', 'installment_number']
@@ -107,9 +123,13 @@ class InstallmentPaymentViewSet(viewsets.ModelViewSet):
         
         # Check if all payments are completed
         plan = payment.installment_plan
-        if plan.payments.filter(status='pending').count() == 0:
+        if not plan.payments.filter(status__in=InstallmentPayment.UNPAID_STATUSES).exists():
             plan.status = 'completed'
             plan.save()
+        elif plan.status == 'delinquent' and not plan.payments.past_due().exists():
+            # The overdue payments are settled, the plan is back on track
+            plan.status = 'active'
+            plan.save()
         
         serializer = self.get_serializer(payment)
         return Response(serializer.data)
@@ -117,14 +137,9 @@ class InstallmentPaymentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def overdue(self, request):
         """Get all overdue payments"""
-        today = timezone.now().date()
-        overdue_payments = self.queryset.filter(
-            status='pending',
-            due_date__lt=today
-        )
+        overdue_payments = self.queryset.past_due()
         
-        serializer = self.get_serializer(overdue_payments, many=True)
-        return Response(serializer.data)
+        return self.list_response(overdue_payments)
     
     @action(detail=False, methods=['get'])
     def upcoming(self, request):
@@ -139,5 +154,4 @@ class InstallmentPaymentViewSet(viewsets.ModelViewSet):
             due_date__lte=upcoming_date
         )
         
-        serializer = self.get_serializer(upcoming_payments, many=True)
-        return Response(serializer.data)
+        return self.list_response(upcoming_payments)
@@ -9,7 +9,7 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ['patient__first_name', 'patient__last_name', 'message']
     ordering = ['-created_at']
     date_hierarchy = 'created_at'
-    readonly_fields = ['sent_at', 'response_data', 'error_message', 'created_at', 'updated_at']
+    readonly_fields = ['sent_at', 'response_data', 'error_message', 'attempts', 'created_at', 'updated_at']
     
     fieldsets = (
         ('Paciente', {
@@ -25,7 +25,7 @@ class NotificationAdmin(admin.ModelAdmin):
             'fields': ('status', 'scheduled_for', 'sent_at')
         }),
         ('Respuesta', {
-            'fields': ('response_data', 'error_message'),
+            'fields': ('response_data', 'error_message', 'attempts'),
             'classes': ('collapse',)
         }),
     )
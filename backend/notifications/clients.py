@@ -0,0 +1,158 @@
+"""
+Process-wide registry of provider clients.
+
+Every service used to build a new SendGrid/Twilio client per message, which
+meant a new HTTP session and TLS handshake for each send. The registry keeps
+one client per provider and credentials, built lazily and backed by a
+keep-alive requests session sized for the dispatch thread pool. Clients are
+recycled when they get old, after repeated connection errors, or when the
+process has been forked (e.g. Celery prefork workers).
+"""
+import os
+import threading
+import time
+
+from django.conf import settings
+
+
+SENDGRID_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+# Errors that point at a broken connection rather than a rejected message
+try:
+    from requests.exceptions import ConnectionError as _ConnectionError, Timeout as _Timeout
+    CONNECTION_ERRORS = (_ConnectionError, _Timeout)
+except ImportError:
+    CONNECTION_ERRORS = ()
+
+
+def pooled_session(headers=None):
+    """Keep-alive requests session with a connection pool per dispatch worker"""
+    from requests import Session
+    from requests.adapters import HTTPAdapter
+
+    session = Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.NOTIFICATION_DISPATCH_WORKERS,
+        max_retries=settings.NOTIFICATION_CLIENT_MAX_RETRIES,
+    )
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+class SendGridClient:
+    """Minimal SendGrid v3 client that reuses one pooled session"""
+
+    def __init__(self, api_key):
+        self.session = pooled_session({'Authorization': f'Bearer {api_key}'})
+
+    def send(self, mail):
+        """Send a sendgrid.helpers.mail.Mail and return the HTTP response"""
+        response = self.session.post(
+            SENDGRID_SEND_URL,
+            json=mail.get(),
+            timeout=settings.NOTIFICATION_CLIENT_TIMEOUT
+        )
+        response.raise_for_status()
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def build_sendgrid_client(api_key):
+    return SendGridClient(api_key)
+
+
+def build_twilio_client(account_sid, auth_token):
+    from twilio.http.http_client import TwilioHttpClient
+    from twilio.rest import Client
+
+    http_client = TwilioHttpClient(timeout=settings.NOTIFICATION_CLIENT_TIMEOUT)
+    http_client.session.close()
+    http_client.session = pooled_session()
+    return Client(account_sid, auth_token, http_client=http_client)
+
+
+def _close(client):
+    """Release the connections held by a client"""
+    if hasattr(client, 'close'):
+        client.close()
+    http_client = getattr(client, 'http_client', None)
+    session = getattr(http_client, 'session', None)
+    if session is not None:
+        session.close()
+
+
+class _Entry:
+    def __init__(self, client):
+        self.client = client
+        self.created_at = time.monotonic()
+        self.failures = 0
+
+
+class ClientRegistry:
+    """Thread-safe cache of provider clients keyed by provider and credentials"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._pid = os.getpid()
+
+    def get(self, key, factory):
+        """Return the client for key, building it with factory() when needed"""
+        with self._lock:
+            self._check_fork()
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._discard(key)
+                entry = None
+            if entry is None:
+                entry = self._entries[key] = _Entry(factory())
+            return entry.client
+
+    def report_success(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.failures = 0
+
+    def report_failure(self, key):
+        """Count a connection error; drop the client after too many in a row"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.failures += 1
+            if entry.failures >= settings.NOTIFICATION_CLIENT_MAX_FAILURES:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._discard(key)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _expired(self, entry):
+        max_age = settings.NOTIFICATION_CLIENT_MAX_AGE
+        return bool(max_age) and time.monotonic() - entry.created_at > max_age
+
+    def _discard(self, key):
+        entry = self._entries.pop(key)
+        try:
+            _close(entry.client)
+        except Exception:
+            pass
+
+    def _check_fork(self):
+        # Sockets must not be shared with the parent process
+        if os.getpid() != self._pid:
+            self._entries = {}
+            self._pid = os.getpid()
+
+
+registry = ClientRegistry()
@@ -0,0 +1,71 @@
+"""
+Batched notification dispatch.
+
+Pending notifications are claimed in chunks with SELECT ... FOR UPDATE SKIP
+LOCKED, so several workers can drain the queue without sending the same
+message twice. Each chunk is sent over a bounded thread pool that shares one
+set of provider clients, and the status changes are written back with a
+single bulk_update per chunk.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .services import apply_result, build_services, deliver
+
+
+UPDATE_FIELDS = ['status', 'sent_at', 'error_message', 'response_data', 'attempts', 'updated_at']
+
+
+def send_batch(notifications, services=None, workers=None):
+    """
+    Send already loaded notifications concurrently and save their status
+    Returns the provider results in the same order as the notifications
+    """
+    notifications = list(notifications)
+    if not notifications:
+        return []
+
+    services = services or build_services()
+    workers = max(1, min(workers or settings.NOTIFICATION_DISPATCH_WORKERS, len(notifications)))
+
+    # Worker threads only talk to the providers; all database work stays here
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda notification: deliver(notification, services), notifications))
+
+    now = timezone.now()
+    for notification, result in zip(notifications, results):
+        apply_result(notification, result, now)
+    Notification.objects.bulk_update(notifications, UPDATE_FIELDS)
+
+    return results
+
+
+def dispatch_pending(queryset=None, batch_size=None, workers=None, services=None):
+    """
+    Claim and send pending notifications chunk by chunk until none are left
+    Returns a summary with the number of sent and failed notifications
+    """
+    queryset = queryset if queryset is not None else Notification.objects.all()
+    queryset = queryset.filter(status='pending').order_by('pk')
+    batch_size = batch_size or settings.NOTIFICATION_DISPATCH_BATCH_SIZE
+    services = services or build_services()
+
+    summary = {'total': 0, 'sent': 0, 'failed': 0}
+    while True:
+        with transaction.atomic():
+            # Rows stay locked until the chunk's statuses are committed
+            chunk = list(queryset.select_for_update(skip_locked=True, of=('self',))[:batch_size])
+            if not chunk:
+                break
+            results = send_batch(chunk, services=services, workers=workers)
+
+        sent = sum(1 for result in results if result['success'])
+        summary['total'] += len(results)
+        summary['sent'] += sent
+        summary['failed'] += len(results) - sent
+
+    return summary
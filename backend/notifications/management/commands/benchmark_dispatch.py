@@ -0,0 +1,114 @@
+"""
+Management command to benchmark notification dispatch against the fake provider.
+
+Creates pending notifications inside a transaction that is always rolled
+back, then compares sending them one by one (send_notification + save) with
+the batched, concurrent pipeline (dispatch_pending).
+"""
+
+import time as timer
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from notifications.dispatch import dispatch_pending
+from notifications.models import Notification
+from notifications.services import FakeService, send_notification
+from patients.models import Patient
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark data"""
+
+
+def seed_notifications(patient, count):
+    """Bulk insert `count` pending SMS notifications for one patient"""
+    return Notification.objects.bulk_create([
+        Notification(
+            patient=patient,
+            notification_type='general',
+            method='sms',
+            message=f'Mensaje de prueba {index}',
+            recipient_phone=patient.phone,
+            status='pending',
+        )
+        for index in range(count)
+    ], batch_size=500)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark sequential vs batched notification dispatch with a fake provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=500,
+            help='Number of notifications to send per run',
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.05,
+            help='Simulated provider round trip in seconds',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Thread pool size for the batched pipeline',
+        )
+        parser.add_argument(
+            '--batch',
+            type=int,
+            default=100,
+            help='Notifications claimed per chunk',
+        )
+
+    def handle(self, *args, **options):
+        count = options['count']
+        fake = FakeService(latency=options['latency'])
+        services = {'email': fake, 'sms': fake, 'whatsapp': fake}
+
+        self.stdout.write(f'{"pipeline":>10} {"total":>12} {"per msg":>12} {"queries":>8}')
+
+        try:
+            with transaction.atomic():
+                patient = Patient.objects.create(
+                    first_name='Benchmark',
+                    last_name='Paciente',
+                    gender='O',
+                    date_of_birth=date(1990, 1, 1),
+                    phone='+5215512345678',
+                )
+
+                seed_notifications(patient, count)
+                with CaptureQueriesContext(connection) as queries:
+                    started = timer.perf_counter()
+                    for notification in Notification.objects.filter(status='pending'):
+                        send_notification(notification, services)
+                    self._report('sequential', started, count, queries)
+
+                seed_notifications(patient, count)
+                with CaptureQueriesContext(connection) as queries:
+                    started = timer.perf_counter()
+                    dispatch_pending(
+                        batch_size=options['batch'],
+                        workers=options['workers'],
+                        services=services
+                    )
+                    self._report('batched', started, count, queries)
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded data rolled back.'))
+
+    def _report(self, name, started, count, queries):
+        elapsed = timer.perf_counter() - started
+        self.stdout.write(
+            f'{name:>10} {elapsed:>10.2f} s {elapsed * 1000 / count:>9.2f} ms {len(queries):>8}'
+        )
@@ -107,6 +107,10 @@ class Notification(models.Model):
         null=True,
         verbose_name='Mensaje de Error'
     )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Intentos de Envío'
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Creado el')
@@ -31,10 +31,11 @@ class NotificationSerializer(serializers.ModelSerializer):
             'sent_at',
             'response_data',
             'error_message',
+            'attempts',
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['id', 'status', 'sent_at', 'response_data', 'error_message', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'sent_at', 'response_data', 'error_message', 'attempts', 'created_at', 'updated_at']
 
 
 class NotificationCreateSerializer(serializers.ModelSerializer):
@@ -2,7 +2,11 @@
 Services for sending notifications via SendGrid (email) and Twilio (SMS/WhatsApp)
 """
 import os
+import random
+import time
+import uuid
 from django.conf import settings
+from .clients import CONNECTION_ERRORS, build_sendgrid_client, build_twilio_client, registry
 
 
 class EmailService:
@@ -11,6 +15,12 @@ class EmailService:
     def __init__(self):
         self.api_key = os.getenv('SENDGRID_API_KEY')
         self.from_email = os.getenv('SENDGRID_FROM_EMAIL', 'noreply@dientex.com')
+        self.client_key = ('sendgrid', self.api_key)
+    
+    @property
+    def client(self):
+        """Shared SendGrid client from the process-wide registry"""
+        return registry.get(self.client_key, lambda: build_sendgrid_client(self.api_key))
     
     def send_email(self, to_email, subject, message):
         """Send email using SendGrid"""
@@ -22,7 +32,6 @@ class EmailService:
         
         try:
             # Import SendGrid library
-            from sendgrid import SendGridAPIClient
             from sendgrid.helpers.mail import Mail
             
             # Create message
@@ -34,8 +43,8 @@ class EmailService:
             )
             
             # Send email
-            sg = SendGridAPIClient(self.api_key)
-            response = sg.send(mail)
+            response = self.client.send(mail)
+            registry.report_success(self.client_key)
             
             return {
                 'success': True,
@@ -44,6 +53,8 @@ class EmailService:
             }
             
         except Exception as e:
+            if isinstance(e, CONNECTION_ERRORS):
+                registry.report_failure(self.client_key)
             return {
                 'success': False,
                 'error': str(e)
@@ -57,6 +68,15 @@ class SMSService:
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.from_number = os.getenv('TWILIO_PHONE_NUMBER')
+        self.client_key = ('twilio', self.account_sid, self.auth_token)
+    
+    @property
+    def client(self):
+        """Shared Twilio client from the process-wide registry"""
+        return registry.get(
+            self.client_key,
+            lambda: build_twilio_client(self.account_sid, self.auth_token)
+        )
     
     def send_sms(self, to_phone, message):
         """Send SMS using Twilio"""
@@ -67,18 +87,13 @@ class SMSService:
             }
         
         try:
-            # Import Twilio library
-            from twilio.rest import Client
-            
-            # Create client
-            client = Client(self.account_sid, self.auth_token)
-            
             # Send SMS
-            message_obj = client.messages.create(
+            message_obj = self.client.messages.create(
                 body=message,
                 from_=self.from_number,
                 to=to_phone
             )
+            registry.report_success(self.client_key)
             
             return {
                 'success': True,
@@ -87,6 +102,8 @@ class SMSService:
             }
             
         except Exception as e:
+            if isinstance(e, CONNECTION_ERRORS):
+                registry.report_failure(self.client_key)
             return {
                 'success': False,
                 'error': str(e)
@@ -100,6 +117,15 @@ class WhatsAppService:
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN')
         self.from_number = os.getenv('TWILIO_WHATSAPP_NUMBER', 'whatsapp:+14155238886')
+        self.client_key = ('twilio', self.account_sid, self.auth_token)
+    
+    @property
+    def client(self):
+        """Shared Twilio client from the process-wide registry"""
+        return registry.get(
+            self.client_key,
+            lambda: build_twilio_client(self.account_sid, self.auth_token)
+        )
     
     def send_whatsapp(self, to_phone, message):
         """Send WhatsApp message using Twilio"""
@@ -110,21 +136,16 @@ class WhatsAppService:
             }
         
         try:
-            # Import Twilio library
-            from twilio.rest import Client
-            
-            # Create client
-            client = Client(self.account_sid, self.auth_token)
-            
             # Format phone number for WhatsApp
             to_number = f"whatsapp:{to_phone}"
             
             # Send WhatsApp message
-            message_obj = client.messages.create(
+            message_obj = self.client.messages.create(
                 body=message,
                 from_=self.from_number,
                 to=to_number
             )
+            registry.report_success(self.client_key)
             
             return {
                 'success': True,
@@ -133,57 +154,113 @@ class WhatsAppService:
             }
             
         except Exception as e:
+            if isinstance(e, CONNECTION_ERRORS):
+                registry.report_failure(self.client_key)
             return {
                 'success': False,
                 'error': str(e)
             }
 
 
-def send_notification(notification):
+class FakeService:
     """
-    Send notification using appropriate service
+    Local stand-in for SendGrid and Twilio.
+    
+    Sleeps for `latency` seconds to mimic a provider round trip and fails a
+    `failure_rate` fraction of sends, so dispatch can be benchmarked offline.
+    """
+    
+    def __init__(self, latency=None, failure_rate=0.0):
+        self.latency = settings.NOTIFICATION_FAKE_LATENCY if latency is None else latency
+        self.failure_rate = failure_rate
+    
+    def _send(self, recipient):
+        if self.latency:
+            time.sleep(self.latency)
+        if not recipient:
+            return {'success': False, 'error': 'Recipient not provided'}
+        if self.failure_rate and random.random() < self.failure_rate:
+            return {'success': False, 'error': 'Simulated provider failure'}
+        return {'success': True, 'sid': f'fake-{uuid.uuid4().hex}', 'status': 'queued'}
+    
+    def send_email(self, to_email, subject, message):
+        return self._send(to_email)
+    
+    def send_sms(self, to_phone, message):
+        return self._send(to_phone)
+    
+    def send_whatsapp(self, to_phone, message):
+        return self._send(to_phone)
+
+
+def build_services(provider=None):
+    """Map each notification method to a service instance"""
+    provider = provider or settings.NOTIFICATION_PROVIDER
+    if provider == 'fake':
+        fake = FakeService()
+        return {'email': fake, 'sms': fake, 'whatsapp': fake}
+    return {
+        'email': EmailService(),
+        'sms': SMSService(),
+        'whatsapp': WhatsAppService(),
+    }
+
+
+def deliver(notification, services=None):
+    """
+    Send a notification through its provider without touching the database
     Returns response data
     """
-    from django.utils import timezone
+    services = services or build_services()
     
     if notification.method == 'email':
-        service = EmailService()
-        result = service.send_email(
+        return services['email'].send_email(
             notification.recipient_email,
             notification.subject,
             notification.message
         )
     
-    elif notification.method == 'sms':
-        service = SMSService()
-        result = service.send_sms(
+    if notification.method == 'sms':
+        return services['sms'].send_sms(
             notification.recipient_phone,
             notification.message
         )
     
-    elif notification.method == 'whatsapp':
-        service = WhatsAppService()
-        result = service.send_whatsapp(
+    if notification.method == 'whatsapp':
+        return services['whatsapp'].send_whatsapp(
             notification.recipient_phone,
             notification.message
         )
     
-    else:
-        result = {
-            'success': False,
-            'error': f'Unsupported notification method: {notification.method}'
-        }
+    return {
+        'success': False,
+        'error': f'Unsupported notification method: {notification.method}'
+    }
+
+
+def apply_result(notification, result, now=None):
+    """Update notification status fields from a provider result (not saved)"""
+    from django.utils import timezone
     
-    # Update notification status
+    now = now or timezone.now()
+    notification.attempts += 1
     if result['success']:
         notification.status = 'sent'
-        notification.sent_at = timezone.now()
-        notification.response_data = result
+        notification.sent_at = now
     else:
         notification.status = 'failed'
         notification.error_message = result.get('error', 'Unknown error')
-        notification.response_data = result
-    
+    notification.response_data = result
+    notification.updated_at = now
+
+
+def send_notification(notification, services=None):
+    """
+    Send notification using appropriate service
+    Returns response data
+    """
+    result = deliver(notification, services)
+    apply_result(notification, result)
     notification.save()
     
     return result
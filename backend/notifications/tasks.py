@@ -13,6 +13,13 @@ except ImportError:
         return func
 
 
+# A failed reminder is retried on later runs, at most this many sends in all,
+# waiting REMINDER_RETRY_BACKOFF after the first failure and twice as long
+# after each following one
+REMINDER_MAX_ATTEMPTS = 3
+REMINDER_RETRY_BACKOFF_MINUTES = 30
+
+
 @shared_task
 def send_notification_task(notification_id):
     """
@@ -37,91 +44,102 @@ def send_scheduled_notifications():
     """
     from django.utils import timezone
     from .models import Notification
-    from .services import send_notification
+    from .dispatch import dispatch_pending
     
-    # Get pending notifications that are scheduled to be sent
+    # Claim pending notifications that are scheduled to be sent in chunks
     now = timezone.now()
-    notifications = Notification.objects.filter(
-        status='pending',
-        scheduled_for__lte=now
-    )
-    
-    results = []
-    for notification in notifications:
-        result = send_notification(notification)
-        results.append({
-            'notification_id': notification.id,
-            'result': result
-        })
-    
-    return {
-        'total': len(results),
-        'results': results
-    }
+    return dispatch_pending(Notification.objects.filter(scheduled_for__lte=now))
 
 
 @shared_task
 def send_appointment_reminders():
     """
     Celery task to send appointment reminders
-    This should be run daily
+    This should be run periodically; reruns only pick up what is still missing
+    and retry failed reminders, with backoff, up to REMINDER_MAX_ATTEMPTS sends
     """
+    from django.db.models import Exists, OuterRef, Q
     from django.utils import timezone
     from datetime import timedelta
     from appointments.models import Appointment
-    from patients.models import Patient
     from .models import Notification
-    from .services import send_notification
+    from .dispatch import dispatch_pending
     
-    # Get appointments for tomorrow
-    tomorrow = timezone.now().date() + timedelta(days=1)
-    appointments = Appointment.objects.filter(
-        date=tomorrow,
-        status='scheduled',
-        reminder_sent=False
+    # Get appointments for tomorrow that still need a reminder
+    now = timezone.now()
+    tomorrow = now.date() + timedelta(days=1)
+    due = Appointment.objects.blocking().filter(date=tomorrow, reminder_sent=False)
+    reminders = Notification.objects.filter(
+        appointment=OuterRef('pk'),
+        notification_type='appointment_reminder'
     )
     
-    results = []
-    for appointment in appointments:
-        # Determine notification method based on patient preference
-        method = appointment.patient.preferred_contact_method
-        
-        # Create notification
-        message = (
-            f"Recordatorio: Tienes una cita mañana {appointment.date} "
-            f"a las {appointment.start_time}. "
-            f"Tipo: {appointment.get_consultation_type_display()}."
-        )
-        
-        notification = Notification.objects.create(
-            patient=appointment.patient,
+    # 1. Create one reminder per appointment that has none yet
+    to_notify = due.exclude(Exists(reminders)).select_related('patient')
+    
+    notifications = []
+    for appointment in to_notify:
+        patient = appointment.patient
+        notifications.append(Notification(
+            patient=patient,
             appointment=appointment,
             notification_type='appointment_reminder',
-            method=method,
+            method=patient.preferred_contact_method,
             subject='Recordatorio de Cita',
-            message=message,
-            recipient_email=appointment.patient.email if method == 'email' else None,
-            recipient_phone=appointment.patient.phone if method in ['sms', 'whatsapp'] else None,
-            status='pending'
-        )
-        
-        # Send notification
-        result = send_notification(notification)
-        
-        if result['success']:
-            appointment.reminder_sent = True
-            appointment.reminder_sent_at = timezone.now()
-            appointment.save()
-        
-        results.append({
-            'appointment_id': appointment.id,
-            'notification_id': notification.id,
-            'result': result
-        })
+            message=(
+                f"Recordatorio: Tienes una cita mañana {appointment.date} "
+                f"a las {appointment.start_time}. "
+                f"Tipo: {appointment.get_consultation_type_display()}."
+            ),
+            status='pending',
+            **_reminder_recipient(patient, patient.preferred_contact_method)
+        ))
+    Notification.objects.bulk_create(notifications, batch_size=500)
+    
+    # 2. Put failed reminders back in the queue once their backoff elapsed,
+    # with the patient's current contact details
+    backoff = Q()
+    for attempts in range(1, REMINDER_MAX_ATTEMPTS):
+        wait = timedelta(minutes=REMINDER_RETRY_BACKOFF_MINUTES * 2 ** (attempts - 1))
+        backoff |= Q(attempts=attempts, updated_at__lte=now - wait)
+    retries = list(Notification.objects.filter(
+        backoff,
+        notification_type='appointment_reminder',
+        status='failed',
+        appointment__in=due
+    ).select_related('patient'))
+    for notification in retries:
+        notification.status = 'pending'
+        for field, value in _reminder_recipient(notification.patient, notification.method).items():
+            setattr(notification, field, value)
+    Notification.objects.bulk_update(retries, ['status', 'recipient_email', 'recipient_phone'])
+    
+    # 3. Send every pending reminder for tomorrow, including leftovers
+    # from an interrupted run
+    summary = dispatch_pending(Notification.objects.filter(
+        notification_type='appointment_reminder',
+        appointment__date=tomorrow
+    ))
+    
+    # 4. Flag appointments whose reminder went out, skipping model validation
+    marked = due.filter(
+        Exists(reminders.filter(status__in=['sent', 'delivered']))
+    ).update(reminder_sent=True, reminder_sent_at=timezone.now())
     
     return {
-        'total': len(results),
-        'results': results
+        'created': len(notifications),
+        'retried': len(retries),
+        'sent': summary['sent'],
+        'failed': summary['failed'],
+        'appointments_marked': marked,
+    }
+
+
+def _reminder_recipient(patient, method):
+    """Recipient fields of a reminder sent to a patient by a method"""
+    return {
+        'recipient_email': patient.email if method == 'email' else None,
+        'recipient_phone': patient.phone if method in ['sms', 'whatsapp'] else None,
     }
 
 
@@ -135,16 +153,16 @@ def send_payment_reminders():
     from datetime import timedelta
     from installments.models import InstallmentPayment
     from .models import Notification
-    from .services import send_notification
+    from .dispatch import send_batch
     
     # Get payments due in 3 days
     reminder_date = timezone.now().date() + timedelta(days=3)
     payments = InstallmentPayment.objects.filter(
         due_date=reminder_date,
         status='pending'
-    )
+    ).select_related('installment_plan__patient')
     
-    results = []
+    notifications = []
     for payment in payments:
         patient = payment.installment_plan.patient
         method = patient.preferred_contact_method
@@ -166,15 +184,18 @@ def send_payment_reminders():
             recipient_phone=patient.phone if method in ['sms', 'whatsapp'] else None,
             status='pending'
         )
-        
-        # Send notification
-        result = send_notification(notification)
-        
-        results.append({
+        notifications.append((payment, notification))
+    
+    # Send all reminders concurrently
+    sent = send_batch([notification for _, notification in notifications])
+    results = [
+        {
             'payment_id': payment.id,
             'notification_id': notification.id,
             'result': result
-        })
+        }
+        for (payment, notification), result in zip(notifications, sent)
+    ]
     
     return {
         'total': len(results),
@@ -0,0 +1,264 @@
+import os
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+import requests
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from _config.testing import create_patient
+from appointments.management.commands.benchmark_conflicts import seed_day
+from appointments.models import Appointment
+from patients.models import Patient
+from .clients import ClientRegistry, registry
+from .dispatch import dispatch_pending, send_batch
+from .models import Notification
+from .services import EmailService, FakeService, SMSService, WhatsAppService, send_notification
+from .tasks import REMINDER_MAX_ATTEMPTS, send_appointment_reminders, send_scheduled_notifications
+
+
+class RecordingService(FakeService):
+    """Fake provider that remembers which threads sent messages"""
+
+    def __init__(self):
+        super().__init__(latency=0.01)
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def _send(self, recipient):
+        with self.lock:
+            self.threads.add(threading.get_ident())
+        return super()._send(recipient)
+
+
+@override_settings(NOTIFICATION_PROVIDER='fake', NOTIFICATION_FAKE_LATENCY=0)
+class NotificationDispatchTestCase(TestCase):
+    """Batched dispatch of pending notifications"""
+
+    def setUp(self):
+        self.patient = create_patient()
+
+    def create_notifications(self, count, **kwargs):
+        defaults = {
+            'patient': self.patient,
+            'notification_type': 'general',
+            'method': 'sms',
+            'message': 'Hola',
+            'recipient_phone': self.patient.phone,
+            'scheduled_for': timezone.now() - timedelta(minutes=1),
+        }
+        defaults.update(kwargs)
+        return Notification.objects.bulk_create([Notification(**defaults) for _ in range(count)])
+
+    def test_dispatch_sends_every_pending_notification(self):
+        self.create_notifications(25)
+        self.create_notifications(2, recipient_phone=None)
+
+        summary = dispatch_pending(batch_size=10)
+
+        self.assertEqual(summary, {'total': 27, 'sent': 25, 'failed': 2})
+        self.assertEqual(Notification.objects.filter(status='sent', sent_at__isnull=False).count(), 25)
+        failed = Notification.objects.filter(status='failed')
+        self.assertEqual(failed.count(), 2)
+        self.assertEqual(failed.first().error_message, 'Recipient not provided')
+
+    def test_queries_grow_with_chunks_not_messages(self):
+        self.create_notifications(60)
+        with CaptureQueriesContext(connection) as queries:
+            dispatch_pending(batch_size=30)
+        self.assertLessEqual(len(queries), 15)
+
+    def test_scheduled_task_skips_future_notifications(self):
+        self.create_notifications(3)
+        self.create_notifications(2, scheduled_for=timezone.now() + timedelta(hours=1))
+
+        summary = send_scheduled_notifications()
+
+        self.assertEqual(summary['sent'], 3)
+        self.assertEqual(Notification.objects.filter(status='pending').count(), 2)
+
+    def test_batch_fans_out_over_threads_and_keeps_order(self):
+        notifications = self.create_notifications(16)
+        notifications[3].recipient_phone = None
+        service = RecordingService()
+
+        results = send_batch(notifications, services={'sms': service}, workers=4)
+
+        self.assertGreater(len(service.threads), 1)
+        self.assertEqual([r['success'] for r in results], [i != 3 for i in range(16)])
+        self.assertEqual(Notification.objects.get(pk=notifications[3].pk).status, 'failed')
+
+    def test_single_send_still_saves(self):
+        notification = self.create_notifications(1)[0]
+        result = send_notification(notification)
+
+        self.assertTrue(result['success'])
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertTrue(notification.response_data['sid'].startswith('fake-'))
+
+
+class ClientRegistryTestCase(TestCase):
+    """Shared provider clients"""
+
+    credentials = {
+        'SENDGRID_API_KEY': 'SG.test',
+        'TWILIO_ACCOUNT_SID': 'AC' + '0' * 32,
+        'TWILIO_AUTH_TOKEN': 'token',
+    }
+
+    def setUp(self):
+        self.registry = ClientRegistry()
+        registry.clear()
+        self.addCleanup(registry.clear)
+
+    def test_client_is_built_once_across_threads(self):
+        factory = mock.Mock(side_effect=lambda: object())
+        clients = []
+
+        def get():
+            clients.append(self.registry.get('provider', factory))
+
+        threads = [threading.Thread(target=get) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    @override_settings(NOTIFICATION_CLIENT_MAX_FAILURES=2)
+    def test_client_is_recycled_after_repeated_failures(self):
+        first = self.registry.get('provider', object)
+        self.registry.report_failure('provider')
+        self.registry.report_success('provider')
+        self.registry.report_failure('provider')
+        self.assertIs(self.registry.get('provider', object), first)
+
+        self.registry.report_failure('provider')
+        self.assertIsNot(self.registry.get('provider', object), first)
+
+    @override_settings(NOTIFICATION_CLIENT_MAX_AGE=60)
+    def test_old_clients_are_recycled(self):
+        first = self.registry.get('provider', object)
+        self.registry._entries['provider'].created_at -= 61
+        self.assertIsNot(self.registry.get('provider', object), first)
+
+    def test_forked_process_builds_its_own_clients(self):
+        first = self.registry.get('provider', object)
+        self.registry._pid = -1
+        self.assertIsNot(self.registry.get('provider', object), first)
+
+    def test_services_share_clients(self):
+        with mock.patch.dict(os.environ, self.credentials):
+            self.assertIs(SMSService().client, WhatsAppService().client)
+            self.assertIs(EmailService().client, EmailService().client)
+
+    @override_settings(NOTIFICATION_CLIENT_MAX_FAILURES=2)
+    def test_connection_errors_recycle_email_client(self):
+        with mock.patch.dict(os.environ, self.credentials):
+            service = EmailService()
+            client = service.client
+            with mock.patch.object(client.session, 'post', side_effect=requests.ConnectionError('reset')):
+                for _ in range(2):
+                    result = service.send_email('ana@example.com', 'Hola', 'Mensaje')
+            self.assertFalse(result['success'])
+            self.assertIsNot(service.client, client)
+
+
+@override_settings(NOTIFICATION_PROVIDER='fake', NOTIFICATION_FAKE_LATENCY=0)
+class AppointmentReminderTestCase(TestCase):
+    """Set-based, idempotent reminder generation"""
+
+    def setUp(self):
+        self.patient = create_patient()
+        self.tomorrow = timezone.now().date() + timedelta(days=1)
+
+    def test_reminders_are_sent_once(self):
+        seed_day(self.patient, self.tomorrow, 12, units=3)
+        Appointment.objects.filter(pk=Appointment.objects.first().pk).update(status='cancelled')
+
+        result = send_appointment_reminders()
+        self.assertEqual(result, {'created': 11, 'retried': 0, 'sent': 11, 'failed': 0, 'appointments_marked': 11})
+        self.assertEqual(Appointment.objects.filter(reminder_sent=True).count(), 11)
+
+        result = send_appointment_reminders()
+        self.assertEqual(result, {'created': 0, 'retried': 0, 'sent': 0, 'failed': 0, 'appointments_marked': 0})
+        self.assertEqual(Notification.objects.count(), 11)
+
+    def test_interrupted_run_is_completed(self):
+        seed_day(self.patient, self.tomorrow, 4, units=2)
+        appointment = Appointment.objects.first()
+        Notification.objects.create(
+            patient=self.patient,
+            appointment=appointment,
+            notification_type='appointment_reminder',
+            method='whatsapp',
+            message='Recordatorio',
+            recipient_phone=self.patient.phone,
+        )
+
+        result = send_appointment_reminders()
+
+        self.assertEqual(result['created'], 3)
+        self.assertEqual(result['sent'], 4)
+        self.assertEqual(Notification.objects.filter(appointment=appointment).count(), 1)
+
+    def run_later(self, minutes):
+        """Run the reminder task as if `minutes` had passed since the last failure"""
+        Notification.objects.filter(status='failed').update(
+            updated_at=timezone.now() - timedelta(minutes=minutes)
+        )
+        return send_appointment_reminders()
+
+    def test_failed_reminders_are_retried(self):
+        seed_day(self.patient, self.tomorrow, 2, units=1)
+        Patient.objects.filter(pk=self.patient.pk).update(phone='')
+
+        result = send_appointment_reminders()
+        self.assertEqual(result['failed'], 2)
+        self.assertEqual(result['appointments_marked'], 0)
+
+        Patient.objects.filter(pk=self.patient.pk).update(phone='+5215512345678')
+        result = self.run_later(minutes=31)
+        self.assertEqual(result['created'], 0)
+        self.assertEqual(result['retried'], 2)
+        self.assertEqual(result['appointments_marked'], 2)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_failing_reminder_keeps_one_row_with_backoff_and_a_cap(self):
+        seed_day(self.patient, self.tomorrow, 1, units=1)
+        Patient.objects.filter(pk=self.patient.pk).update(phone='')
+
+        send_appointment_reminders()
+        # Within the backoff nothing is sent again
+        self.assertEqual(send_appointment_reminders()['retried'], 0)
+        self.assertEqual(Notification.objects.get().attempts, 1)
+
+        self.assertEqual(self.run_later(minutes=31)['retried'], 1)
+        self.assertEqual(self.run_later(minutes=45)['retried'], 0)
+        self.assertEqual(self.run_later(minutes=95)['retried'], 1)
+        self.assertEqual(self.run_later(minutes=600)['retried'], 0)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(notification.attempts, REMINDER_MAX_ATTEMPTS)
+
+    def test_busy_day_runs_in_a_few_queries(self):
+        seed_day(self.patient, self.tomorrow, 2000, units=6)
+
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            result = send_appointment_reminders()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(result['appointments_marked'], 2000)
+        # Queries grow with dispatch chunks, not with appointments
+        self.assertLess(len(queries), 200)
+        self.assertLess(elapsed, 10)
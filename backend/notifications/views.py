@@ -3,6 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from _config.pagination import KeysetOrderingFilter, ListActionMixin
 from .models import Notification
 from .serializers import (
     NotificationSerializer,
@@ -12,12 +13,12 @@ from .serializers import (
 from .services import send_notification
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(ListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing notifications
     """
     queryset = Notification.objects.select_related('patient', 'appointment')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'notification_type', 'method', 'status', 'appointment']
     search_fields = ['patient__first_name', 'patient__last_name', 'message']
     ordering_fields = ['created_at', 'sent_at', 'scheduled_for']
@@ -109,15 +110,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def pending(self, request):
         """Get all pending notifications"""
         pending = self.queryset.filter(status='pending')
-        serializer = self.get_serializer(pending, many=True)
-        return Response(serializer.data)
+        return self.list_response(pending)
     
     @action(detail=False, methods=['get'])
     def failed(self, request):
         """Get all failed notifications"""
         failed = self.queryset.filter(status='failed')
-        serializer = self.get_serializer(failed, many=True)
-        return Response(serializer.data)
+        return self.list_response(failed)
     
     @action(detail=True, methods=['post'])
     def retry(self, request, pk=None):
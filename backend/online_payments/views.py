@@ -9,6 +9,7 @@ from django.http import HttpResponse
 import os
 import uuid
 
+from _config.pagination import KeysetOrderingFilter, ListActionMixin
 from .models import OnlinePayment, StripePayment
 from .serializers import (
     OnlinePaymentSerializer,
@@ -18,13 +19,13 @@ from .serializers import (
 )
 
 
-class OnlinePaymentViewSet(viewsets.ModelViewSet):
+class OnlinePaymentViewSet(ListActionMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing online payments
     """
     queryset = OnlinePayment.objects.select_related('patient', 'installment_payment')
     serializer_class = OnlinePaymentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'payment_method', 'status', 'installment_payment']
     search_fields = ['patient__first_name', 'patient__last_name', 'transaction_id']
     ordering_fields = ['payment_date', 'amount', 'created_at']
@@ -174,15 +175,13 @@ class OnlinePaymentViewSet(viewsets.ModelViewSet):
     def completed(self, request):
         """Get all completed payments"""
         completed = self.queryset.filter(status='completed')
-        serializer = self.get_serializer(completed, many=True)
-        return Response(serializer.data)
+        return self.list_response(completed)
     
     @action(detail=False, methods=['get'])
     def failed(self, request):
         """Get all failed payments"""
         failed = self.queryset.filter(status='failed')
-        serializer = self.get_serializer(failed, many=True)
-        return Response(serializer.data)
+        return self.list_response(failed)
 
 
 @csrf_exempt
@@ -0,0 +1,110 @@
+"""
+Management command to benchmark the patient search index.
+
+Seeds patients and their search entries inside a transaction that is always
+rolled back, then times typeahead queries (patients.search.search_patients)
+for name prefixes, accent-free names, phone fragments and misspellings.
+"""
+
+import random
+import statistics
+import time as timer
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from patients.models import Patient
+from patients.search import fuzzy_enabled, index_patients, search_patients
+
+
+FIRST_NAMES = ['José', 'María', 'Ana', 'Luis', 'Sofía', 'Jorge', 'Lucía', 'Andrés', 'Mónica', 'Raúl']
+LAST_NAMES = ['Núñez', 'García', 'Hernández', 'López', 'Martínez', 'Pérez', 'Gómez', 'Díaz', 'Ramírez', 'Ortiz']
+
+QUERIES = [
+    ('prefix', 'Ana Lop'),
+    ('accent-free', 'jose nunez'),
+    ('phone', '55 1234'),
+    ('patient number', 'PAT-BENCH-00042'),
+    ('misspelled', 'Hernandes'),
+]
+
+
+class _Rollback(Exception):
+    """Raised to discard the benchmark data"""
+
+
+def seed_patients(count, batch_size=2000):
+    """Bulk insert `count` patients with their search entries"""
+    rng = random.Random(count)
+    for start in range(0, count, batch_size):
+        patients = Patient.objects.bulk_create([
+            Patient(
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=f'{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+                gender='O',
+                date_of_birth=date(1990, 1, 1),
+                phone=f'+52155{rng.randrange(10 ** 8):08d}',
+                patient_number=f'PAT-BENCH-{i:05d}',
+            )
+            for i in range(start, min(start + batch_size, count))
+        ])
+        # bulk_create skips the signals, so the entries are indexed here
+        if patients[0].pk is None:
+            patients = Patient.objects.filter(
+                patient_number__in=[patient.patient_number for patient in patients]
+            )
+        index_patients(patients)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark typeahead patient search over a seeded patient table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--patients',
+            type=int,
+            default=100000,
+            help='Number of patients to seed',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Number of searches to time per query',
+        )
+
+    def handle(self, *args, **options):
+        count = options['patients']
+        repeat = options['repeat']
+        
+        if not fuzzy_enabled():
+            self.stdout.write(self.style.WARNING(
+                'Not on PostgreSQL: searches scan the table and misspellings do not match.'
+            ))
+        self.stdout.write(f'{"query":>16} {"results":>8} {"p50":>10} {"p95":>10}')
+        
+        try:
+            with transaction.atomic():
+                seed_patients(count)
+                for label, query in QUERIES:
+                    self._report(label, query, repeat)
+                raise _Rollback()
+        except _Rollback:
+            pass
+        
+        self.stdout.write(self.style.SUCCESS('Benchmark finished, seeded data rolled back.'))
+
+    def _report(self, label, query, repeat):
+        """Time one typeahead query"""
+        timings = []
+        for _ in range(repeat):
+            started = timer.perf_counter()
+            results = search_patients(query)
+            timings.append((timer.perf_counter() - started) * 1000)
+        
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{label:>16} {len(results):>8} {statistics.median(timings):>7.2f} ms {p95:>7.2f} ms'
+        )
@@ -0,0 +1,42 @@
+"""
+Management command to rebuild the patient search index.
+
+Re-folds the search entry of every patient in chunks, soft-deleted ones
+included so a restored patient is searchable right away. Needed once after
+the table is created and whenever the folding rules change.
+"""
+
+from django.core.management.base import BaseCommand
+
+from patients.models import Patient
+from patients.search import index_patients
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the accent-folded search entries of all patients'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of patients indexed per batch',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        patients = Patient.objects.all_with_deleted().order_by('pk').only(
+            'pk', 'first_name', 'last_name', 'email', 'patient_number', 'phone'
+        )
+        
+        indexed = 0
+        last_pk = 0
+        while True:
+            chunk = list(patients.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            index_patients(chunk)
+            indexed += len(chunk)
+            last_pk = chunk[-1].pk
+        
+        self.stdout.write(self.style.SUCCESS(f'{indexed} patients indexed.'))
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    pg_trgm must exist before the gin_trgm_ops indexes of the search tables
+    (patients.PatientSearchEntry, search.SearchDocument) are created; the
+    migrations generated for those models come after this one.
+    """
+
+    dependencies = [
+        ("patients", "0001_initial"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
 from django.core.validators import EmailValidator, RegexValidator
 from django.utils import timezone
+from sequences.models import last_number_value, next_number
 import uuid
 from datetime import datetime
 
@@ -160,22 +162,15 @@ class Patient(models.Model):
     
     def _generate_patient_number(self):
         """Generate unique patient number in format PAT-YYYYMMDD-XXXX"""
-        from django.utils import timezone
-        today = timezone.now()
-        date_str = today.strftime('%Y%m%d')
-        
-        # Get the count of patients created today
-        today_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_end = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-        
+        return next_number('PAT', seed=Patient._numbers_used_on)
+    
+    @staticmethod
+    def _numbers_used_on(period):
+        """Patient numbers already issued on a day before its counter existed"""
         # Use all_with_deleted to ensure we don't have duplicate numbers
-        count = Patient.objects.all_with_deleted().filter(
-            created_at__range=[today_start, today_end]
-        ).count()
-        
-        # Generate sequential number
-        sequence = str(count + 1).zfill(4)
-        return f"PAT-{date_str}-{sequence}"
+        return last_number_value(
+            Patient.objects.all_with_deleted(), 'patient_number', f"PAT-{period}-"
+        )
     
     def soft_delete(self):
         """Soft delete the patient"""
@@ -190,3 +185,37 @@ class Patient(models.Model):
         self.deleted_at = None
         self.is_active = True
         self.save()
+
+
+class PatientSearchEntry(models.Model):
+    """
+    Accent-folded search text of a patient (see patients.search)
+    Kept in sync by signals; rebuild with the rebuild_patient_search command
+    """
+    
+    patient = models.OneToOneField(
+        Patient,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+        verbose_name='Paciente'
+    )
+    name = models.CharField(max_length=210, verbose_name='Nombre Normalizado')
+    document = models.TextField(
+        verbose_name='Texto de Búsqueda',
+        help_text='Nombre, correo y número de paciente sin acentos, en minúsculas'
+    )
+    phone_digits = models.CharField(max_length=20, blank=True, verbose_name='Dígitos del Teléfono')
+    
+    class Meta:
+        verbose_name = 'Índice de Búsqueda de Paciente'
+        verbose_name_plural = 'Índice de Búsqueda de Pacientes'
+        indexes = [
+            models.Index(fields=['name']),
+            # Trigram indexes serve LIKE '%...%' and similarity lookups on PostgreSQL
+            GinIndex(fields=['document'], name='patient_search_document_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['phone_digits'], name='patient_search_phone_trgm', opclasses=['gin_trgm_ops']),
+        ]
+    
+    def __str__(self):
+        return self.name
@@ -0,0 +1,142 @@
+"""
+Patient search.
+
+Each patient has a PatientSearchEntry with its name, email and patient number
+folded to lowercase ASCII, plus the digits of its phone. Queries are folded
+the same way, so "Jose Nunez" finds "José Núñez" and "55 1234" finds
+"+52 55 1234 5678".
+
+On PostgreSQL the columns carry pg_trgm GIN indexes, which serve the
+substring lookups and add typo-tolerant matches ranked by trigram word
+similarity. Other databases (SQLite in local tests) get the same exact and
+prefix matching through plain scans, without the typo tolerance.
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework.filters import BaseFilterBackend
+
+from .models import PatientSearchEntry
+
+
+# Shortest digit run treated as a phone number fragment
+MIN_PHONE_DIGITS = 4
+
+NON_WORD = re.compile(r'[^a-z0-9@._-]+')
+
+
+def fold(text):
+    """Lowercase ASCII text without accents or punctuation between words"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(NON_WORD.sub(' ', text.lower()).split())
+
+
+def digits(text):
+    """Only the digits of a text"""
+    return ''.join(char for char in text or '' if char.isdigit())
+
+
+def entry_for(patient):
+    """Unsaved search entry of a patient"""
+    name = fold(f'{patient.first_name} {patient.last_name}')
+    document = ' '.join(part for part in [
+        name,
+        fold(patient.email),
+        fold(patient.patient_number),
+    ] if part)
+    return PatientSearchEntry(
+        patient_id=patient.pk,
+        name=name,
+        # Leading space so every word, including the first, follows a space
+        document=f' {document}',
+        phone_digits=digits(patient.phone),
+    )
+
+
+def index_patients(patients):
+    """Insert or update the search entries of the given patients"""
+    entries = [entry_for(patient) for patient in patients]
+    if entries:
+        PatientSearchEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['patient'],
+            update_fields=['name', 'document', 'phone_digits'],
+        )
+    return entries
+
+
+def fuzzy_enabled():
+    """Typo tolerance needs pg_trgm, only available on PostgreSQL"""
+    return connection.vendor == 'postgresql'
+
+
+def search_entries(query, queryset=None):
+    """
+    Search entries matching a query, best matches first.
+    Every word of the query must start a word of the patient (in any order);
+    on PostgreSQL close misspellings also match, ranked below exact ones.
+    """
+    text = fold(query)
+    words = text.split()
+    # Digits only count as a phone number when the query has no letters
+    phone = '' if any(char.isalpha() for char in text) else digits(query)
+    queryset = PatientSearchEntry.objects.all() if queryset is None else queryset
+    if not words:
+        return queryset.none()
+
+    word_match = Q(*[Q(document__contains=f' {word}') for word in words])
+    match = word_match
+    if len(phone) >= MIN_PHONE_DIGITS:
+        match |= Q(phone_digits__contains=phone)
+
+    rank = Case(
+        When(name__startswith=text, then=Value(3)),
+        When(word_match, then=Value(2)),
+        When(document__contains=text, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    ordering = ['-rank', 'name']
+
+    if fuzzy_enabled():
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        # %> uses the trigram index; pg_trgm.word_similarity_threshold sets the cutoff
+        match |= Q(document__trigram_word_similar=text)
+        queryset = queryset.annotate(similarity=TrigramWordSimilarity(text, 'document'))
+        ordering = ['-rank', '-similarity', 'name']
+
+    return queryset.filter(match).annotate(rank=rank).order_by(*ordering)
+
+
+def search_patients(query, limit=10):
+    """Typeahead rows for a query, in one query"""
+    entries = search_entries(
+        query,
+        PatientSearchEntry.objects.filter(patient__is_deleted=False)
+    )
+    return list(entries.values(
+        'patient_id',
+        'patient__first_name',
+        'patient__last_name',
+        'patient__patient_number',
+        'patient__phone',
+        'patient__email',
+        'rank',
+    )[:limit])
+
+
+class PatientSearchFilter(BaseFilterBackend):
+    """`?search=` for patient lists, served by the search index"""
+
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return queryset.filter(pk__in=search_entries(query).values('patient_id'))
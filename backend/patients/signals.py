@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from appointments.models import Appointment
+from treatments.models import Treatment
+from .models import Patient
+from .search import index_patients
+from .summary import invalidate_summaries
+
+
+def invalidate_patient_summary(sender, instance, raw=False, **kwargs):
+    """Drop the cached summary of the row's patient once the write commits"""
+    if raw:
+        return
+    patient_ids = [instance.pk if sender is Patient else instance.patient_id]
+    transaction.on_commit(lambda: invalidate_summaries(patient_ids))
+
+
+for model in [Patient, Treatment, Appointment]:
+    uid = f'patient_summary_{model._meta.label_lower}'
+    post_save.connect(invalidate_patient_summary, sender=model, dispatch_uid=f'{uid}_post_save')
+    post_delete.connect(invalidate_patient_summary, sender=model, dispatch_uid=f'{uid}_post_delete')
+
+
+def index_patient(sender, instance, raw=False, **kwargs):
+    """Keep the patient's search entry in step with its name and contacts"""
+    if raw:
+        return
+    index_patients([instance])
+
+
+post_save.connect(index_patient, sender=Patient, dispatch_uid='patient_search_post_save')
@@ -0,0 +1,96 @@
+"""
+Patient summary shown on every patient interaction.
+
+All counters come from one annotated query over the patient's treatments and
+appointments, joined with the stored balance. The result is cached per
+patient and day; signals drop the entry whenever a related row is written.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from appointments.models import Appointment
+
+
+CACHE_KEY = 'patients:summary:{}:{}'
+
+
+def cache_key(patient_id, today=None):
+    """Cache key of a patient's summary; upcoming counts depend on the day"""
+    today = today or timezone.localdate()
+    return CACHE_KEY.format(patient_id, today.isoformat())
+
+
+def invalidate_summaries(patient_ids):
+    """Drop the cached summaries of the given patients"""
+    keys = [cache_key(patient_id) for patient_id in set(patient_ids) if patient_id]
+    if keys:
+        cache.delete_many(keys)
+
+
+def with_summary(queryset, today=None):
+    """Annotate a patient queryset with every summary counter"""
+    today = today or timezone.localdate()
+    upcoming = Q(
+        appointments__date__gte=today,
+        appointments__status__in=Appointment.BLOCKING_STATUSES
+    )
+    next_appointment = Appointment.objects.blocking().filter(
+        patient=OuterRef('pk'),
+        date__gte=today
+    ).order_by('date', 'start_time')
+
+    return queryset.select_related('balance').annotate(
+        treatments_count=Count('treatments', distinct=True),
+        active_treatments=Count(
+            'treatments',
+            filter=Q(treatments__status='in_progress'),
+            distinct=True
+        ),
+        appointments_count=Count('appointments', distinct=True),
+        upcoming_appointments=Count('appointments', filter=upcoming, distinct=True),
+        last_visit_date=Max(
+            'appointments__date',
+            filter=Q(appointments__status='completed', appointments__date__lte=today)
+        ),
+        next_appointment_id=Subquery(next_appointment.values('pk')[:1]),
+        next_appointment_date=Subquery(next_appointment.values('date')[:1]),
+        next_appointment_time=Subquery(next_appointment.values('start_time')[:1]),
+    )
+
+
+def build_summary(patient):
+    """Summary dict of a patient annotated by with_summary"""
+    from finances.balances import get_balance
+
+    balance = get_balance(patient)
+    next_appointment = None
+    if patient.next_appointment_id:
+        next_appointment = {
+            'id': patient.next_appointment_id,
+            'date': patient.next_appointment_date,
+            'start_time': patient.next_appointment_time,
+        }
+
+    return {
+        'treatments_count': patient.treatments_count,
+        'active_treatments': patient.active_treatments,
+        'appointments_count': patient.appointments_count,
+        'upcoming_appointments': patient.upcoming_appointments,
+        'last_visit_date': patient.last_visit_date,
+        'next_appointment': next_appointment,
+        'total_debt': balance.treatment_debt,
+        'installment_debt': balance.installment_debt,
+        'last_payment_date': balance.last_payment_date,
+    }
+
+
+def get_cached_summary(patient_id):
+    """Cached summary payload of a patient, or None"""
+    return cache.get(cache_key(patient_id))
+
+
+def cache_summary(patient_id, payload):
+    """Store a summary payload until the end of its validity"""
+    cache.set(cache_key(patient_id), payload, timeout=settings.PATIENT_SUMMARY_CACHE_TIMEOUT)
@@ -1,3 +1,178 @@
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient
+from appointments.models import Appointment
+from finances.models import Payment
+from treatments.models import Treatment
+from .models import Patient
+from .views import PatientViewSet
+
+
+class PatientSummaryTestCase(TestCase):
+    """Single-query, cached patient summary"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.today = timezone.localdate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient = create_patient()
+            for status in ['in_progress', 'in_progress', 'completed']:
+                Treatment.objects.create(
+                    patient=self.patient,
+                    treatment_type='Limpieza',
+                    dentist_responsible='Dra. Pérez',
+                    start_date=self.today,
+                    total_price=Decimal('1000.00'),
+                    amount_paid=Decimal('400.00'),
+                    status=status,
+                )
+            self.create_appointment(self.today - timedelta(days=30), status='completed')
+            self.create_appointment(self.today - timedelta(days=7), status='completed')
+            self.create_appointment(self.today + timedelta(days=3), status='cancelled')
+            self.next = self.create_appointment(self.today + timedelta(days=5))
+            self.create_appointment(self.today + timedelta(days=20))
+        self.url = f'/api/patients/{self.patient.pk}/summary/'
+
+    def create_appointment(self, day, status='confirmed', start=time(9, 0)):
+        return Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=day,
+            start_time=start,
+            end_time=time(start.hour + 1, 0),
+            status=status,
+        )
+
+    def test_summary_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        summary = response.data['summary']
+        self.assertEqual(summary['treatments_count'], 3)
+        self.assertEqual(summary['active_treatments'], 2)
+        self.assertEqual(summary['appointments_count'], 5)
+        self.assertEqual(summary['upcoming_appointments'], 2)
+        self.assertEqual(summary['last_visit_date'], self.today - timedelta(days=7))
+        self.assertEqual(summary['next_appointment']['id'], self.next.pk)
+        self.assertEqual(summary['total_debt'], Decimal('1200.00'))
+        self.assertEqual(response.data['patient']['id'], self.patient.pk)
+
+    def test_summary_is_cached(self):
+        self.client.get(self.url)
+        # Only the plain patient row, for the access check
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['summary']['appointments_count'], 5)
+
+    def test_cached_summary_still_checks_access(self):
+        self.client.get(self.url)
+        # Hidden without the signals that would drop the cached summary
+        Patient.objects.filter(pk=self.patient.pk).update(is_deleted=True)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        with mock.patch.object(PatientViewSet, 'check_object_permissions', side_effect=PermissionDenied):
+            Patient.objects.all_with_deleted().filter(pk=self.patient.pk).update(is_deleted=False)
+            self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_related_writes_invalidate_cache(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_appointment(self.today + timedelta(days=1))
+        summary = self.client.get(self.url).data['summary']
+        self.assertEqual(summary['upcoming_appointments'], 3)
+        self.assertEqual(summary['next_appointment']['date'], self.today + timedelta(days=1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(
+                patient=self.patient,
+                amount=Decimal('100.00'),
+                payment_method='cash',
+                payment_date=self.today,
+            )
+        self.assertEqual(self.client.get(self.url).data['summary']['last_payment_date'], self.today)
+
+    def test_soft_deleted_patient_is_not_served_from_cache(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.soft_delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(f'{self.url}?include_deleted=true').status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class PatientSearchTestCase(TestCase):
+    """Accent-folded typeahead search"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.jose = create_patient(
+            first_name='José', last_name='Núñez', phone='+52 55 1234 5678', email='jose@example.com'
+        )
+        self.josefina = create_patient(first_name='Josefina', last_name='Ortiz', phone='+52 33 9876 0000')
+        self.maria = create_patient(first_name='María José', last_name='García', phone='+52 81 5555 1111')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/patients/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_entry_is_folded_on_save(self):
+        entry = self.jose.search_entry
+        self.assertEqual(entry.name, 'jose nunez')
+        self.assertIn(' jose@example.com', entry.document)
+        self.assertEqual(entry.phone_digits, '525512345678')
+
+        self.jose.last_name = 'Muñoz'
+        self.jose.save()
+        self.jose.search_entry.refresh_from_db()
+        self.assertEqual(self.jose.search_entry.name, 'jose munoz')
+
+    def test_accents_and_case_are_ignored(self):
+        self.assertEqual(self.search('JOSE NUNEZ'), [self.jose.pk])
+        self.assertEqual(self.search('núñez'), [self.jose.pk])
+
+    def test_words_match_prefixes_in_any_order(self):
+        self.assertEqual(self.search('nun jos'), [self.jose.pk])
+        # "josefina" starts with "jos" but "ortiz" is not a word of the others
+        self.assertEqual(self.search('jos ort'), [self.josefina.pk])
+
+    def test_name_prefix_ranks_first(self):
+        results = self.search('jose')
+        self.assertEqual(results[:2], [self.jose.pk, self.josefina.pk])
+        self.assertEqual(set(results), {self.jose.pk, self.josefina.pk, self.maria.pk})
+
+    def test_phone_fragments_match_digits(self):
+        self.assertEqual(self.search('55 1234'), [self.jose.pk])
+        self.assertEqual(self.search('(33) 9876'), [self.josefina.pk])
+
+    def test_patient_number(self):
+        self.assertEqual(self.search(self.maria.patient_number.lower()), [self.maria.pk])
+
+    def test_soft_deleted_patients_are_excluded(self):
+        self.jose.soft_delete()
+        self.assertEqual(self.search('nunez'), [])
+
+    def test_limit(self):
+        self.assertEqual(len(self.search('jose', limit=1)), 1)
+        response = self.client.get('/api/patients/search/', {'q': 'jose', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_search_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.search('jose')
 
-# Create your tests here.
+    def test_list_search_uses_the_index(self):
+        response = self.client.get('/api/patients/', {'search': 'nunez'})
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([row['id'] for row in results], [self.jose.pk])
@@ -1,9 +1,12 @@
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from _config.pagination import KeysetOrderingFilter
 from .models import Patient
+from .search import PatientSearchFilter, search_patients
 from .serializers import PatientSerializer, PatientListSerializer
+from .summary import build_summary, cache_summary, get_cached_summary, with_summary
 
 
 class PatientViewSet(viewsets.ModelViewSet):
@@ -12,9 +15,8 @@ class PatientViewSet(viewsets.ModelViewSet):
     """
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, PatientSearchFilter, KeysetOrderingFilter]
     filterset_fields = ['gender', 'is_active', 'preferred_contact_method', 'is_deleted']
-    search_fields = ['first_name', 'last_name', 'phone', 'email', 'patient_number']
     ordering_fields = ['last_name', 'first_name', 'created_at', 'date_of_birth']
     ordering = ['-created_at']
     
@@ -26,6 +28,10 @@ class PatientViewSet(viewsets.ModelViewSet):
         if include_deleted:
             queryset = Patient.objects.all_with_deleted()
         
+        # A cached summary only needs the access check, not the annotations
+        if self.action == 'summary' and not getattr(self, 'summary_cached', False):
+            queryset = with_summary(queryset)
+        
         return queryset
     
     def get_serializer_class(self):
@@ -57,31 +63,46 @@ class PatientViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
         """Get patient summary with related data"""
-        patient = self.get_object()
+        patient_id = int(pk) if str(pk).isdigit() else None
+        cached = get_cached_summary(patient_id) if patient_id else None
+        self.summary_cached = cached is not None
         
-        # Get related data counts
-        treatments_count = patient.treatments.count()
-        active_treatments = patient.treatments.filter(status='in_progress').count()
-        appointments_count = patient.appointments.count()
-        upcoming_appointments = patient.appointments.filter(
-            date__gte=timezone.now().date(),
-            status__in=['pending', 'confirmed']
-        ).count()
-        total_debt = sum(
-            treatment.pending_balance 
-            for treatment in patient.treatments.filter(status__in=['in_progress', 'with_debt'])
-        )
+        # Cached or not, the patient goes through get_object() so queryset
+        # filtering and object permissions apply to every request
+        patient = self.get_object()
+        if cached is not None:
+            return Response(cached)
         
-        return Response({
+        payload = {
             'patient': PatientSerializer(patient).data,
-            'summary': {
-                'treatments_count': treatments_count,
-                'active_treatments': active_treatments,
-                'appointments_count': appointments_count,
-                'upcoming_appointments': upcoming_appointments,
-                'total_debt': total_debt,
+            'summary': build_summary(patient),
+        }
+        # Soft-deleted patients are only visible with include_deleted
+        if not patient.is_deleted:
+            cache_summary(patient.pk, payload)
+        return Response(payload)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Typeahead search by name, phone, email or patient number"""
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response(
+                {'error': 'El parámetro limit debe ser un número'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = [
+            {
+                'id': row['patient_id'],
+                'patient_number': row['patient__patient_number'],
+                'full_name': f"{row['patient__first_name']} {row['patient__last_name']}",
+                'phone': row['patient__phone'],
+                'email': row['patient__email'],
+                'rank': row['rank'],
             }
-        })
-
-
-from django.utils import timezone
+            for row in search_patients(query, limit)
+        ]
+        return Response({'query': query, 'results': results})
@@ -0,0 +1,13 @@
+from rest_framework import serializers
+from .models import Report
+
+
+class ReportSerializer(serializers.ModelSerializer):
+    """Serializer for Report model"""
+    
+    report_type_display = serializers.CharField(source='get_report_type_display', read_only=True)
+    
+    class Meta:
+        model = Report
+        fields = '__all__'
+        read_only_fields = ['id', 'file', 'data', 'generated_at']
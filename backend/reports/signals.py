@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from appointments.models import Appointment
+from finances.models import Payment, Expense
+from patients.models import Patient
+from treatments.models import Treatment
+from .snapshots import (
+    DashboardSnapshot,
+    appointment_contribution,
+    contribution_delta,
+    expense_contribution,
+    patient_contribution,
+    payment_contribution,
+    treatment_contribution,
+)
+
+
+# Model -> function returning the counters one row contributes to
+CONTRIBUTIONS = {
+    Appointment: appointment_contribution,
+    Payment: payment_contribution,
+    Expense: expense_contribution,
+    Treatment: treatment_contribution,
+    Patient: patient_contribution,
+}
+
+
+def _apply_on_commit(delta):
+    if delta:
+        transaction.on_commit(lambda: DashboardSnapshot.apply(delta))
+
+
+def remember_contribution(sender, instance, raw=False, **kwargs):
+    """Store what the stored row contributed before it is overwritten"""
+    instance._dashboard_before = {}
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = sender._base_manager.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._dashboard_before = CONTRIBUTIONS[sender](previous)
+
+
+def update_counters_on_save(sender, instance, raw=False, **kwargs):
+    """Apply the change in contribution of a saved row to the counters"""
+    if raw:
+        return
+    before = getattr(instance, '_dashboard_before', {})
+    _apply_on_commit(contribution_delta(before, CONTRIBUTIONS[sender](instance)))
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    """Remove the contribution of a deleted row from the counters"""
+    _apply_on_commit(contribution_delta(CONTRIBUTIONS[sender](instance), {}))
+
+
+for model in CONTRIBUTIONS:
+    uid = f'dashboard_{model._meta.label_lower}'
+    pre_save.connect(remember_contribution, sender=model, dispatch_uid=f'{uid}_pre_save')
+    post_save.connect(update_counters_on_save, sender=model, dispatch_uid=f'{uid}_post_save')
+    post_delete.connect(update_counters_on_delete, sender=model, dispatch_uid=f'{uid}_post_delete')
@@ -0,0 +1,265 @@
+"""
+Materialized dashboard counters.
+
+Every dashboard metric is kept as an integer counter in the cache (money is
+stored in cents). Model signals apply deltas to the counters when a row is
+created, changed or deleted, and a periodic Celery task rebuilds them from
+the database to correct any drift (e.g. from bulk updates that skip signals).
+Missing counters are rebuilt from the database on first read.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+CACHE_PREFIX = 'dashboard'
+
+# Counters scoped to a day or month expire on their own, global ones are
+# kept until the next reconciliation overwrites them
+DAY_TIMEOUT = 60 * 60 * 48
+MONTH_TIMEOUT = 60 * 60 * 24 * 40
+GLOBAL_TIMEOUT = None
+
+ACTIVE_DEBT_STATUSES = ['in_progress', 'with_debt']
+
+
+def to_cents(amount):
+    """Convert a money amount to integer cents"""
+    return int((Decimal(amount or 0) * 100).quantize(Decimal('1')))
+
+
+def from_cents(cents):
+    """Convert integer cents back to a float amount for the API"""
+    return float(Decimal(cents) / 100)
+
+
+def day_key(name, day):
+    return f'{CACHE_PREFIX}:{name}:{day.isoformat()}'
+
+
+def month_key(name, day):
+    return f'{CACHE_PREFIX}:{name}:{day.strftime("%Y-%m")}'
+
+
+def global_key(name):
+    return f'{CACHE_PREFIX}:{name}'
+
+
+# ----------------------------------------
+# Per-row contributions to the counters
+# ----------------------------------------
+
+def appointment_contribution(appointment, today=None):
+    """Counters an appointment adds to"""
+    from appointments.models import Appointment
+
+    today = today or timezone.now().date()
+    contribution = {day_key('appointments', appointment.date): 1}
+    if appointment.status == 'completed':
+        contribution[day_key('completed', appointment.date)] = 1
+    if appointment.status in Appointment.BLOCKING_STATUSES and appointment.date >= today:
+        contribution[day_key('upcoming', today)] = 1
+    return contribution
+
+
+def payment_contribution(payment, today=None):
+    cents = to_cents(payment.amount)
+    return {
+        day_key('income', payment.payment_date): cents,
+        month_key('income', payment.payment_date): cents,
+    }
+
+
+def expense_contribution(expense, today=None):
+    return {month_key('expenses', expense.expense_date): to_cents(expense.amount)}
+
+
+def treatment_contribution(treatment, today=None):
+    contribution = {}
+    if treatment.status in ACTIVE_DEBT_STATUSES:
+        contribution[global_key('pending_debts')] = to_cents(treatment.total_price - treatment.amount_paid)
+    if treatment.status == 'in_progress':
+        contribution[global_key('active_treatments')] = 1
+    return contribution
+
+
+def patient_contribution(patient, today=None):
+    if patient.is_active and not patient.is_deleted:
+        return {global_key('total_patients'): 1}
+    return {}
+
+
+def contribution_delta(before, after):
+    """Difference between two contributions, without zero entries"""
+    delta = {}
+    for key in set(before) | set(after):
+        value = after.get(key, 0) - before.get(key, 0)
+        if value:
+            delta[key] = value
+    return delta
+
+
+class DashboardSnapshot:
+    """Read, update and rebuild the dashboard counters for one day"""
+
+    TIMEOUTS = {
+        'appointments': DAY_TIMEOUT,
+        'patients_attended': DAY_TIMEOUT,
+        'income': DAY_TIMEOUT,
+        'upcoming_appointments': DAY_TIMEOUT,
+        'monthly_income': MONTH_TIMEOUT,
+        'monthly_expenses': MONTH_TIMEOUT,
+        'pending_debts': GLOBAL_TIMEOUT,
+        'active_treatments': GLOBAL_TIMEOUT,
+        'total_patients': GLOBAL_TIMEOUT,
+    }
+
+    def __init__(self, day=None):
+        self.day = day or timezone.now().date()
+
+    @property
+    def keys(self):
+        """Map metric name to its cache key"""
+        return {
+            'appointments': day_key('appointments', self.day),
+            'patients_attended': day_key('completed', self.day),
+            'income': day_key('income', self.day),
+            'upcoming_appointments': day_key('upcoming', self.day),
+            'monthly_income': month_key('income', self.day),
+            'monthly_expenses': month_key('expenses', self.day),
+            'pending_debts': global_key('pending_debts'),
+            'active_treatments': global_key('active_treatments'),
+            'total_patients': global_key('total_patients'),
+        }
+
+    def read(self):
+        """Return all counters, rebuilding only the ones missing from the cache"""
+        keys = self.keys
+        cached = cache.get_many(keys.values())
+        values = {name: cached[key] for name, key in keys.items() if key in cached}
+
+        missing = [name for name in keys if name not in values]
+        if missing:
+            values.update(self.rebuild(missing))
+        return values
+
+    def rebuild(self, names=None):
+        """Recompute counters from the database and store them"""
+        names = set(names or self.keys)
+        values = {}
+
+        if names & {'appointments', 'patients_attended', 'upcoming_appointments'}:
+            values.update(self._appointment_counters())
+        if names & {'income', 'monthly_income'}:
+            values.update(self._payment_counters())
+        if 'monthly_expenses' in names:
+            values.update(self._expense_counters())
+        if names & {'pending_debts', 'active_treatments'}:
+            values.update(self._treatment_counters())
+        if 'total_patients' in names:
+            values.update(self._patient_counters())
+
+        keys = self.keys
+        for name, value in values.items():
+            cache.set(keys[name], value, timeout=self.TIMEOUTS[name])
+        return values
+
+    def reconcile(self):
+        """Rebuild every counter and report the ones that had drifted"""
+        keys = self.keys
+        cached = cache.get_many(keys.values())
+        values = self.rebuild()
+        return {
+            name: {'cached': cached[keys[name]], 'actual': value}
+            for name, value in values.items()
+            if keys[name] in cached and cached[keys[name]] != value
+        }
+
+    def as_dict(self):
+        """Dashboard payload built from the counters"""
+        values = self.read()
+        monthly_income = values['monthly_income']
+        monthly_expenses = values['monthly_expenses']
+        return {
+            'today': {
+                'appointments': values['appointments'],
+                'patients_attended': values['patients_attended'],
+                'income': from_cents(values['income']),
+            },
+            'pending_debts': from_cents(values['pending_debts']),
+            'active_treatments': values['active_treatments'],
+            'total_patients': values['total_patients'],
+            'upcoming_appointments': values['upcoming_appointments'],
+            'monthly': {
+                'income': from_cents(monthly_income),
+                'expenses': from_cents(monthly_expenses),
+                'net': from_cents(monthly_income - monthly_expenses),
+            }
+        }
+
+    @staticmethod
+    def apply(delta):
+        """Add a delta to the cached counters; absent counters are left to rebuild"""
+        for key, value in delta.items():
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                pass
+
+    # ----------------------------------------
+    # Database queries used when rebuilding
+    # ----------------------------------------
+
+    def _appointment_counters(self):
+        from appointments.models import Appointment
+
+        counts = Appointment.objects.aggregate(
+            appointments=Count('id', filter=Q(date=self.day)),
+            patients_attended=Count('id', filter=Q(date=self.day, status='completed')),
+            upcoming_appointments=Count('id', filter=Q(
+                date__gte=self.day,
+                status__in=Appointment.BLOCKING_STATUSES
+            )),
+        )
+        return counts
+
+    def _payment_counters(self):
+        from finances.models import Payment
+
+        totals = Payment.objects.filter(
+            payment_date__year=self.day.year,
+            payment_date__month=self.day.month
+        ).aggregate(
+            income=Sum('amount', filter=Q(payment_date=self.day)),
+            monthly_income=Sum('amount'),
+        )
+        return {name: to_cents(total) for name, total in totals.items()}
+
+    def _expense_counters(self):
+        from finances.models import Expense
+
+        total = Expense.objects.filter(
+            expense_date__year=self.day.year,
+            expense_date__month=self.day.month
+        ).aggregate(total=Sum('amount'))['total']
+        return {'monthly_expenses': to_cents(total)}
+
+    def _treatment_counters(self):
+        from treatments.models import Treatment
+
+        totals = Treatment.objects.aggregate(
+            total_price=Sum('total_price', filter=Q(status__in=ACTIVE_DEBT_STATUSES)),
+            amount_paid=Sum('amount_paid', filter=Q(status__in=ACTIVE_DEBT_STATUSES)),
+            active_treatments=Count('id', filter=Q(status='in_progress')),
+        )
+        return {
+            'pending_debts': to_cents(totals['total_price']) - to_cents(totals['amount_paid']),
+            'active_treatments': totals['active_treatments'],
+        }
+
+    def _patient_counters(self):
+        from patients.models import Patient
+
+        return {'total_patients': Patient.objects.filter(is_active=True).count()}
@@ -0,0 +1,26 @@
+"""
+Celery tasks for the reports app
+"""
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Create a dummy decorator if Celery is not available
+    def shared_task(func):
+        return func
+
+
+@shared_task
+def reconcile_dashboard_snapshot():
+    """
+    Celery task to rebuild the dashboard counters from the database
+    This should be run periodically (e.g., every 15 minutes)
+    """
+    from .snapshots import DashboardSnapshot
+
+    drift = DashboardSnapshot().reconcile()
+    return {
+        'success': True,
+        'drifted': len(drift),
+        'drift': drift,
+    }
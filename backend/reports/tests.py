@@ -1,3 +1,134 @@
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient
+from appointments.models import Appointment
+from finances.models import Payment, Expense
+from treatments.models import Treatment
+from .snapshots import DashboardSnapshot, day_key, global_key
+from .tasks import reconcile_dashboard_snapshot
+
+
+class DashboardSnapshotTestCase(TestCase):
+    """Materialized dashboard counters"""
+
+    url = '/api/dashboard/'
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.patient = create_patient()
+        self.treatment = Treatment.objects.create(
+            patient=self.patient,
+            treatment_type='Ortodoncia',
+            dentist_responsible='Dra. Pérez',
+            start_date=self.today,
+            total_price=Decimal('1500.00'),
+            amount_paid=Decimal('500.00'),
+        )
+        Payment.objects.create(
+            patient=self.patient,
+            amount=Decimal('250.50'),
+            payment_method='cash',
+            payment_date=self.today,
+        )
+        Expense.objects.create(
+            category='materials',
+            description='Resinas',
+            amount=Decimal('100.25'),
+            expense_date=self.today,
+            payment_method='card',
+        )
+        self.appointment = Appointment.objects.create(
+            patient=self.patient,
+            consultation_type='cleaning',
+            date=self.today,
+            start_time=time(10, 0),
+            end_time=time(11, 0),
+            dental_unit='Sillón 1',
+        )
+        cache.clear()
+
+    def test_cold_read_matches_database(self):
+        response = APIClient().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'today': {'appointments': 1, 'patients_attended': 0, 'income': 250.5},
+            'pending_debts': 1000.0,
+            'active_treatments': 1,
+            'total_patients': 1,
+            'upcoming_appointments': 1,
+            'monthly': {'income': 250.5, 'expenses': 100.25, 'net': 150.25},
+        })
+
+    def test_warm_read_does_not_query(self):
+        DashboardSnapshot(self.today).as_dict()
+        with self.assertNumQueries(0):
+            DashboardSnapshot(self.today).as_dict()
+
+    def test_only_missing_counters_are_rebuilt(self):
+        DashboardSnapshot(self.today).as_dict()
+        cache.delete(global_key('total_patients'))
+        with self.assertNumQueries(1):
+            values = DashboardSnapshot(self.today).read()
+        self.assertEqual(values['total_patients'], 1)
+
+    def test_counters_follow_saves_and_deletes(self):
+        snapshot = DashboardSnapshot(self.today)
+        snapshot.as_dict()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(
+                patient=self.patient,
+                amount=Decimal('100.00'),
+                payment_method='card',
+                payment_date=self.today,
+            )
+            self.treatment.amount_paid += Decimal('100.00')
+            self.treatment.save()
+            self.appointment.status = 'completed'
+            self.appointment.save()
+
+        data = snapshot.as_dict()
+        self.assertEqual(data['today']['income'], 350.5)
+        self.assertEqual(data['monthly']['net'], 250.25)
+        self.assertEqual(data['pending_debts'], 900.0)
+        self.assertEqual(data['today']['patients_attended'], 1)
+        self.assertEqual(data['upcoming_appointments'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+            self.patient.soft_delete()
+
+        data = snapshot.as_dict()
+        self.assertEqual(data['today']['income'], 250.5)
+        self.assertEqual(data['total_patients'], 0)
+        self.assertEqual(snapshot.reconcile(), {})
+
+    def test_payment_moved_to_another_day(self):
+        snapshot = DashboardSnapshot(self.today)
+        snapshot.as_dict()
+        payment = Payment.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.payment_date = self.today - timedelta(days=400)
+            payment.save()
+
+        data = snapshot.as_dict()
+        self.assertEqual(data['today']['income'], 0.0)
+        self.assertEqual(data['monthly']['income'], 0.0)
+
+    def test_reconcile_corrects_drift(self):
+        DashboardSnapshot(self.today).as_dict()
+        # Queryset updates skip signals and leave the counters stale
+        Appointment.objects.filter(pk=self.appointment.pk).update(status='completed')
+        self.assertEqual(cache.get(day_key('completed', self.today)), 0)
 
-# Create your tests here.
+        result = reconcile_dashboard_snapshot()
+        self.assertEqual(result['drift']['patients_attended'], {'cached': 0, 'actual': 1})
+        self.assertEqual(DashboardSnapshot(self.today).as_dict()['today']['patients_attended'], 1)
@@ -1,3 +1,31 @@
-from django.shortcuts import render
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from django_filters.rest_framework import DjangoFilterBackend
+from _config.downloads import serve_file
+from _config.pagination import KeysetOrderingFilter
+from .models import Report
+from .serializers import ReportSerializer
 
-# Create your views here.
+
+class ReportViewSet(viewsets.ReadOnlyModelViewSet):
+    """ViewSet for listing generated reports and downloading their files"""
+    queryset = Report.objects.all()
+    serializer_class = ReportSerializer
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
+    filterset_fields = ['report_type', 'export_format']
+    ordering_fields = ['generated_at', 'start_date']
+    ordering = ['-generated_at']
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the generated report file"""
+        report = self.get_object()
+        
+        if not report.file:
+            return Response(
+                {'error': 'El reporte no tiene un archivo generado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return serve_file(request, report.file)
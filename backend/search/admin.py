@@ -0,0 +1,12 @@
+from django.contrib import admin
+from .models import SearchDocument
+
+
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'title', 'subtitle', 'code', 'date', 'updated_at']
+    list_filter = ['kind']
+    search_fields = ['title', 'code']
+    ordering = ['-updated_at']
+    raw_id_fields = ['patient']
+    readonly_fields = ['updated_at']
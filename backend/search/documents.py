@@ -0,0 +1,188 @@
+"""
+Global search over patients, budgets, treatments, clinical notes and online
+payments.
+
+Every searchable row has a SearchDocument with what the result list shows
+(title, subtitle, date) and its text folded like the patient typeahead
+(patients.search.fold). Signals keep the documents in step with their rows,
+so each keystroke is a single query over one table instead of an icontains
+scan per viewset.
+
+Results are ranked, best first, by: exact code (patient number, budget
+number, transaction ID), code prefix, title prefix or patient name, every
+query word starting a word of the document and, on PostgreSQL, trigram word similarity for
+misspellings. Ties go to the most recent rows.
+"""
+from datetime import datetime
+
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from budgets.models import Budget
+from clinical.models import ClinicalNote
+from online_payments.models import OnlinePayment
+from patients.models import Patient
+from patients.search import MIN_PHONE_DIGITS, digits, fold, fuzzy_enabled
+from treatments.models import Treatment
+from .models import SearchDocument
+
+
+# Longest folded text stored per row; long clinical notes are cut
+MAX_DOCUMENT_LENGTH = 2000
+
+UPDATE_FIELDS = ['patient', 'title', 'subtitle', 'date', 'code', 'document', 'updated_at']
+
+
+def patient_document(patient):
+    """Displayed and searchable fields of a patient"""
+    phone = digits(patient.phone)
+    return {
+        'title': patient.full_name,
+        'subtitle': patient.patient_number or '',
+        'code': patient.patient_number,
+        # Full number and national number, so both can be typed
+        'text': [patient.email, phone, phone[-10:]],
+    }
+
+
+def budget_document(budget):
+    """Displayed and searchable fields of a budget"""
+    return {
+        'title': budget.title or budget.budget_number,
+        'subtitle': f'{budget.budget_number} · {budget.patient.full_name}',
+        'code': budget.budget_number,
+        'date': budget.created_date,
+        'text': [budget.budget_number, budget.patient.full_name],
+    }
+
+
+def treatment_document(treatment):
+    """Displayed and searchable fields of a treatment"""
+    return {
+        'title': treatment.treatment_type,
+        'subtitle': f'{treatment.patient.full_name} · {treatment.dentist_responsible}',
+        'date': treatment.start_date,
+        'text': [treatment.patient.full_name, treatment.dentist_responsible],
+    }
+
+
+def note_document(note):
+    """Displayed and searchable fields of a clinical note"""
+    return {
+        'title': note.title,
+        'subtitle': note.patient.full_name,
+        'date': note.date,
+        'text': [note.patient.full_name, note.description, note.observations],
+    }
+
+
+def online_payment_document(payment):
+    """Displayed and searchable fields of an online payment"""
+    return {
+        'title': payment.transaction_id,
+        'subtitle': f'{payment.patient.full_name} · ${payment.amount:,.2f} {payment.currency}',
+        'code': payment.transaction_id,
+        'date': payment.payment_date,
+        'text': [payment.patient.full_name, payment.customer_name, payment.customer_email],
+    }
+
+
+# Kind -> (model, related rows its document reads, document builder)
+SOURCES = {
+    'patient': (Patient, [], patient_document),
+    'budget': (Budget, ['patient'], budget_document),
+    'treatment': (Treatment, ['patient'], treatment_document),
+    'note': (ClinicalNote, ['patient'], note_document),
+    'online_payment': (OnlinePayment, ['patient'], online_payment_document),
+}
+
+KINDS = {model: kind for kind, (model, _, _) in SOURCES.items()}
+
+
+def document_for(instance):
+    """Unsaved search document of a row"""
+    kind = KINDS[type(instance)]
+    fields = SOURCES[kind][2](instance)
+    date = fields.get('date')
+    text = ' '.join(fold(part) for part in [fields['title'], *fields['text']] if part)
+    return SearchDocument(
+        kind=kind,
+        object_id=instance.pk,
+        patient_id=instance.pk if kind == 'patient' else instance.patient_id,
+        title=(fields['title'] or '')[:255],
+        subtitle=fields['subtitle'][:255],
+        date=date.date() if isinstance(date, datetime) else date,
+        code=fold(fields.get('code'))[:200],
+        # Leading space so every word, including the first, follows a space
+        document=f' {text}'[:MAX_DOCUMENT_LENGTH],
+    )
+
+
+def index_objects(instances):
+    """Insert or update the search documents of the given rows"""
+    documents = [document_for(instance) for instance in instances]
+    if documents:
+        SearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['kind', 'object_id'],
+            update_fields=UPDATE_FIELDS,
+        )
+    return documents
+
+
+def remove_object(instance):
+    """Drop the search document of a deleted row"""
+    SearchDocument.objects.filter(kind=KINDS[type(instance)], object_id=instance.pk).delete()
+
+
+def index_patient(patient):
+    """Index a patient, and its rows too when the name they show changed"""
+    previous = SearchDocument.objects.filter(
+        kind='patient', object_id=patient.pk
+    ).values_list('title', flat=True).first()
+    index_objects([patient])
+    if previous is not None and previous != patient.full_name:
+        for model, related, _ in SOURCES.values():
+            if model is not Patient:
+                index_objects(model._base_manager.filter(patient=patient).select_related(*related))
+
+
+def search(query, kinds=None, limit=20):
+    """One ranked, typed list of the documents matching a query"""
+    text = fold(query)
+    words = text.split()
+    if not words:
+        return []
+
+    documents = SearchDocument.objects.filter(patient__is_deleted=False)
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+
+    word_match = Q(*[Q(document__contains=f' {word}') for word in words])
+    match = word_match | Q(code__startswith=text)
+    # Digits only count as a phone number when the query has no letters
+    phone = '' if any(char.isalpha() for char in text) else digits(query)
+    if len(phone) >= MIN_PHONE_DIGITS:
+        match |= Q(document__contains=f' {phone}')
+
+    rank = Case(
+        When(code=text, then=Value(4)),
+        When(code__startswith=text, then=Value(3)),
+        # A patient matching the name comes before the rows that mention it
+        When(Q(document__startswith=f' {text}') | (word_match & Q(kind='patient')), then=Value(2)),
+        When(word_match, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    ordering = [F('rank').desc()]
+
+    if fuzzy_enabled():
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        match |= Q(document__trigram_word_similar=text)
+        documents = documents.annotate(similarity=TrigramWordSimilarity(text, 'document'))
+        ordering.append(F('similarity').desc())
+
+    ordering += [F('date').desc(nulls_last=True), 'title']
+    return list(documents.filter(match).annotate(rank=rank).order_by(*ordering).values(
+        'kind', 'object_id', 'patient_id', 'title', 'subtitle', 'date', 'rank'
+    )[:limit])
@@ -0,0 +1,50 @@
+"""
+Management command to rebuild the global search index.
+
+Re-builds the search document of every patient, budget, treatment, clinical
+note and online payment in chunks. Needed once after the table is created,
+after bulk imports that skip signals and whenever the folding rules change.
+"""
+
+from django.core.management.base import BaseCommand
+
+from search.documents import SOURCES, index_objects
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the global search documents of all searchable rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of rows indexed per batch',
+        )
+        parser.add_argument(
+            '--types',
+            default=','.join(SOURCES),
+            help='Comma separated kinds of rows to index',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        kinds = [kind for kind in options['types'].split(',') if kind.strip()]
+        
+        for kind in kinds:
+            model, related, _ = SOURCES[kind.strip()]
+            rows = model._base_manager.select_related(*related).order_by('pk')
+            
+            indexed = 0
+            last_pk = 0
+            while True:
+                chunk = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+                if not chunk:
+                    break
+                index_objects(chunk)
+                indexed += len(chunk)
+                last_pk = chunk[-1].pk
+            
+            self.stdout.write(f'{kind}: {indexed} indexed')
+        
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,61 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import models
+from patients.models import Patient
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalized search text of one patient, budget, treatment, clinical note
+    or online payment (see search.documents)
+    Kept in sync by signals; rebuild with the rebuild_search_index command
+    """
+    
+    KIND_CHOICES = [
+        ('patient', 'Paciente'),
+        ('budget', 'Presupuesto'),
+        ('treatment', 'Tratamiento'),
+        ('note', 'Nota Clínica'),
+        ('online_payment', 'Pago en Línea'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='Tipo')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID del Objeto')
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='search_documents',
+        verbose_name='Paciente'
+    )
+    
+    # What the result list shows
+    title = models.CharField(max_length=255, verbose_name='Título')
+    subtitle = models.CharField(max_length=255, blank=True, verbose_name='Subtítulo')
+    date = models.DateField(blank=True, null=True, verbose_name='Fecha')
+    
+    # What the query is matched against, folded to lowercase ASCII
+    code = models.CharField(
+        max_length=200,
+        blank=True,
+        verbose_name='Código',
+        help_text='Número de paciente, número de presupuesto o ID de transacción'
+    )
+    document = models.TextField(verbose_name='Texto de Búsqueda')
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Última Actualización')
+    
+    class Meta:
+        verbose_name = 'Documento de Búsqueda'
+        verbose_name_plural = 'Documentos de Búsqueda'
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document_object'),
+        ]
+        indexes = [
+            # Pattern ops so LIKE 'prefix%' can use the index on PostgreSQL
+            models.Index(fields=['code'], name='search_document_code', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['patient', 'kind']),
+            # Trigram index serves LIKE '%...%' and similarity lookups on PostgreSQL
+            GinIndex(fields=['document'], name='search_document_trgm', opclasses=['gin_trgm_ops']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.title}"
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from .documents import KINDS, index_objects, index_patient, remove_object
+from patients.models import Patient
+
+
+def index_search_document(sender, instance, raw=False, **kwargs):
+    """Refresh the search document of a saved row"""
+    if raw:
+        return
+    if sender is Patient:
+        index_patient(instance)
+    else:
+        index_objects([instance])
+
+
+def remove_search_document(sender, instance, **kwargs):
+    """Drop the search document of a deleted row"""
+    remove_object(instance)
+
+
+for model in KINDS:
+    uid = f'search_document_{model._meta.label_lower}'
+    post_save.connect(index_search_document, sender=model, dispatch_uid=f'{uid}_post_save')
+    # Documents of a deleted patient go away with it through the cascade
+    if model is not Patient:
+        post_delete.connect(remove_search_document, sender=model, dispatch_uid=f'{uid}_post_delete')
@@ -0,0 +1,116 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from _config.testing import create_patient
+from budgets.models import Budget
+from clinical.models import ClinicalNote
+from online_payments.models import OnlinePayment
+from treatments.models import Treatment
+from .models import SearchDocument
+
+
+class GlobalSearchTestCase(TestCase):
+    """Single-table search across patients, budgets, treatments, notes and payments"""
+
+    url = '/api/search/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.patient = create_patient(
+            first_name='José',
+            last_name='Núñez',
+            gender='M',
+            date_of_birth=date(1985, 3, 2),
+            phone='+52 55 1234 5678',
+        )
+        self.budget = Budget.objects.create(patient=self.patient, title='Ortodoncia completa')
+        self.treatment = Treatment.objects.create(
+            patient=self.patient,
+            treatment_type='Endodoncia',
+            dentist_responsible='Dra. Pérez',
+            start_date=date(2030, 1, 10),
+            total_price=Decimal('3000.00'),
+        )
+        self.note = ClinicalNote.objects.create(
+            patient=self.patient,
+            date=date(2030, 1, 12),
+            title='Revisión',
+            description='Sensibilidad en el molar inferior',
+        )
+        self.payment = OnlinePayment.objects.create(
+            patient=self.patient,
+            amount=Decimal('1500.00'),
+            payment_method='stripe',
+            transaction_id='pi_3NxAbc123',
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['id']) for row in response.data['results']]
+
+    def test_every_kind_is_indexed_on_save(self):
+        kinds = set(SearchDocument.objects.values_list('kind', flat=True))
+        self.assertEqual(kinds, {'patient', 'budget', 'treatment', 'note', 'online_payment'})
+
+    def test_results_are_typed_and_ranked(self):
+        results = self.search('nunez')
+        self.assertEqual(results[0], ('patient', self.patient.pk))
+        self.assertEqual(len(results), 5)
+
+        self.assertEqual(self.search('molar'), [('note', self.note.pk)])
+        self.assertEqual(self.search('ORTODONCIA'), [('budget', self.budget.pk)])
+
+    def test_codes_match_exactly_and_by_prefix(self):
+        self.assertEqual(self.search(self.budget.budget_number)[0], ('budget', self.budget.pk))
+        self.assertEqual(self.search('pi_3nx'), [('online_payment', self.payment.pk)])
+        self.assertEqual(self.search('5512 3456'), [('patient', self.patient.pk)])
+
+    def test_types_filter(self):
+        results = self.search('nunez', types='treatment,note')
+        self.assertEqual(
+            sorted(results),
+            [('note', self.note.pk), ('treatment', self.treatment.pk)]
+        )
+        response = self.client.get(self.url, {'q': 'nunez', 'types': 'invoice'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_documents_follow_their_rows(self):
+        self.treatment.treatment_type = 'Corona'
+        self.treatment.save()
+        self.assertEqual(self.search('endodoncia'), [])
+        self.assertEqual(self.search('corona'), [('treatment', self.treatment.pk)])
+
+        self.note.delete()
+        self.assertEqual(self.search('molar'), [])
+
+    def test_renaming_a_patient_reindexes_its_rows(self):
+        self.patient.last_name = 'Muñoz'
+        self.patient.save()
+        self.assertEqual(self.search('nunez'), [])
+        self.assertEqual(len(self.search('munoz')), 5)
+        document = SearchDocument.objects.get(kind='budget', object_id=self.budget.pk)
+        self.assertIn('José Muñoz', document.subtitle)
+
+    def test_soft_deleted_patients_are_hidden(self):
+        self.patient.soft_delete()
+        self.assertEqual(self.search('nunez'), [])
+
+    def test_search_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.search('nunez')
+
+    def test_rebuild_command(self):
+        SearchDocument.objects.all().delete()
+        Treatment.objects.filter(pk=self.treatment.pk).update(start_date=date(2030, 1, 10) + timedelta(days=1))
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(SearchDocument.objects.count(), 5)
+        self.assertEqual(
+            SearchDocument.objects.get(kind='treatment').date,
+            date(2030, 1, 11)
+        )
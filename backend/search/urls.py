@@ -0,0 +1,7 @@
+from rest_framework.routers import DefaultRouter
+from .views import GlobalSearchViewSet
+
+router = DefaultRouter()
+router.register(r'', GlobalSearchViewSet, basename='search')
+
+urlpatterns = router.urls
@@ -0,0 +1,41 @@
+from rest_framework import viewsets, status
+from rest_framework.response import Response
+from .documents import SOURCES, search
+
+
+class GlobalSearchViewSet(viewsets.ViewSet):
+    """
+    One ranked list of patients, budgets, treatments, clinical notes and
+    online payments matching `q`; `types` narrows it to some of them
+    """
+    
+    def list(self, request):
+        query = request.query_params.get('q', '')
+        kinds = [kind for kind in request.query_params.get('types', '').split(',') if kind]
+        unknown = sorted(set(kinds) - set(SOURCES))
+        if unknown:
+            return Response(
+                {'error': f'Tipos de búsqueda inválidos: {", ".join(unknown)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            return Response(
+                {'error': 'El parámetro limit debe ser un número'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = [
+            {
+                'type': row['kind'],
+                'id': row['object_id'],
+                'patient_id': row['patient_id'],
+                'title': row['title'],
+                'subtitle': row['subtitle'],
+                'date': row['date'],
+                'rank': row['rank'],
+            }
+            for row in search(query, kinds, limit)
+        ]
+        return Response({'query': query, 'results': results})
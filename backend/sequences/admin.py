@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import DocumentSequence
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ['prefix', 'period', 'last_value', 'updated_at']
+    list_filter = ['prefix']
+    search_fields = ['prefix', 'period']
+    ordering = ['-period', 'prefix']
+    readonly_fields = ['updated_at']
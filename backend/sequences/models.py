@@ -0,0 +1,61 @@
+from django.db import models, transaction
+from django.db.models import Max
+from django.db.models.functions import Cast, Substr
+from django.utils import timezone
+
+
+class DocumentSequence(models.Model):
+    """Per-day counter used to number documents (patients, budgets, ...)"""
+    
+    prefix = models.CharField(max_length=20, verbose_name='Prefijo')
+    period = models.CharField(max_length=8, verbose_name='Periodo', help_text='Fecha en formato YYYYMMDD')
+    last_value = models.PositiveIntegerField(default=0, verbose_name='Último Valor')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Última Actualización')
+    
+    class Meta:
+        verbose_name = 'Secuencia de Documentos'
+        verbose_name_plural = 'Secuencias de Documentos'
+        constraints = [
+            models.UniqueConstraint(fields=['prefix', 'period'], name='unique_sequence_prefix_period'),
+        ]
+    
+    def __str__(self):
+        return f"{self.prefix}-{self.period}: {self.last_value}"
+
+
+def next_value(prefix, period, seed=None):
+    """
+    Allocate the next value of the prefix/period counter.
+    
+    The counter row is locked with SELECT ... FOR UPDATE, so concurrent
+    callers are serialized on that single row instead of scanning the
+    numbered table. When the row does not exist yet, seed(period) (if
+    given) returns the value already used for the period, e.g. for data
+    numbered before the counter existed.
+    """
+    with transaction.atomic():
+        sequence, _ = DocumentSequence.objects.select_for_update().get_or_create(
+            prefix=prefix,
+            period=period,
+            defaults={'last_value': (lambda: seed(period)) if seed else 0}
+        )
+        sequence.last_value += 1
+        sequence.save(update_fields=['last_value', 'updated_at'])
+        return sequence.last_value
+
+
+def last_number_value(queryset, field, prefix):
+    """
+    Highest value among the numbers of a queryset that start with prefix,
+    e.g. 7 for PAT-20300101-0007. Numbers deleted since do not lower it.
+    """
+    suffix = Cast(Substr(field, len(prefix) + 1), models.IntegerField())
+    numbered = queryset.filter(**{f'{field}__startswith': prefix})
+    return numbered.aggregate(value=Max(suffix))['value'] or 0
+
+
+def next_number(prefix, seed=None, width=4):
+    """Generate the next number in format PREFIX-YYYYMMDD-XXXX for today"""
+    period = timezone.now().strftime('%Y%m%d')
+    value = next_value(prefix, period, seed=seed)
+    return f"{prefix}-{period}-{str(value).zfill(width)}"
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from _config.testing import create_patient
+from budgets.models import Budget
+from patients.models import Patient
+from .models import DocumentSequence, next_number, next_value
+
+
+class DocumentSequenceTestCase(TestCase):
+    """Per-day sequence allocation"""
+
+    def test_values_increase_per_prefix_and_period(self):
+        self.assertEqual(next_value('PAT', '20300101'), 1)
+        self.assertEqual(next_value('PAT', '20300101'), 2)
+        self.assertEqual(next_value('BUD', '20300101'), 1)
+        self.assertEqual(next_value('PAT', '20300102'), 1)
+
+    def test_seed_is_used_only_when_counter_is_created(self):
+        self.assertEqual(next_value('PAT', '20300101', seed=lambda period: 7), 8)
+        self.assertEqual(next_value('PAT', '20300101', seed=lambda period: 100), 9)
+
+    def test_number_format(self):
+        period = timezone.now().strftime('%Y%m%d')
+        self.assertEqual(next_number('BUD'), f'BUD-{period}-0001')
+
+    def test_allocation_does_not_scan_numbered_table(self):
+        next_value('PAT', '20300101')
+        with self.assertNumQueries(4):
+            # Savepoint, locked read, update, release
+            next_value('PAT', '20300101')
+
+    def test_patient_and_budget_numbers(self):
+        period = timezone.now().strftime('%Y%m%d')
+        first = create_patient()
+        second = create_patient(first_name='Luis')
+        budget = Budget.objects.create(patient=first, title='Ortodoncia')
+
+        self.assertEqual(first.patient_number, f'PAT-{period}-0001')
+        self.assertEqual(second.patient_number, f'PAT-{period}-0002')
+        self.assertEqual(budget.budget_number, f'BUD-{period}-0001')
+
+    def test_counter_continues_after_existing_numbers(self):
+        period = timezone.now().strftime('%Y%m%d')
+        create_patient()
+        create_patient()
+        DocumentSequence.objects.all().delete()
+
+        self.assertEqual(create_patient().patient_number, f'PAT-{period}-0003')
+
+    def test_counter_continues_after_the_highest_number_when_some_were_deleted(self):
+        period = timezone.now().strftime('%Y%m%d')
+        patients = [create_patient(first_name=f'Paciente {i}') for i in range(3)]
+        budgets = [Budget.objects.create(patient=patients[0], title=f'Presupuesto {i}') for i in range(3)]
+        Patient.objects.all_with_deleted().filter(pk=patients[1].pk).delete()
+        budgets[1].delete()
+        DocumentSequence.objects.all().delete()
+
+        self.assertEqual(create_patient().patient_number, f'PAT-{period}-0004')
+        self.assertEqual(Budget.objects.create(patient=patients[0], title='Nuevo').budget_number, f'BUD-{period}-0004')
+
+
+@skipUnless(connection.features.has_select_for_update, 'Requires row locking')
+class ConcurrentSequenceTestCase(TransactionTestCase):
+    """Numbers stay unique when many threads allocate at once"""
+
+    def run_threads(self, func, count=40, workers=8):
+        def work(index):
+            try:
+                return func(index)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(work, range(count)))
+
+    def test_concurrent_allocation(self):
+        values = self.run_threads(lambda index: next_value('PAT', '20300101'))
+        self.assertEqual(sorted(values), list(range(1, 41)))
+
+    def test_concurrent_patient_inserts(self):
+        patients = self.run_threads(lambda index: create_patient(first_name=f'Paciente {index}'))
+        numbers = {patient.patient_number for patient in patients}
+        self.assertEqual(len(numbers), len(patients))
+        self.assertEqual(DocumentSequence.objects.get(prefix='PAT').last_value, len(patients))
@@ -225,6 +225,9 @@ class OrthodonticCase(models.Model):
 class AestheticProcedure(models.Model):
     """Aesthetic procedure tracking for treatments"""
     
+    # Fields that get thumbnails and previews (see _config.images)
+    IMAGE_FIELDS = ['before_photo', 'after_photo']
+    
     PROCEDURE_TYPE_CHOICES = [
         ('whitening', 'Blanqueamiento'),
         ('veneers', 'Carillas'),
@@ -289,6 +292,13 @@ class AestheticProcedure(models.Model):
         verbose_name='Notas'
     )
     
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Miniaturas y Vistas Previas'
+    )
+    
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Creación')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Última Actualización')
@@ -315,6 +325,9 @@ class AestheticProcedure(models.Model):
 class TreatmentFile(models.Model):
     """Files attached to treatment progress (photos, reports, radiographs)"""
     
+    # Fields that get thumbnails and previews (see _config.images)
+    IMAGE_FIELDS = ['file']
+    
     FILE_TYPE_CHOICES = [
         ('photo', 'Foto Clínica'),
         ('radiograph', 'Radiografía'),
@@ -350,6 +363,12 @@ class TreatmentFile(models.Model):
     
     # Metadata
     uploaded_at = models.DateTimeField(auto_now_add=True, verbose_name='Fecha de Subida')
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Miniaturas y Vistas Previas'
+    )
     
     class Meta:
         verbose_name = 'Archivo de Tratamiento'
@@ -1,10 +1,13 @@
 from rest_framework import serializers
+from _config.images import derivative_urls
 from .models import Treatment, TreatmentProgress, TreatmentFile, OrthodonticCase, AestheticProcedure
 
 
 class TreatmentFileSerializer(serializers.ModelSerializer):
     """Serializer for Treatment File model"""
     
+    derivatives = serializers.SerializerMethodField()
+    
     class Meta:
         model = TreatmentFile
         fields = [
@@ -14,9 +17,14 @@ class TreatmentFileSerializer(serializers.ModelSerializer):
             'file',
             'title',
             'description',
+            'derivatives',
             'uploaded_at',
         ]
         read_only_fields = ['id', 'uploaded_at']
+    
+    def get_derivatives(self, obj):
+        """Thumbnail and preview of a photo, once generated"""
+        return derivative_urls(obj, 'file', self.context.get('request'))
 
 
 class TreatmentProgressSerializer(serializers.ModelSerializer):
@@ -65,6 +73,8 @@ class AestheticProcedureSerializer(serializers.ModelSerializer):
     treatment_info = serializers.SerializerMethodField()
     before_photo_url = serializers.SerializerMethodField()
     after_photo_url = serializers.SerializerMethodField()
+    before_photo_derivatives = serializers.SerializerMethodField()
+    after_photo_derivatives = serializers.SerializerMethodField()
     
     class Meta:
         model = AestheticProcedure
@@ -97,6 +107,14 @@ class AestheticProcedureSerializer(serializers.ModelSerializer):
             return obj.after_photo.url
         return None
     
+    def get_before_photo_derivatives(self, obj):
+        """Thumbnail and preview of the before photo, once generated"""
+        return derivative_urls(obj, 'before_photo', self.context.get('request'))
+    
+    def get_after_photo_derivatives(self, obj):
+        """Thumbnail and preview of the after photo, once generated"""
+        return derivative_urls(obj, 'after_photo', self.context.get('request'))
+    
     def validate_satisfaction_rating(self, value):
         """Validate satisfaction rating"""
         if value is not None and (value < 1 or value > 5):
@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from _config.images import delete_derivatives, schedule, stale_fields
+from .models import AestheticProcedure, TreatmentFile
+from .tasks import generate_image_derivatives
+
+
+def queue_derivatives(sender, instance, raw=False, **kwargs):
+    """Build thumbnails and previews in a worker once a new upload commits"""
+    if raw or not stale_fields(instance, sender.IMAGE_FIELDS):
+        return
+    args = (sender._meta.model_name, instance.pk)
+    transaction.on_commit(lambda: schedule(generate_image_derivatives, *args))
+
+
+def remove_derivatives(sender, instance, **kwargs):
+    """Delete the derivative files of a deleted row"""
+    derivatives = instance.image_derivatives or {}
+    for field in sender.IMAGE_FIELDS:
+        storage = getattr(instance, field).storage
+        entry = derivatives.get(field)
+        transaction.on_commit(lambda storage=storage, entry=entry: delete_derivatives(storage, entry))
+
+
+for model in [TreatmentFile, AestheticProcedure]:
+    uid = f'image_derivatives_{model._meta.label_lower}'
+    post_save.connect(queue_derivatives, sender=model, dispatch_uid=f'{uid}_post_save')
+    post_delete.connect(remove_derivatives, sender=model, dispatch_uid=f'{uid}_post_delete')
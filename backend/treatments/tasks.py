@@ -0,0 +1,26 @@
+"""
+Celery tasks for the treatments app
+"""
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Create a dummy decorator if Celery is not available
+    def shared_task(func):
+        return func
+
+
+@shared_task
+def generate_image_derivatives(model_name, pk):
+    """
+    Celery task to build thumbnails and previews of a treatment file or the
+    before/after photos of an aesthetic procedure
+    """
+    from django.apps import apps
+    from _config.images import refresh_derivatives
+    
+    model = apps.get_model('treatments', model_name)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    return refresh_derivatives(instance, model.IMAGE_FIELDS)
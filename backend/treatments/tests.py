@@ -1,3 +1,50 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from clinical.tests import photo
+from _config.testing import create_patient, run_tasks_inline
+from .models import AestheticProcedure, Treatment
+from .tasks import generate_image_derivatives
+
+
+class AestheticPhotoDerivativesTestCase(TestCase):
+    """Before/after photos get their own derivatives"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVE_FORMAT='JPEG')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        run_tasks_inline(self, generate_image_derivatives)
+
+        patient = create_patient()
+        self.treatment = Treatment.objects.create(
+            patient=patient,
+            treatment_type='Blanqueamiento',
+            dentist_responsible='Dra. Pérez',
+            start_date=date(2030, 1, 1),
+            total_price=Decimal('3000.00'),
+        )
+
+    def test_before_and_after_photos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            procedure = AestheticProcedure.objects.create(
+                treatment=self.treatment,
+                procedure_type='whitening',
+                before_photo=photo('antes.jpg'),
+            )
+        procedure.refresh_from_db()
+        self.assertEqual(list(procedure.image_derivatives), ['before_photo'])
+        self.assertTrue(procedure.image_derivatives['before_photo']['preview']['name'].endswith('.jpg'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            procedure.after_photo = photo('despues.jpg', size=(1200, 900))
+            procedure.save()
+        procedure.refresh_from_db()
+        self.assertEqual(procedure.image_derivatives['after_photo']['preview']['width'], 1200)
+        self.assertIn('before_photo', procedure.image_derivatives)
@@ -2,6 +2,8 @@ from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from _config.downloads import serve_file
+from _config.pagination import KeysetOrderingFilter
 from .models import Treatment, TreatmentProgress, TreatmentFile, OrthodonticCase, AestheticProcedure
 from .serializers import (
     TreatmentSerializer,
@@ -19,7 +21,7 @@ class TreatmentViewSet(viewsets.ModelViewSet):
     """
     queryset = Treatment.objects.select_related('patient').prefetch_related('progress_records')
     serializer_class = TreatmentSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter, KeysetOrderingFilter]
     filterset_fields = ['patient', 'status', 'dentist_responsible']
     search_fields = ['treatment_type', 'patient__first_name', 'patient__last_name']
     ordering_fields = ['start_date', 'end_date', 'total_price', 'status']
@@ -80,7 +82,7 @@ class TreatmentProgressViewSet(viewsets.ModelViewSet):
     """
     queryset = TreatmentProgress.objects.select_related('treatment').prefetch_related('files')
     serializer_class = TreatmentProgressSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['treatment']
     ordering_fields = ['date', 'session_number']
     ordering = ['-date']
@@ -92,16 +94,22 @@ class TreatmentFileViewSet(viewsets.ModelViewSet):
     """
     queryset = TreatmentFile.objects.select_related('progress')
     serializer_class = TreatmentFileSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['progress', 'file_type']
     ordering = ['-uploaded_at']
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Download the file, streamed in chunks or through a signed URL"""
+        treatment_file = self.get_object()
+        return serve_file(request, treatment_file.file)
 
 
 class OrthodonticCaseViewSet(viewsets.ModelViewSet):
     """ViewSet for managing orthodontic cases"""
     queryset = OrthodonticCase.objects.select_related('treatment', 'treatment__patient')
     serializer_class = OrthodonticCaseSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['treatment', 'appliance_type']
     ordering_fields = ['start_date', 'expected_end_date']
     ordering = ['-start_date']
@@ -133,7 +141,7 @@ class AestheticProcedureViewSet(viewsets.ModelViewSet):
     """ViewSet for managing aesthetic procedures"""
     queryset = AestheticProcedure.objects.select_related('treatment', 'treatment__patient')
     serializer_class = AestheticProcedureSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, KeysetOrderingFilter]
     filterset_fields = ['treatment', 'procedure_type', 'satisfaction_rating']
     ordering_fields = ['completion_date', 'created_at']
     ordering = ['-completion_date', '-created_at']
@@ -26,8 +26,7 @@ export default function AppointmentsPage() {
   useEffect(() => {
     const fetchAppointments = async () => {
       try {
-        const result = await apiClient.getAppointments()
-        setAppointments(Array.isArray(result) ? result : [])
+        setAppointments(await apiClient.getAppointments<Appointment>())
       } catch (err) {
         console.error("Appointments fetch error:", err)
         setError(err instanceof Error ? err.message : "Error al cargar citas")
@@ -4,6 +4,17 @@ interface RequestOptions extends RequestInit {
   token?: string
 }
 
+// List endpoints are cursor paginated: { next, previous, results }, where
+// next and previous are absolute URLs (null on the last and first page)
+interface Page<T> {
+  next: string | null
+  previous: string | null
+  results: T[]
+}
+
+// Largest page the backend serves (MAX_PAGE_SIZE in _config/pagination.py)
+const LIST_PAGE_SIZE = 200
+
 class ApiClient {
   private baseUrl: string
 
@@ -29,7 +40,8 @@ class ApiClient {
       headers['Authorization'] = `Bearer ${token}`
     }
 
-    const url = `${this.baseUrl}${endpoint}`
+    // Cursor links from a paginated response are already absolute
+    const url = /^https?:\/\//.test(endpoint) ? endpoint : `${this.baseUrl}${endpoint}`
 
     try {
       const response = await fetch(url, {
@@ -51,14 +63,28 @@ class ApiClient {
     }
   }
 
+  // Every row of a list endpoint, following the next links page by page
+  private async list<T>(endpoint: string, options: RequestOptions = {}): Promise<T[]> {
+    const separator = endpoint.includes('?') ? '&' : '?'
+    let next: string | null = `${endpoint}${separator}page_size=${LIST_PAGE_SIZE}`
+    const rows: T[] = []
+    while (next) {
+      const page: Page<T> | T[] = await this.request<Page<T> | T[]>(next, options)
+      if (Array.isArray(page)) return rows.concat(page)
+      rows.push(...page.results)
+      next = page.next
+    }
+    return rows
+  }
+
   // Dashboard
   async getDashboard(token?: string) {
     return this.request('/dashboard/', { token })
   }
 
   // Patients
-  async getPatients(token?: string) {
-    return this.request('/patients/', { token })
+  async getPatients<T = any>(token?: string) {
+    return this.list<T>('/patients/', { token })
   }
 
   async getPatient(id: string, token?: string) {
@@ -89,8 +115,8 @@ class ApiClient {
   }
 
   // Appointments
-  async getAppointments(token?: string) {
-    return this.request('/appointments/', { token })
+  async getAppointments<T = any>(token?: string) {
+    return this.list<T>('/appointments/', { token })
   }
 
   async getAppointment(id: string, token?: string) {
@@ -121,8 +147,8 @@ class ApiClient {
   }
 
   // Treatments
-  async getTreatments(token?: string) {
-    return this.request('/treatments/', { token })
+  async getTreatments<T = any>(token?: string) {
+    return this.list<T>('/treatments/', { token })
   }
 
   async getTreatment(id: string, token?: string) {
@@ -146,8 +172,8 @@ class ApiClient {
   }
 
   // Payments
-  async getPayments(token?: string) {
-    return this.request('/payments/', { token })
+  async getPayments<T = any>(token?: string) {
+    return this.list<T>('/payments/', { token })
   }
 
   async createPayment(data: any, token?: string) {
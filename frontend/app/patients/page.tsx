@@ -26,8 +26,7 @@ export default function PatientsPage() {
   useEffect(() => {
     const fetchPatients = async () => {
       try {
-        const result = await apiClient.getPatients()
-        setPatients(Array.isArray(result) ? result : [])
+        setPatients(await apiClient.getPatients<Patient>())
       } catch (err) {
         console.error("Patients fetch error:", err)
         setError(err instanceof Error ? err.message : "Error al cargar pacientes")
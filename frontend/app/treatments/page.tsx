@@ -25,8 +25,7 @@ export default function TreatmentsPage() {
   useEffect(() => {
     const fetchTreatments = async () => {
       try {
-        const result = await apiClient.getTreatments()
-        setTreatments(Array.isArray(result) ? result : [])
+        setTreatments(await apiClient.getTreatments<Treatment>())
       } catch (err) {
         console.error("Treatments fetch error:", err)
         setError(err instanceof Error ? err.message : "Error al cargar tratamientos")